@@ -0,0 +1,162 @@
+import asyncio
+import dataclasses
+import datetime
+import json
+import logging
+import re
+from typing import Any, Awaitable, Callable
+
+from analytics import url_keys
+
+
+logger = logging.getLogger("roast_index")
+
+ListDocs = Callable[[], Awaitable[list[tuple[str, str]]]]
+ReadDoc = Callable[[str], Awaitable[str]]
+
+SCORE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:/\s*10)?")
+SYNC_READ_CONCURRENCY = 8
+
+
+@dataclasses.dataclass
+class RoastRecord:
+    path: str
+    stamp: str
+    timestamp: float
+    project_name: str
+    canonical_urls: list[str]
+    mode: str
+    score: float | None
+
+    def brief(self) -> dict[str, Any]:
+        return {
+            "path": self.path,
+            "timestamp": datetime.datetime.fromtimestamp(self.timestamp, datetime.timezone.utc).isoformat() if self.timestamp else "",
+            "project_name": self.project_name,
+            "urls": self.canonical_urls,
+            "mode": self.mode,
+            "score": self.score,
+        }
+
+
+def parse_timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value) / 1000 if value > 1e12 else float(value)
+    if isinstance(value, str) and value:
+        try:
+            ts = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+            if ts.tzinfo is None:
+                ts = ts.replace(tzinfo=datetime.timezone.utc)
+            return ts.timestamp()
+        except ValueError:
+            pass
+    return 0.0
+
+
+def parse_score(value: Any) -> float | None:
+    if isinstance(value, (int, float)):
+        return float(value)
+    m = SCORE_RE.search(str(value or ""))
+    return float(m.group(1)) if m else None
+
+
+def normalize_project(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", (name or "").lower()).strip("-")
+
+
+def record_from_doc(path: str, stamp: str, text: str) -> RoastRecord | None:
+    try:
+        doc = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(doc, dict):
+        return None
+    return record_from_dict(path, stamp, doc)
+
+
+def record_from_dict(path: str, stamp: str, doc: dict[str, Any]) -> RoastRecord:
+    urls = doc.get("urls") or []
+    if isinstance(urls, str):
+        urls = url_keys.extract_urls(urls) or [urls]
+    return RoastRecord(
+        path=path,
+        stamp=stamp,
+        timestamp=parse_timestamp(doc.get("timestamp")),
+        project_name=str(doc.get("project_name") or ""),
+        canonical_urls=sorted({url_keys.canonicalize_url(u) for u in urls if isinstance(u, str) and u}),
+        mode=str(doc.get("mode") or ""),
+        score=parse_score(doc.get("score")),
+    )
+
+
+class RoastIndex:
+    def __init__(self) -> None:
+        self.records: dict[str, RoastRecord] = {}
+        self._stamps: dict[str, str] = {}
+        self.by_url: dict[str, set[str]] = {}
+        self.by_project: dict[str, set[str]] = {}
+        self._warned_unstamped = False
+
+    def _unlink(self, path: str) -> None:
+        rec = self.records.pop(path, None)
+        if rec is None:
+            return
+        for url in rec.canonical_urls:
+            self.by_url.get(url, set()).discard(path)
+        self.by_project.get(normalize_project(rec.project_name), set()).discard(path)
+
+    def upsert(self, rec: RoastRecord) -> None:
+        self._unlink(rec.path)
+        self.records[rec.path] = rec
+        self._stamps[rec.path] = rec.stamp
+        for url in rec.canonical_urls:
+            self.by_url.setdefault(url, set()).add(rec.path)
+        if rec.project_name:
+            self.by_project.setdefault(normalize_project(rec.project_name), set()).add(rec.path)
+
+    async def sync(self, list_docs: ListDocs, read_doc: ReadDoc) -> dict[str, int]:
+        listed = await list_docs()
+        present = {path for path, _ in listed}
+        removed = [path for path in self._stamps if path not in present]
+        for path in removed:
+            self._unlink(path)
+            self._stamps.pop(path, None)
+        # A document is read again when its stamp changed, and every time when the listing has no stamp for it
+        todo = [(path, stamp) for path, stamp in listed if not (stamp and self._stamps.get(path) == stamp)]
+        if any(not stamp for _, stamp in todo) and not self._warned_unstamped:
+            logger.warning("document listing has no modification stamps, every sync re-reads unstamped documents")
+            self._warned_unstamped = True
+        sem = asyncio.Semaphore(SYNC_READ_CONCURRENCY)
+
+        async def read(path: str) -> str | None:
+            async with sem:
+                try:
+                    return await read_doc(path)
+                except Exception as exc:
+                    logger.info("cannot read %s: %s", path, exc)
+                    return None
+
+        texts = await asyncio.gather(*(read(path) for path, _ in todo))
+        for (path, stamp), text in zip(todo, texts):
+            if text is None:
+                continue
+            rec = record_from_doc(path, stamp, text)
+            if rec is None:
+                self._unlink(path)
+                self._stamps[path] = stamp
+            else:
+                self.upsert(rec)
+        return {"listed": len(listed), "reread": len(todo), "removed": len(removed), "indexed": len(self.records)}
+
+    def lookup(self, urls: list[str] | None = None, project_name: str = "", exclude_path: str = "") -> list[RoastRecord]:
+        paths: set[str] = set()
+        for url in urls or []:
+            paths |= self.by_url.get(url_keys.canonicalize_url(url), set())
+        by_project = self.by_project.get(normalize_project(project_name), set()) if project_name else set()
+        # URL matches rank first, then project-only matches, newest first within each group
+        ranked = sorted(
+            (self.records[p] for p in paths | by_project if p != exclude_path),
+            key=lambda r: (r.path in paths, r.path in by_project, r.timestamp),
+            reverse=True,
+        )
+        return ranked
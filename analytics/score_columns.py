@@ -0,0 +1,342 @@
+import collections
+import datetime
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Iterable
+
+from analytics import roast_index
+from analytics import url_keys
+
+
+logger = logging.getLogger("score_columns")
+
+ANALYTICS_DIR = Path(os.environ.get("ROASTMASTER_ANALYTICS_DIR", Path.home() / ".cache" / "roastmaster" / "analytics"))
+MAGIC = b"RMSC"
+VERSION = 2
+HEADER = struct.Struct("<4sIQQQQ")
+HEADER_SIZE = 64
+INITIAL_ROWS = 1024
+INITIAL_TAGS = 4096
+# Widest type first keeps every column aligned to its item size
+COLUMNS = (
+    ("ts", "d"),
+    ("score", "f"),
+    ("project", "I"),
+    ("url", "I"),
+    ("tag_end", "I"),
+    ("key", "I"),
+    ("mode", "B"),
+    ("pillars", "B"),
+    ("first", "B"),
+)
+ITEM_SIZE = {"d": 8, "f": 4, "I": 4, "B": 1}
+DICTS = ("project", "url", "mode", "tag")
+
+PILLARS = ("clarity", "value", "ux", "trust", "other")
+PILLAR_KEYWORDS = {
+    "clarity": ("headline", "3-second", "three-second", "clarity", "unclear", "confus", "vague", "jargon", "message", "copy", "subhead"),
+    "value": ("value", "offer", "pricing", "price", "benefit", "proposition", "differentiat", "generic", "usp"),
+    "ux": ("cta", "button", "hierarchy", "layout", "navigation", "menu", "form", "mobile", "speed", "slow", "clutter", "contrast", "fold", "scroll", "visual", "design"),
+    "trust": ("proof", "testimonial", "trust", "review", "logo", "social", "guarantee", "secur", "credib", "case stud"),
+}
+DEAL_BREAKERS_RE = re.compile(r"^#+.*deal[ -]?breakers?.*$", re.IGNORECASE | re.MULTILINE)
+ISSUE_RE = re.compile(r"^\s*[-*]\s*\*\*(.+?)\*\*", re.MULTILINE)
+BUCKETS = ("day", "week", "month")
+
+
+def pillar_of(issue: str) -> str:
+    lowered = issue.lower()
+    for pillar, keywords in PILLAR_KEYWORDS.items():
+        if any(k in lowered for k in keywords):
+            return pillar
+    return "other"
+
+
+def deal_breaker_tags(roast: str) -> list[tuple[str, str]]:
+    # Issue names from the "- **Issue:** why" bullets of the Deal Breakers section, tagged with their CRO pillar
+    m = DEAL_BREAKERS_RE.search(roast or "")
+    if not m:
+        return []
+    section = roast[m.end():]
+    end = re.search(r"^#", section, re.MULTILINE)
+    tags = []
+    for issue in ISSUE_RE.findall(section[:end.start()] if end else section):
+        slug = re.sub(r"[^a-z0-9]+", " ", issue.lower()).strip()[:48]
+        if slug:
+            tags.append((pillar_of(slug), slug))
+    return tags
+
+
+def roast_key(urls: list[str], roast: str) -> int:
+    # Timestamps have second precision, roasts of one project saved in the same second differ by URLs or text
+    return zlib.crc32("\n".join([*urls, roast or ""]).encode())
+
+
+def _bucket(ts: float, bucket: str) -> str:
+    d = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+    if bucket == "day":
+        return d.strftime("%Y-%m-%d")
+    if bucket == "week":
+        year, week, _ = d.isocalendar()
+        return f"{year}-W{week:02d}"
+    return d.strftime("%Y-%m")
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    # Linear interpolation between closest ranks
+    pos = (len(ordered) - 1) * q
+    lo, hi = math.floor(pos), math.ceil(pos)
+    return round(ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo), 2)
+
+
+def _layout(capacity: int, tag_capacity: int) -> tuple[dict[str, tuple[int, int, str]], int]:
+    offsets, pos = {}, HEADER_SIZE
+    for name, fmt in COLUMNS:
+        offsets[name] = (pos, capacity * ITEM_SIZE[fmt], fmt)
+        pos += capacity * ITEM_SIZE[fmt]
+    pos = (pos + 7) // 8 * 8
+    offsets["tags"] = (pos, tag_capacity * 4, "I")
+    return offsets, pos + tag_capacity * 4
+
+
+class ScoreColumns:
+    # Roast metadata as fixed-width columns in one memory-mapped file, one row per roast and URL.
+    # Strings are dictionary-encoded, their tables live next to the file in <name>.dict.json
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.dict_path = self.path.with_suffix(".dict.json")
+        self.rows = 0
+        self.tags_used = 0
+        self.capacity = 0
+        self.tag_capacity = 0
+        self.strings: dict[str, list[str]] = {d: [] for d in DICTS}
+        self._ids: dict[str, dict[str, int]] = {d: {} for d in DICTS}
+        self._seen: set[tuple[int, float, int]] = set()
+        self._mm: mmap.mmap | None = None
+        self._view: memoryview | None = None
+        self.col: dict[str, memoryview] = {}
+        self._open()
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists() or self.path.stat().st_size < HEADER_SIZE:
+            self._create(self.path, INITIAL_ROWS, INITIAL_TAGS)
+        try:
+            saved = json.loads(self.dict_path.read_text())
+        except (OSError, ValueError):
+            saved = {}
+        self.strings = {d: list(saved.get(d) or []) for d in DICTS}
+        self._ids = {d: {s: i for i, s in enumerate(v)} for d, v in self.strings.items()}
+        self._map()
+        magic, version, rows, capacity, tags_used, tag_capacity = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or max(self.col["project"][:rows], default=-1) >= len(self.strings["project"]):
+            logger.warning("%s is not a score column file of this version or lost its dictionary, starting empty", self.path)
+            self.close()
+            self._create(self.path, INITIAL_ROWS, INITIAL_TAGS)
+            self.strings = {d: [] for d in DICTS}
+            self._ids = {d: {} for d in DICTS}
+            self._map()
+            rows = tags_used = 0
+        self.rows, self.tags_used = rows, tags_used
+        self._seen = {(self.col["project"][i], self.col["ts"][i], self.col["key"][i]) for i in range(rows) if self.col["first"][i]}
+
+    def _map(self) -> None:
+        with open(self.path, "r+b") as f:
+            self._mm = mmap.mmap(f.fileno(), 0)
+        _, _, _, self.capacity, _, self.tag_capacity = HEADER.unpack_from(self._mm, 0)
+        offsets, _ = _layout(self.capacity, self.tag_capacity)
+        self._view = memoryview(self._mm)
+        self.col = {name: self._view[off:off + size].cast(fmt) for name, (off, size, fmt) in offsets.items()}
+
+    @staticmethod
+    def _create(path: Path, capacity: int, tag_capacity: int, copy_from: "ScoreColumns | None" = None) -> None:
+        _, size = _layout(capacity, tag_capacity)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        with os.fdopen(fd, "r+b") as f:
+            f.truncate(size)
+            mm = mmap.mmap(f.fileno(), size)
+            rows = copy_from.rows if copy_from else 0
+            tags_used = copy_from.tags_used if copy_from else 0
+            if copy_from is not None:
+                offsets, _ = _layout(capacity, tag_capacity)
+                for name, (off, _, fmt) in offsets.items():
+                    used = tags_used if name == "tags" else rows
+                    mm[off:off + used * ITEM_SIZE[fmt]] = copy_from.col[name][:used].tobytes()
+            HEADER.pack_into(mm, 0, MAGIC, VERSION, rows, capacity, tags_used, tag_capacity)
+            mm.flush()
+            mm.close()
+        os.replace(tmp, path)
+
+    def close(self) -> None:
+        for view in self.col.values():
+            view.release()
+        self.col = {}
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def _grow(self, rows: int, tags: int) -> None:
+        capacity, tag_capacity = self.capacity, self.tag_capacity
+        while capacity < self.rows + rows:
+            capacity *= 2
+        while tag_capacity < self.tags_used + tags:
+            tag_capacity *= 2
+        if (capacity, tag_capacity) == (self.capacity, self.tag_capacity):
+            return
+        self._create(self.path, capacity, tag_capacity, copy_from=self)
+        self.close()
+        self._map()
+
+    def _intern(self, kind: str, value: str) -> int:
+        ids = self._ids[kind]
+        if value not in ids:
+            ids[value] = len(self.strings[kind])
+            self.strings[kind].append(value)
+        return ids[value]
+
+    def has(self, project_name: str, ts: float, key: int) -> bool:
+        pid = self._ids["project"].get(roast_index.normalize_project(project_name))
+        return pid is not None and (pid, ts, key) in self._seen
+
+    def add_roast(self, project_name: str, ts: float, urls: list[str], mode: str, score: float | None, roast: str) -> int:
+        project = roast_index.normalize_project(project_name)
+        urls = sorted({url_keys.canonicalize_url(u) for u in urls if u}) or [""]
+        key = roast_key(urls, roast)
+        if self.has(project, ts, key):
+            return 0
+        tags = deal_breaker_tags(roast)
+        self._grow(len(urls), len(tags) * len(urls))
+        n_strings = sum(len(v) for v in self.strings.values())
+        pid, mid = self._intern("project", project), self._intern("mode", mode)
+        tag_ids = [self._intern("tag", f"{pillar}:{slug}") for pillar, slug in tags]
+        pillar_bits = 0
+        for pillar, _ in tags:
+            pillar_bits |= 1 << PILLARS.index(pillar)
+        url_ids = [self._intern("url", u) for u in urls]
+        if sum(len(v) for v in self.strings.values()) != n_strings:
+            self._save_strings()
+        c = self.col
+        for i, uid in enumerate(url_ids):
+            row = self.rows + i
+            c["ts"][row], c["score"][row] = ts, score if score is not None else math.nan
+            c["project"][row], c["url"][row], c["mode"][row] = pid, uid, mid
+            c["pillars"][row], c["first"][row], c["key"][row] = pillar_bits, int(i == 0), key
+            for t in tag_ids:
+                c["tags"][self.tags_used] = t
+                self.tags_used += 1
+            c["tag_end"][row] = self.tags_used
+        self.rows += len(url_ids)
+        # Rows become visible only once the header count moves past them
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, self.rows, self.capacity, self.tags_used, self.tag_capacity)
+        self._mm.flush()
+        self._seen.add((pid, ts, key))
+        return len(url_ids)
+
+    def add_versions(self, versions: Iterable[dict[str, Any]]) -> int:
+        added = 0
+        # Versions come newest first, everything older than a version already stored was stored with it
+        for version in versions:
+            rec = roast_index.record_from_dict("", "", version)
+            n = self.add_roast(rec.project_name, rec.timestamp, rec.canonical_urls, rec.mode, rec.score, str(version.get("roast") or ""))
+            if not n:
+                break
+            added += n
+        return added
+
+    def _save_strings(self) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.dict_path.parent, prefix=self.dict_path.name, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.strings, f, ensure_ascii=False)
+        os.replace(tmp, self.dict_path)
+
+    def select(self, project_name: str = "", url: str = "", since: float = 0.0) -> list[int]:
+        # Row numbers matching the filters, one per roast unless filtering by URL
+        c = self.col
+        pid = self._ids["project"].get(roast_index.normalize_project(project_name), -1) if project_name else None
+        uid = self._ids["url"].get(url_keys.canonicalize_url(url), -1) if url else None
+        return [
+            i for i in range(self.rows)
+            if c["ts"][i] >= since
+            and (uid is None and c["first"][i] or c["url"][i] == uid)
+            and (pid is None or c["project"][i] == pid)
+        ]
+
+    def trend(self, rows: list[int], bucket: str = "week") -> list[dict[str, Any]]:
+        c = self.col
+        by_project: dict[int, dict[str, list[float]]] = collections.defaultdict(lambda: collections.defaultdict(list))
+        for i in rows:
+            if not math.isnan(c["score"][i]):
+                by_project[c["project"][i]][_bucket(c["ts"][i], bucket)].append(c["score"][i])
+        result = []
+        for pid, buckets in sorted(by_project.items(), key=lambda kv: -sum(len(v) for v in kv[1].values())):
+            points = [
+                {"bucket": b, "roasts": len(s), "mean": round(sum(s) / len(s), 2), "min": round(min(s), 1), "max": round(max(s), 1)}
+                for b, s in sorted(buckets.items())
+            ]
+            result.append({
+                "project": self.strings["project"][pid] or "(no project)",
+                "points": points,
+                "change": round(points[-1]["mean"] - points[0]["mean"], 2),
+            })
+        return result
+
+    def percentiles(self, rows: list[int], qs: tuple[float, ...] = (0.1, 0.25, 0.5, 0.75, 0.9)) -> dict[str, Any]:
+        scores = sorted(s for s in (self.col["score"][i] for i in rows) if not math.isnan(s))
+        if not scores:
+            return {"roasts": 0}
+        return {
+            "roasts": len(scores),
+            "mean": round(sum(scores) / len(scores), 2),
+            **{f"p{round(q * 100)}": _percentile(scores, q) for q in qs},
+        }
+
+    def deal_breakers(self, rows: list[int], top: int = 10) -> dict[str, Any]:
+        c = self.col
+        tags: collections.Counter[int] = collections.Counter()
+        pillars: collections.Counter[str] = collections.Counter()
+        for i in rows:
+            start = c["tag_end"][i - 1] if i else 0
+            tags.update(set(c["tags"][start:c["tag_end"][i]]))
+            pillars.update(p for b, p in enumerate(PILLARS) if c["pillars"][i] & (1 << b))
+        top_tags = []
+        for tag_id, n in tags.most_common(top):
+            pillar, issue = self.strings["tag"][tag_id].split(":", 1)
+            top_tags.append({"issue": issue, "pillar": pillar, "roasts": n, "share": round(n / len(rows), 2)})
+        return {"roasts": len(rows), "by_pillar": dict(pillars.most_common()), "top": top_tags}
+
+    def stats(self) -> dict[str, int]:
+        return {"rows": self.rows, "capacity": self.capacity, "tags": self.tags_used, "projects": len(self.strings["project"])}
+
+
+def store_path(persona_id: str) -> Path:
+    return ANALYTICS_DIR / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', persona_id)}.cols"
+
+
+def query(store: ScoreColumns, question: str, project_name: str = "", url: str = "", days: int = 0, bucket: str = "week") -> dict[str, Any]:
+    t0 = time.perf_counter()
+    since = time.time() - days * 86400 if days > 0 else 0.0
+    rows = store.select(project_name, url, since)
+    if question == "trend":
+        result: dict[str, Any] = {"trend": store.trend(rows, bucket if bucket in BUCKETS else "week")}
+    elif question == "percentiles":
+        result = {"percentiles": store.percentiles(rows)}
+    else:
+        result = {"deal_breakers": store.deal_breakers(rows)}
+    return {
+        "question": question,
+        "filters": {"project_name": project_name, "url": url, "days": days},
+        **result,
+        "query_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
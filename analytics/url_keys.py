@@ -0,0 +1,30 @@
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+URL_RE = re.compile(r"https?://[^\s<>\"'`]+", re.IGNORECASE)
+TRAILING_PUNCT = ".,;:!?)]}>\"'"
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "yclid", "dclid", "gbraid", "wbraid", "mc_cid", "mc_eid", "_ga", "_gl", "igshid", "ref_src"}
+TRACKING_PREFIXES = ("utm_", "hsa_", "pk_")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def extract_urls(text: str) -> list[str]:
+    return [m.group(0).rstrip(TRAILING_PUNCT) for m in URL_RE.finditer(text or "")]
+
+
+def canonicalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    host = (parts.hostname or "").lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    netloc = host
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parts.port}"
+    path = re.sub(r"/{2,}", "/", parts.path or "").rstrip("/")
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
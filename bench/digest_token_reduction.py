@@ -0,0 +1,81 @@
+import argparse
+import html.parser
+import json
+import sys
+from pathlib import Path
+
+from roastmaster import roastmaster_digest
+
+
+PAGES_DIR = Path(__file__).parent / "pages"
+BLOCK_TAGS = {"p", "div", "section", "header", "footer", "main", "nav", "li", "h1", "h2", "h3", "h4", "br", "blockquote", "form", "button", "a", "option", "tr"}
+
+
+class _TextOnly(html.parser.HTMLParser):
+    # Rough stand-in for the browser's innerText when replaying saved HTML offline
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style", "noscript", "svg"):
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style", "noscript", "svg"):
+            self._skip = max(0, self._skip - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(page_html: str) -> str:
+    p = _TextOnly()
+    p.feed(page_html)
+    lines = (" ".join(line.split()) for line in "".join(p.parts).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def count_tokens(text: str) -> int:
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("o200k_base").encode(text))
+    except ImportError:
+        return max(1, len(text) // 4)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Token reduction of the CRO digest versus raw page text")
+    parser.add_argument("corpus", nargs="?", default=str(PAGES_DIR), help="Directory of saved pages (*.html, optionally *.txt with the browser text)")
+    parser.add_argument("--min-reduction", type=float, default=0.0, help="Fail if the corpus-wide reduction is below this fraction")
+    args = parser.parse_args()
+
+    rows = []
+    for path in sorted(Path(args.corpus).glob("*.html")):
+        page_html = path.read_text()
+        text_path = path.with_suffix(".txt")
+        text = text_path.read_text() if text_path.exists() else html_to_text(page_html)
+        digest = json.dumps(roastmaster_digest.extract_digest(text, page_html), ensure_ascii=False)
+        _, sent = roastmaster_digest.choose_body(text, digest)
+        rows.append((path.name, count_tokens(text), count_tokens(sent)))
+    if not rows:
+        print(f"no *.html pages in {args.corpus}")
+        return 1
+
+    print(f"{'page':32} {'raw':>7} {'sent':>7} {'saved':>7}")
+    for name, raw, dig in rows:
+        print(f"{name:32} {raw:7d} {dig:7d} {1 - dig / raw:7.0%}")
+    raw_total, dig_total = sum(r[1] for r in rows), sum(r[2] for r in rows)
+    reduction = 1 - dig_total / raw_total
+    print(f"{'total':32} {raw_total:7d} {dig_total:7d} {reduction:7.0%}")
+    return 0 if reduction >= args.min_reduction else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
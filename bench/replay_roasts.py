@@ -0,0 +1,602 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import re
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+from typing import Any
+
+from flexus_client_kit import ckit_ask_model, ckit_cloudtool, ckit_shutdown
+
+from analytics import score_columns
+from roastmaster import roastmaster_admission
+from roastmaster import roastmaster_bot
+from roastmaster import roastmaster_capture
+from roastmaster import roastmaster_cascade
+from roastmaster import roastmaster_creatives
+from roastmaster import roastmaster_install
+from roastmaster import roastmaster_pdoc
+from roastmaster import roastmaster_prompts
+from roastmaster import roastmaster_urls
+
+from digest_token_reduction import count_tokens, html_to_text
+
+
+BENCH_DIR = Path(__file__).parent
+PAGES_DIR = BENCH_DIR / "pages"
+SCENARIOS_PATH = BENCH_DIR / "replay" / "scenarios.json"
+THRESHOLDS_PATH = BENCH_DIR / "replay" / "thresholds.json"
+LATENCY_SLACK = 3.0
+# Token counts differ between tiktoken and the chars/4 fallback, exact counts would make thresholds machine-specific
+TOKEN_SLACK = 1.1
+CANNED_ROAST = """## 🔥 The Roast (First Impressions)
+Replay roast of {urls}.
+
+## ❌ The Deal Breakers
+- **Headline:** says nothing specific.
+
+## ✅ The Good Stuff
+The CTA is visible.
+
+## 🚀 The Action Plan (Fix This Now)
+1. Rewrite the headline.
+
+## 🏆 Roast Score: 6/10
+Replay verdict."""
+# Every call the scripted model makes must be asked for by the prompt under test, whitespace-insensitive.
+# Groups carry the argument values the script takes from the prompt instead of hardcoding them.
+PROMPT_STEPS = {
+    "triage_roast": r"call `roastmaster_roast` once with the user's message as `text`",
+    "batch_continues": r"ends with a `Batch continues` line, .* call `roastmaster_roast` again with `continue` set to the id after `continue=` on that line",
+    "capture": r"one URL in `capture` => one `roastmaster_capture` call, with `layout=\"(\w+)\"`",
+    "capture_batch": r"two or more URLs => one `roastmaster_capture_batch` call with all of them, same `layout` and `fresh`",
+    "capture_pending": r"call `roastmaster_capture` once per pending URL",
+    "pass_ids": r"pass `fresh` and `roast_id` exactly as given in the request",
+    "fallback_web": (
+        r"Only if `roastmaster_capture` returns an error for a URL, make the plan's `fallback_web` calls for that URL: "
+        r"one `web` call with its `open` items and one `web` call per `screenshot` item"
+    ),
+    "creative_sheet": r"make one `roastmaster_creative_sheet` call with all of them and `detail=(\d+)`",
+    "save": r"save it with `roastmaster_save_roast`, one call per roast",
+    "unchanged": r"If a capture says NO CHANGES DETECTED, reply with the stored roast it returns, .* and do not save again",
+}
+MISSING = object()
+
+
+class PromptDrift(AssertionError):
+    pass
+
+
+def instruction(prompt: str, step: str) -> re.Match:
+    m = re.search(PROMPT_STEPS[step], " ".join(prompt.split()))
+    if m is None:
+        raise PromptDrift(f"prompt no longer asks for the {step} step: {PROMPT_STEPS[step]}")
+    return m
+
+
+def check_args(tool: ckit_cloudtool.CloudTool, args: dict[str, Any]) -> None:
+    # Strict tools reject these calls in production, so the replay must not get away with them
+    props = tool.parameters["properties"]
+    problems = [f"missing {k}" for k in tool.parameters.get("required", []) if k not in args]
+    problems += [f"unknown {k}" for k in args if k not in props]
+    problems += [f"{k}={args[k]!r} not in {props[k]['enum']}" for k in args if k in props and args[k] not in props[k].get("enum", [args[k]])]
+    if problems:
+        raise PromptDrift(f"{tool.name} call does not match its schema: {', '.join(problems)}")
+
+
+@contextlib.contextmanager
+def patched(*patches: tuple[Any, str, Any]):
+    # Put every replaced attribute back even when a scenario fails, so stubs never outlive the scenario that set them
+    saved = [(obj, name, vars(obj).get(name, MISSING)) for obj, name, _ in patches]
+    try:
+        for obj, name, value in patches:
+            setattr(obj, name, value)
+        yield
+    finally:
+        for obj, name, value in reversed(saved):
+            if value is MISSING:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, value)
+
+
+class MemoryDocs:
+    # Stand-in for roastmaster_pdoc.RoastDocs, keeps policy documents in a dict
+    def __init__(self, rcx: Any = None) -> None:
+        self.docs: dict[str, tuple[str, int]] = {}
+        self.version = 0
+
+    async def list(self, folder: str = roastmaster_pdoc.ROASTS_FOLDER) -> list[tuple[str, str]]:
+        return [(path, str(v)) for path, (_, v) in self.docs.items() if path.startswith(folder + "/")]
+
+    async def read(self, path: str) -> str:
+        return self.docs[path][0]
+
+    async def write(self, path: str, text: str, fcall_ft_id: str) -> str:
+        op = "overwrite" if path in self.docs else "create"
+        self.version += 1
+        self.docs[path] = (text, self.version)
+        return op
+
+
+class StubRobotContext:
+    # Just enough of ckit_bot_exec.RobotContext for roastmaster_main_loop: handler registry and an arrival event
+    def __init__(self, persona_id: str, persona_setup: dict[str, Any]) -> None:
+        self.persona = types.SimpleNamespace(persona_id=persona_id, persona_setup=persona_setup, ws_root_group_id="replay-group")
+        self.handlers: dict[str, Any] = {}
+        self._parked_anything_new = asyncio.Event()
+
+    def on_tool_call(self, name: str):
+        def register(fn):
+            self.handlers[name] = fn
+            return fn
+        return register
+
+    async def unpark_collected_events(self, sleep_if_no_work: float = 0.0) -> None:
+        await asyncio.sleep(sleep_if_no_work)
+
+
+class StubFlexusClient:
+    def __init__(self) -> None:
+        self.ws_id = "replay-ws"
+        self.subchats: dict[str, str] = {}
+
+    async def bot_subchat_create_multiple(self, client: Any, first_question: list[str], **kwargs: Any) -> list[str]:
+        ids = [f"subchat-{len(self.subchats) + i}" for i in range(len(first_question))]
+        self.subchats.update(zip(ids, first_question))
+        return ids
+
+
+class FixtureCapturer:
+    # Serves recorded HTML and full-page WEBP in place of Playwright, with a fixed render time
+    def __init__(self, pages: dict[str, str], render_s: float, fail: set[str]) -> None:
+        self.pages = pages
+        self.render_s = render_s
+        self.fail = fail
+        self.renders: list[str] = []
+
+    def _fixture(self, url: str) -> tuple[str, str, bytes]:
+        canonical = roastmaster_urls.canonicalize_url(url)
+        if canonical in self.fail or canonical not in self.pages:
+            raise RuntimeError(f"no fixture for {canonical}")
+        name = self.pages[canonical]
+        page_html = (PAGES_DIR / f"{name}.html").read_text()
+        return page_html, html_to_text(page_html), (PAGES_DIR / f"{name}.webp").read_bytes()
+
+    async def capture(self, url: str, dimensions: str, scrolls: tuple[float, ...]) -> roastmaster_capture.RenderedPage:
+        self.renders.append(roastmaster_urls.canonicalize_url(url))
+        await asyncio.sleep(self.render_s)
+        page_html, text, webp = self._fixture(url)
+        h = int(dimensions.split("x")[1])
+        tiles = await asyncio.to_thread(lambda: [roastmaster_capture.png_to_webp(_crop_png(webp, s, h)) for s in scrolls])
+        return roastmaster_capture.RenderedPage(text, page_html, text[:400], tiles)
+
+    async def capture_stitched(self, url: str, dimensions: str, max_folds: int = roastmaster_capture.STITCHED_MAX_FOLDS) -> roastmaster_capture.RenderedPage:
+        self.renders.append(roastmaster_urls.canonicalize_url(url))
+        await asyncio.sleep(self.render_s)
+        page_html, text, webp = self._fixture(url)
+        h = int(dimensions.split("x")[1])
+        page_h = _height(webp)
+        folds = [(top, _crop_png_at(webp, top, h)) for top in roastmaster_capture.fold_tops(page_h, h, max_folds)]
+        stitched, tiles = await asyncio.to_thread(roastmaster_capture.stitch_page, folds, h, page_h)
+        return roastmaster_capture.RenderedPage(text, page_html, text[:400], [stitched], tiles)
+
+
+class FixtureBrowser:
+    # Real Chromium behind PageCapturer, so capture() and capture_stitched() run unmodified; every document
+    # request is answered with the recorded HTML and everything else is aborted, nothing goes to the network
+    def __init__(self, pages: dict[str, str], fail: set[str]) -> None:
+        self.pages = pages
+        self.fail = fail
+        self.renders: list[str] = []
+        self._playwright = None
+        self._browser = None
+        self._contexts: list[Any] = []
+
+    async def get_browser(self) -> "FixtureBrowser":
+        if self._browser is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch()
+        return self
+
+    async def new_context(self, viewport: dict[str, int]) -> Any:
+        context = await self._browser.new_context(viewport=viewport)
+        self._contexts.append(context)
+        await context.route("**/*", self._fulfill)
+        return context
+
+    async def _fulfill(self, route: Any) -> None:
+        request = route.request
+        canonical = roastmaster_urls.canonicalize_url(request.url)
+        if not request.is_navigation_request():
+            await route.abort()
+            return
+        self.renders.append(canonical)
+        if canonical in self.fail or canonical not in self.pages:
+            await route.abort("addressunreachable")
+            return
+        await route.fulfill(status=200, content_type="text/html", body=(PAGES_DIR / f"{self.pages[canonical]}.html").read_text())
+
+    async def close(self) -> None:
+        for context in self._contexts:
+            await context.close()
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+
+async def chromium_error() -> str:
+    browser = FixtureBrowser({}, set())
+    try:
+        await browser.get_browser()
+    except Exception as exc:
+        return f"{type(exc).__name__}: {str(exc).splitlines()[0] if str(exc) else ''}"
+    finally:
+        await browser.close()
+    return ""
+
+
+class FixtureCreatives:
+    # Serves ad creatives cut from the recorded page screenshots in place of image downloads
+    def __init__(self, creatives: dict[str, tuple[str, int]]) -> None:
+        self.creatives = creatives
+        self.fetches: list[str] = []
+
+    def fetch(self, url: str) -> bytes:
+        from PIL import Image
+        canonical = roastmaster_urls.canonicalize_url(url)
+        self.fetches.append(canonical)
+        if canonical not in self.creatives:
+            raise RuntimeError(f"no fixture for {canonical}")
+        name, top = self.creatives[canonical]
+        img = Image.open(PAGES_DIR / f"{name}.webp")
+        side = min(img.width, img.height)
+        top = min(top, img.height - side)
+        out = io.BytesIO()
+        img.crop((0, top, side, top + side)).save(out, "PNG")
+        return out.getvalue()
+
+
+def _height(webp: bytes) -> int:
+    from PIL import Image
+    return Image.open(io.BytesIO(webp)).height
+
+
+def _crop_png(webp: bytes, scroll: float, fold_h: int) -> bytes:
+    return _crop_png_at(webp, int(max(0, _height(webp) - fold_h) * scroll), fold_h)
+
+
+def _crop_png_at(webp: bytes, top: int, fold_h: int) -> bytes:
+    from PIL import Image
+    img = Image.open(io.BytesIO(webp))
+    out = io.BytesIO()
+    img.crop((0, top, img.width, min(img.height, top + fold_h))).save(out, "PNG")
+    return out.getvalue()
+
+
+def _texts_for(result: str, url: str) -> str:
+    return "\n".join(p["m_content"] for p in roastmaster_capture.tool_result_parts(result) if p["m_type"] == "text" and url in p["m_content"])
+
+
+class Thread:
+    # What one expert sends to the model each turn: system prompt plus the whole conversation so far
+    def __init__(self, tier: str, system_prompt: str, first_message: str, stats: dict[str, Any]) -> None:
+        self.tier = tier
+        self.system_prompt = system_prompt
+        self.messages: list[dict[str, Any]] = [{"m_type": "text", "m_content": system_prompt}, {"m_type": "text", "m_content": first_message}]
+        self.stats = stats
+
+    def expect(self, step: str) -> re.Match:
+        return instruction(self.system_prompt, step)
+
+    def model_turn(self) -> None:
+        texts = "\n".join(m["m_content"] for m in self.messages if m["m_type"] == "text")
+        images = sum(1 for m in self.messages if m["m_type"].startswith("image/"))
+        self.stats[f"tokens_{self.tier}"] += count_tokens(texts) + images * roastmaster_cascade.IMAGE_TOKENS
+        self.stats[f"turns_{self.tier}"] += 1
+
+    def add(self, result: str) -> None:
+        parts = roastmaster_capture.tool_result_parts(result)
+        self.messages.extend(parts)
+        self.stats["images"] += sum(1 for p in parts if p["m_type"].startswith("image/"))
+
+
+class Replay:
+    def __init__(self, rcx: StubRobotContext, client: StubFlexusClient, pages: dict[str, str]) -> None:
+        self.rcx = rcx
+        self.client = client
+        self.pages = pages
+        self.tools = {tool.name: tool for tool in roastmaster_bot.roastmaster_tools()}
+        self.calls = 0
+        self.stats: dict[str, Any] = {
+            "roasts": 0, "tool_calls": 0, "web_calls": 0, "capture_calls": 0, "duplicate_captures": 0,
+            "images": 0, "tokens_cheap": 0, "tokens_expensive": 0, "turns_cheap": 0, "turns_expensive": 0, "deferred": 0,
+        }
+
+    async def call(self, ft_id: str, name: str, args: dict[str, Any]) -> str:
+        self.calls += 1
+        self.stats["tool_calls"] += 1
+        toolcall = types.SimpleNamespace(fcall_ft_id=ft_id, fcall_id=f"call-{self.calls}")
+        if name == "web":
+            self.stats["web_calls"] += 1
+            return self.fake_web(args)
+        check_args(self.tools[name], args)
+        return await self.rcx.handlers[name](toolcall, args)
+
+    def fake_web(self, args: dict[str, Any]) -> str:
+        if "open" in args:
+            texts = []
+            for item in args["open"]:
+                name = self.pages.get(roastmaster_urls.canonicalize_url(item["url"]))
+                texts.append(html_to_text((PAGES_DIR / f"{name}.html").read_text()) if name else f"cannot open {item['url']}")
+            return "\n\n".join(texts)
+        images = []
+        for item in args.get("screenshot", []):
+            name = self.pages.get(roastmaster_urls.canonicalize_url(item["url"]))
+            if name:
+                webp = (PAGES_DIR / f"{name}.webp").read_bytes()
+                images.append(roastmaster_capture.png_to_webp(_crop_png(webp, item["scroll_down"], 720)))
+        return roastmaster_capture.tool_result_with_images("web screenshot", images)
+
+    async def triage(self, ft_id: str, message: str, mode: str, project_name: str, fresh: bool) -> str:
+        thread = Thread("cheap", roastmaster_prompts.TRIAGE_PROMPT, message, self.stats)
+        thread.model_turn()
+        thread.expect("triage_roast")
+        args = {"text": message, "mode": mode, "project_name": project_name, "fresh": fresh, "continue": ""}
+        while True:
+            try:
+                result = await self.call(ft_id, roastmaster_cascade.ROAST_TOOL.name, args)
+            except ckit_cloudtool.WaitForSubchats as wait:
+                subchat_ids = getattr(wait, "subchats", None) or list(self.client.subchats)
+                questions = [self.client.subchats.pop(sid) for sid in subchat_ids]
+                roasts = await asyncio.gather(*[self.roast(f"{ft_id}-{sid}", q) for sid, q in zip(subchat_ids, questions)])
+                result = "\n\n".join(roasts)
+            thread.add(result)
+            thread.model_turn()
+            if result.startswith("Over budget"):
+                self.stats["deferred"] += 1
+            if roastmaster_admission.BATCH_CONTINUES not in result:
+                return result
+            thread.expect("batch_continues")
+            args["continue"] = re.findall(r"continue=(\w+)", result)[-1]
+
+    async def roast(self, ft_id: str, question: str) -> str:
+        # Scripted vision expert, follows the roast expert's How To Work steps
+        self.stats["roasts"] += 1
+        thread = Thread("expensive", roastmaster_prompts.SYSTEM_PROMPT, question, self.stats)
+        layout = thread.expect("capture").group(1)
+        thread.expect("pass_ids")
+        lines = question.splitlines()
+        plan = json.loads(lines[lines.index(next(l for l in lines if l.startswith("Capture plan"))) + 1])
+        roast_id = re.search(r'roast_id="([^"]*)"', question).group(1)
+        fresh = "fresh: true" in question
+        urls = [c["url"] for c in plan["capture"]]
+        results: dict[str, str] = {}
+        seen: set[str] = set()
+
+        async def capture(url: str) -> str:
+            canonical = roastmaster_urls.canonicalize_url(url)
+            self.stats["capture_calls"] += 1
+            self.stats["duplicate_captures"] += canonical in seen
+            seen.add(canonical)
+            return await self.call(ft_id, roastmaster_capture.CAPTURE_TOOL.name, {"roast_id": roast_id, "url": url, "layout": layout, "fresh": fresh})
+
+        thread.model_turn()
+        if len(urls) > 1:
+            thread.expect("capture_batch")
+            batch = await self.call(ft_id, "roastmaster_capture_batch", {"roast_id": roast_id, "urls": urls, "layout": layout, "fresh": fresh})
+            thread.add(batch)
+            status = json.loads(roastmaster_capture.tool_result_parts(batch)[0]["m_content"])
+            for url in status["ready"]:
+                self.stats["capture_calls"] += 1
+                seen.add(roastmaster_urls.canonicalize_url(url))
+                results[url] = _texts_for(batch, url)
+            if status["pending"]:
+                thread.expect("capture_pending")
+                thread.model_turn()
+                for url, result in zip(status["pending"], await asyncio.gather(*[capture(u) for u in status["pending"]])):
+                    results[url] = result
+                    thread.add(result)
+        else:
+            for url in urls:
+                results[url] = await capture(url)
+                thread.add(results[url])
+        creatives = plan.get("creatives") or []
+        if creatives:
+            detail = int(thread.expect("creative_sheet").group(1))
+            sheets = await self.call(ft_id, roastmaster_creatives.CREATIVE_SHEET_TOOL.name, {"roast_id": roast_id, "urls": creatives, "detail": detail, "fresh": fresh})
+            thread.add(sheets)
+
+        failed = [url for url, result in results.items() if result.startswith("Error:")]
+        if failed:
+            thread.expect("fallback_web")
+            thread.model_turn()
+            for url in failed:
+                canonical = roastmaster_urls.canonicalize_url(url)
+                opens = [i for i in plan["fallback_web"]["open"] if roastmaster_urls.canonicalize_url(i["url"]) == canonical]
+                thread.add(await self.call(ft_id, "web", {"open": opens}))
+                for item in plan["fallback_web"]["screenshot"]:
+                    if roastmaster_urls.canonicalize_url(item["url"]) == canonical:
+                        thread.add(await self.call(ft_id, "web", {"screenshot": [item]}))
+
+        thread.model_turn()
+        unchanged = [r for r in results.values() if roastmaster_capture.UNCHANGED_MARKER in r]
+        if unchanged and len(unchanged) == len(results):
+            thread.expect("unchanged")
+            return unchanged[0].split("\n\n", 1)[-1]
+        roast = CANNED_ROAST.format(urls=", ".join(urls + creatives))
+        continues = re.search(rf'line "({roastmaster_admission.BATCH_CONTINUES}[^"]*)"', question)
+        if continues:
+            roast += "\n\n" + continues.group(1)
+        thread.messages.append({"m_type": "text", "m_content": roast})
+        thread.expect("save")
+        save_args = {"roast_id": roast_id, "project_name": "", "mode": plan["mode"], "urls": urls + creatives, "score": 6, "roast": roast}
+        thread.add(await self.call(ft_id, "roastmaster_save_roast", save_args))
+        thread.model_turn()
+        return roast
+
+
+async def run_scenario(
+    scenario: dict[str, Any], pages: dict[str, str], creatives: dict[str, tuple[str, int]], render_s: float, chromium: bool,
+) -> dict[str, Any]:
+    rcx = StubRobotContext(f"replay-{scenario['name']}", scenario.get("setup", {}))
+    client = StubFlexusClient()
+    fail = {roastmaster_urls.canonicalize_url(u) for u in scenario.get("capture_fails", [])}
+    redirects = roastmaster_urls.RedirectCache()
+    for url in roastmaster_urls.extract_urls(scenario["message"]):
+        redirects.put(url, url)
+    if chromium:
+        capturer = FixtureBrowser(pages, fail)
+        capture_patches = [
+            (roastmaster_capture.PAGE_CAPTURER, "_get_browser", capturer.get_browser),
+            # The capturer's request guard hands every checked request on to the recorded pages instead of the network
+            (roastmaster_capture, "_fetch_route", lambda route: route.fallback()),
+        ]
+    else:
+        capturer = FixtureCapturer(pages, render_s, fail)
+        capture_patches = [
+            (roastmaster_capture.PAGE_CAPTURER, "capture", capturer.capture),
+            (roastmaster_capture.PAGE_CAPTURER, "capture_stitched", capturer.capture_stitched),
+        ]
+    roastmaster_capture.CAPTURE_CACHE.clear()
+    stubs = patched(
+        *capture_patches,
+        (roastmaster_urls, "_redirects_resolved", redirects),
+        (roastmaster_creatives, "_fetch_blocking", FixtureCreatives(creatives).fetch),
+        # Fixture hosts do not resolve offline, the address check is covered by tests/test_urls.py
+        (roastmaster_urls, "check_public_url", lambda url: None),
+        (roastmaster_install, "integrations", lambda: []),
+        (roastmaster_pdoc, "RoastDocs", MemoryDocs),
+        (score_columns, "ANALYTICS_DIR", Path(tempfile.mkdtemp(prefix="replay-analytics-"))),
+        (roastmaster_admission, "SPEND_DIR", Path(tempfile.mkdtemp(prefix="replay-spend-"))),
+        (ckit_ask_model, "bot_subchat_create_multiple", client.bot_subchat_create_multiple),
+    )
+    with stubs:
+        ckit_shutdown.shutdown_event.clear()
+        loop_task = asyncio.create_task(roastmaster_bot.roastmaster_main_loop(client, rcx))
+        try:
+            while roastmaster_cascade.ROAST_TOOL.name not in rcx.handlers:
+                if loop_task.done():
+                    loop_task.result()
+                await asyncio.sleep(0.01)
+            if chromium:
+                await capturer.get_browser()
+            replay = Replay(rcx, client, pages)
+            t0 = time.perf_counter()
+            for i in range(scenario.get("repeat", 1)):
+                await replay.triage(f"{scenario['name']}-thread-{i}", scenario["message"], scenario.get("mode", "auto"), scenario.get("project_name", ""), False)
+            latency = time.perf_counter() - t0
+        finally:
+            ckit_shutdown.shutdown_event.set()
+            rcx._parked_anything_new.set()
+            await asyncio.wait_for(loop_task, 5.0)
+            ckit_shutdown.shutdown_event.clear()
+            roastmaster_capture.CAPTURE_CACHE.clear()
+            if chromium:
+                await capturer.close()
+
+    s = replay.stats
+    renders = capturer.renders
+    return {
+        "roasts": s["roasts"],
+        "tool_calls": s["tool_calls"],
+        "tool_calls_per_roast": round(s["tool_calls"] / max(1, s["roasts"]), 2),
+        "web_calls": s["web_calls"],
+        "deferred": s["deferred"],
+        "renders": len(renders),
+        "duplicate_captures": s["duplicate_captures"] + len(renders) - len(set(renders)),
+        "images": s["images"],
+        "turns_cheap": s["turns_cheap"],
+        "turns_expensive": s["turns_expensive"],
+        "tokens_cheap": s["tokens_cheap"],
+        "tokens_expensive": s["tokens_expensive"],
+        "latency_s": round(latency, 3),
+    }
+
+
+def check(results: dict[str, dict[str, Any]], thresholds: dict[str, dict[str, float]]) -> list[str]:
+    failures = []
+    for name, limits in thresholds.items():
+        if name not in results:
+            failures.append(f"{name}: scenario missing")
+            continue
+        for metric, limit in limits.items():
+            value = results[name].get(metric)
+            if value is not None and value > limit:
+                failures.append(f"{name}: {metric} {value} > {limit}")
+    return failures
+
+
+def thresholds_from(results: dict[str, dict[str, Any]]) -> dict[str, dict[str, float]]:
+    keep = ("roasts", "tool_calls", "tool_calls_per_roast", "web_calls", "deferred", "renders", "duplicate_captures", "images")
+    out = {}
+    for name, r in results.items():
+        out[name] = {k: r[k] for k in keep}
+        out[name]["tokens_cheap"] = math.ceil(r["tokens_cheap"] * TOKEN_SLACK)
+        out[name]["tokens_expensive"] = math.ceil(r["tokens_expensive"] * TOKEN_SLACK)
+        out[name]["latency_s"] = math.ceil(r["latency_s"] * LATENCY_SLACK * 10) / 10
+    return out
+
+
+async def run_all(
+    scenarios: list[dict[str, Any]], pages: dict[str, str], creatives: dict[str, tuple[str, int]], render_s: float, browser: str,
+) -> tuple[dict[str, dict[str, Any]], str]:
+    chromium = browser == "chromium"
+    if browser == "auto":
+        error = await chromium_error()
+        chromium = not error
+        if error:
+            print(f"chromium unavailable ({error}), captures are cut from the recorded screenshots instead of rendered")
+    return {s["name"]: await run_scenario(s, pages, creatives, render_s, chromium) for s in scenarios}, "chromium" if chromium else "fixtures"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay scripted roasts offline and check tool-call, image, token and latency budgets")
+    parser.add_argument("--scenarios", default=str(SCENARIOS_PATH))
+    parser.add_argument("--thresholds", default=str(THRESHOLDS_PATH))
+    parser.add_argument("--only", action="append", default=[], help="Run only this scenario, repeatable")
+    parser.add_argument(
+        "--browser", choices=["auto", "chromium", "fixtures"], default="auto",
+        help="chromium runs the real PageCapturer on the recorded HTML, fixtures cuts captures from the recorded screenshots",
+    )
+    parser.add_argument("--render-ms", type=float, default=200.0, help="Simulated page render time, fixtures only")
+    parser.add_argument("--update-thresholds", action="store_true", help="Write the current results as the new thresholds")
+    args = parser.parse_args()
+
+    spec = json.loads(Path(args.scenarios).read_text())
+    pages = {roastmaster_urls.canonicalize_url(url): name for url, name in spec["pages"].items()}
+    creatives = {roastmaster_urls.canonicalize_url(url): tuple(c) for url, c in spec.get("creatives", {}).items()}
+    scenarios = [s for s in spec["scenarios"] if not args.only or s["name"] in args.only]
+    try:
+        results, browser = asyncio.run(run_all(scenarios, pages, creatives, args.render_ms / 1000, args.browser))
+    except PromptDrift as exc:
+        print(f"REGRESSION {exc}")
+        return 1
+
+    columns = ["roasts", "tool_calls", "tool_calls_per_roast", "web_calls", "deferred", "renders", "duplicate_captures", "images", "tokens_cheap", "tokens_expensive", "latency_s"]
+    print(f"captures: {browser}")
+    print(f"{'scenario':12} " + " ".join(f"{c:>18}" for c in columns))
+    for name, r in results.items():
+        print(f"{name:12} " + " ".join(f"{r[c]:>18}" for c in columns))
+
+    if args.update_thresholds:
+        Path(args.thresholds).write_text(json.dumps(thresholds_from(results), indent=2) + "\n")
+        print(f"wrote {args.thresholds}")
+        return 0
+    thresholds = json.loads(Path(args.thresholds).read_text())
+    failures = check(results, {k: v for k, v in thresholds.items() if k in results})
+    for failure in failures:
+        print("REGRESSION " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
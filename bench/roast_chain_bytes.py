@@ -0,0 +1,194 @@
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+from roastmaster import roastmaster_chain
+from roastmaster import roastmaster_changes
+
+from digest_token_reduction import html_to_text
+
+
+PAGE = Path(__file__).parent / "pages" / "saas_landing.html"
+# Every item comes in paraphrases: a re-roast is written from scratch, so the same finding rarely keeps its wording
+DEAL_BREAKERS = [
+    (("Vague headline", "Vague hero headline", "Vague headline copy"), (
+        "visitors cannot tell what the product does in three seconds.",
+        "nobody can say what this product does after three seconds on the page.",
+        "three seconds in, a visitor still has no idea what you sell.",
+    )),
+    (("No social proof", "Zero social proof", "No social proof at all"), (
+        "not a single testimonial, logo or number anywhere above the fold.",
+        "above the fold there is no testimonial, no customer logo and no number.",
+        "nothing above the fold proves anyone has ever paid for this.",
+    )),
+    (("Buried CTA", "Buried signup CTA", "CTA buried"), (
+        "the only signup button sits below two screens of feature lists.",
+        "you have to scroll past two screens of features to find the one signup button.",
+        "the single call to action hides under two full screens of feature lists.",
+    )),
+    (("Hidden pricing", "Pricing hidden", "Hidden pricing page"), (
+        "pricing needs a sales call, self-serve buyers leave.",
+        "there is no price without talking to sales, so self-serve buyers bounce.",
+        "self-serve buyers leave because prices are behind a sales call.",
+    )),
+    (("Wall of jargon", "Jargon wall", "A wall of jargon"), (
+        "'synergistic AI-driven platform' is not a benefit.",
+        "'AI-driven synergistic platform' tells a buyer nothing they gain.",
+        "buzzwords like 'synergistic AI platform' replace every actual benefit.",
+    )),
+    (("Slow hero video", "Slow autoplay hero video", "Hero video is slow"), (
+        "the autoplay video blocks the page for four seconds on mobile.",
+        "on mobile the autoplaying video freezes the page for four seconds.",
+        "four seconds of a loading hero video on a phone before anything shows.",
+    )),
+]
+ACTIONS = [(
+    "Rewrite the headline as outcome plus audience: 'X for Y in Z minutes'.",
+    "Make the headline say outcome and audience, like 'X for Y in Z minutes'.",
+    "Turn the headline into 'X for Y in Z minutes': the outcome plus who it is for.",
+), (
+    "Put three customer logos and one quantified testimonial right under the hero.",
+    "Add three customer logos and a testimonial with a number directly below the hero.",
+    "Right under the hero, show three logos and one testimonial that quotes a result.",
+), (
+    "Repeat the primary CTA in the hero and after every second section.",
+    "Put the main CTA in the hero and again after every other section.",
+    "Show the primary call to action in the hero, then repeat it every two sections.",
+), (
+    "Publish at least a starting price or a pricing page.",
+    "Show a starting price, or at least a pricing page.",
+    "Add a pricing page, or at minimum a 'from' price.",
+), (
+    "Cut every adjective that a competitor could also claim.",
+    "Delete every adjective a competitor could put on their own page.",
+    "Remove any adjective your competitors could also use about themselves.",
+), (
+    "Replace the hero video with a static screenshot and a play button.",
+    "Swap the autoplay video for a still screenshot with a play button.",
+    "Use a static screenshot with a play button instead of the hero video.",
+)]
+FILLER = [(
+    "The hero section is a gradient, a stock photo and a sentence that could describe any SaaS company on earth.",
+    "The hero is a gradient, a stock photo and one sentence that fits every SaaS company ever made.",
+    "Above the fold: a gradient, a stock photo and a line any SaaS company could have written.",
+), (
+    "Scrolling down, the feature grid lists twelve icons with three-word captions, none of which says why it matters.",
+    "Further down, twelve feature icons with three-word captions, and not one says why it matters.",
+    "The feature grid is twelve icons and three-word captions that never explain why anyone should care.",
+), (
+    "The footer has more links than the navigation bar, and half of them go to empty blog categories.",
+    "There are more links in the footer than in the nav, and half lead to empty blog categories.",
+    "The footer outnumbers the navigation in links, half of them pointing at empty blog categories.",
+), (
+    "On mobile the sticky banner covers a third of the screen and the close button is smaller than a fingertip.",
+    "On a phone the sticky banner eats a third of the screen, with a close button smaller than a fingertip.",
+    "Mobile visitors get a sticky banner over a third of the screen and a fingertip-sized close button, if that.",
+), (
+    "The page loads a chat widget, two analytics suites and a cookie wall before the headline appears.",
+    "Before the headline shows, the page loads a chat widget, two analytics suites and a cookie wall.",
+    "A chat widget, two analytics suites and a cookie wall all load before the headline does.",
+)]
+
+
+def synth_roast(rng: random.Random, day: int, state: dict) -> tuple[str, float]:
+    # A daily re-roast: the page improves slowly, fixed deal breakers drop off, and every line is written afresh
+    if day and rng.random() < 0.3 and len(state["open"]) > 1:
+        state["open"].pop(rng.randrange(len(state["open"])))
+    if day and rng.random() < 0.15:
+        state["open"].append(rng.choice([i for i in range(len(DEAL_BREAKERS)) if i not in state["open"]] or [0]))
+    score = round(min(9.5, 3 + 6 * (1 - len(state["open"]) / len(DEAL_BREAKERS)) + rng.uniform(-0.3, 0.3)), 1)
+    filler = "\n".join(rng.choice(variants) for variants in FILLER)
+    breakers = "\n".join(f"- **{rng.choice(DEAL_BREAKERS[i][0])}:** {rng.choice(DEAL_BREAKERS[i][1])}" for i in state["open"])
+    actions = "\n".join(f"{n}. {rng.choice(ACTIONS[i])}" for n, i in enumerate(state["open"], 1))
+    roast = (
+        "## 🔥 The Roast (First Impressions)\n" + filler + "\n\n"
+        "## ❌ The Deal Breakers\n" + breakers + "\n\n"
+        "## ✅ The Good Stuff\nThe logo is crisp and the page is on HTTPS.\n\n"
+        "## 🚀 The Action Plan (Fix This Now)\n" + actions + "\n\n"
+        f"## 🏆 Roast Score: {score}/10\nStill not ready to take paid traffic."
+    )
+    return roast, score
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Bytes moved to read a project's roast history: one full document per roast vs keyframe plus deltas")
+    parser.add_argument("--days", type=int, default=30, help="Daily re-roasts of one project")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--min-ratio", type=float, default=3.0, help="Fail if full documents are not at least this many times larger")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    state = {"open": list(range(len(DEAL_BREAKERS)))}
+    # What page_fingerprint stores for one stitched capture, the outline is the bulk of it
+    text = html_to_text(PAGE.read_text())
+    fingerprint = {
+        "text_sha": roastmaster_changes.text_sha(text),
+        "layout": "stitched",
+        "images": [{"dhash": "0f0f0f0f0f0f0f0f", "phash": "f0f0f0f0f0f0f0f0"}],
+        "outline": roastmaster_changes.outline(text),
+    }
+    fingerprints = {"https://example.com/": fingerprint}
+    full_bytes, text_bytes, chain, archives, docs, opened = 0, 0, None, [], [], []
+    for day in range(args.days):
+        roast, score = synth_roast(rng, day, state)
+        doc = {
+            "timestamp": f"2026-09-{1 + day % 28:02d}T{day // 28:02d}:00:00+00:00",
+            "project_name": "Example",
+            "mode": "single",
+            "urls": ["https://example.com"],
+            "score": score,
+            "roast": roast,
+            "fingerprints": fingerprints,
+        }
+        docs.append(doc)
+        opened.append(set(state["open"]))
+        full_bytes += len(json.dumps(doc, indent=2, ensure_ascii=False).encode())
+        text_bytes += len(json.dumps(roast, ensure_ascii=False).encode())
+        chain, archive = roastmaster_chain.append_version(chain, doc)
+        if archive is not None:
+            archives.append(archive)
+    chain_bytes = sum(len(roastmaster_chain.dumps(d).encode()) for d in [chain, *archives])
+    # Fingerprints are kept only on the keyframe, the roast text alone shows what the line and character edits save
+    delta_text_bytes = sum(
+        len(json.dumps(d["roast"], ensure_ascii=False).encode())
+        + sum(len(json.dumps(delta["ops"], ensure_ascii=False).encode()) for delta in d[roastmaster_chain.DELTAS])
+        for d in [chain, *archives]
+    )
+    doc_bytes = len(roastmaster_chain.dumps(chain).encode())
+    view_bytes = len(roastmaster_chain.reader_view(roastmaster_chain.dumps(chain)).encode())
+
+    t0 = time.perf_counter()
+    rebuilt = [v for d in [chain, *archives] for v in roastmaster_chain.versions(json.loads(roastmaster_chain.dumps(d)))]
+    rebuild_ms = (time.perf_counter() - t0) * 1000
+    exact = [v["roast"] for v in rebuilt] == [d["roast"] for d in reversed(docs)][:len(rebuilt)]
+
+    # Paraphrased items must not show up as added or dropped, only deal breakers really opened or fixed
+    summaries = [delta.get("changes") or {} for delta in chain[roastmaster_chain.DELTAS]]
+    breakers_right = actions_right = 0
+    for k, summary in enumerate(summaries):
+        older, newer = opened[-k - 2], opened[-k - 1]
+        breakers = [len(summary.get("deal_breakers_added", [])), len(summary.get("deal_breakers_removed", []))]
+        breakers_right += breakers == [len(newer - older), len(older - newer)]
+        actions_right += len(summary.get("actions_dropped", [])) == len(older - newer)
+
+    ratio = full_bytes / chain_bytes
+    print(f"{args.days} paraphrased roasts, {len(archives)} archive document(s)")
+    print(f"full documents  {full_bytes:9d} bytes")
+    print(f"keyframe+deltas {chain_bytes:9d} bytes  ({ratio:.1f}x smaller, fingerprints kept on the keyframe only)")
+    print(f"roast text      {text_bytes:9d} bytes in full, {delta_text_bytes} as keyframe plus edits ({text_bytes / delta_text_bytes:.1f}x smaller)")
+    print(f"model reads     {view_bytes:9d} bytes  (reader view: newest roast plus change log, {doc_bytes / view_bytes:.1f}x smaller than the chain document)")
+    print(f"rebuilt {len(rebuilt)} versions in {rebuild_ms:.1f} ms, exact: {exact}")
+    print(f"deal breakers added/removed right in {breakers_right}/{len(summaries)} deltas")
+    # Action sentences are reworded more than deal breaker names, actions_dropped is only a hint
+    print(f"actions_dropped right in {actions_right}/{len(summaries)} deltas")
+    failed = not exact or ratio < args.min_ratio or breakers_right < len(summaries)
+    if failed:
+        print("FAILED")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).parent.parent
+# What a bot process does before serving its first event: import, list tools (which loads the integrations), read the setup schema
+STARTUP_SNIPPET = (
+    "import time; t0 = time.perf_counter(); "
+    "import roastmaster.roastmaster_bot as bot; bot.roastmaster_tools(); bot.roastmaster_install.setup_schema(); "
+    "print(f'startup_ms={(time.perf_counter() - t0) * 1000:.1f}')"
+)
+# Modules the bot must not load on start, they belong to install or to the first capture
+FORBIDDEN = ("gql", "flexus_simple_bots", "roastmaster.roastmaster_marketplace", "requests", "PIL", "playwright")
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def run_once() -> tuple[float, list[tuple[int, int, str]]]:
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_ROOT), os.environ.get("PYTHONPATH", "")]))}
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_SNIPPET], capture_output=True, text=True, env=env, cwd=REPO_ROOT)
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr[-2000:])
+    startup_ms = float(re.search(r"startup_ms=([\d.]+)", proc.stdout).group(1))
+    modules = []
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if m:
+            modules.append((int(m.group(1)), int(m.group(2)), m.group(4)))
+    return startup_ms, modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Bot cold-start time and imports, measured with python -X importtime")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start, the median is reported")
+    parser.add_argument("--budget-ms", type=float, default=400.0, help="Fail if the median startup exceeds this")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules by self time to list")
+    args = parser.parse_args()
+
+    run_once()  # warm the bytecode cache
+    runs = [run_once() for _ in range(max(1, args.runs))]
+    startup = statistics.median(ms for ms, _ in runs)
+    _, modules = runs[-1]
+
+    print(f"{'self ms':>8} {'cumul ms':>9}  module")
+    for self_us, cumul_us, name in sorted(modules, reverse=True)[:args.top]:
+        print(f"{self_us / 1000:8.1f} {cumul_us / 1000:9.1f}  {name}")
+    print(f"\nstartup median of {len(runs)}: {startup:.1f} ms (budget {args.budget_ms:.0f} ms), {len(modules)} modules imported")
+
+    loaded = {name for _, _, name in modules}
+    forbidden = sorted(name for name in loaded if any(name == f or name.startswith(f + ".") for f in FORBIDDEN))
+    for name in forbidden:
+        print(f"FORBIDDEN import on bot start: {name}")
+    if startup > args.budget_ms:
+        print("OVER BUDGET")
+    return 1 if forbidden or startup > args.budget_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
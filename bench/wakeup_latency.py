@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import random
+import sys
+import types
+
+from flexus_client_kit import ckit_shutdown
+
+from roastmaster import roastmaster_wakeup
+
+
+class ArrivalContext:
+    # Stand-in for RobotContext: parks events and sets the arrival event, unpark sleeps like a timed poll when idle
+    def __init__(self) -> None:
+        self.persona = types.SimpleNamespace(persona_id="bench")
+        self._parked_anything_new = asyncio.Event()
+        self.parked: list[int] = []
+        self.handled = 0
+
+    def park(self, n: int) -> None:
+        self.parked.append(n)
+        self._parked_anything_new.set()
+
+    async def unpark_collected_events(self, sleep_if_no_work: float) -> None:
+        if not self.parked:
+            await asyncio.sleep(sleep_if_no_work)
+            return
+        self.handled += len(self.parked)
+        self.parked.clear()
+
+
+async def run_mode(mode: str, events: int, poll_s: float, seed: int) -> dict[str, float]:
+    rcx = ArrivalContext()
+    wakeup = roastmaster_wakeup.PersonaWakeup(rcx, mode=mode, poll_s=poll_s)
+    rng = random.Random(seed)
+
+    async def produce() -> None:
+        for n in range(events):
+            await asyncio.sleep(rng.uniform(0.2, 1.8) * poll_s)
+            rcx.park(n)
+        while rcx.parked:
+            await asyncio.sleep(poll_s / 10)
+        ckit_shutdown.shutdown_event.set()
+
+    producer = asyncio.create_task(produce())
+    try:
+        while not ckit_shutdown.shutdown_event.is_set():
+            await wakeup.run_once()
+    finally:
+        ckit_shutdown.shutdown_event.clear()
+        await producer
+    return wakeup.stats()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Event pickup latency of PersonaWakeup, event-driven against timed polling")
+    parser.add_argument("--events", type=int, default=40, help="Events parked per mode, at random gaps around the poll interval")
+    parser.add_argument("--poll-s", type=float, default=0.5, help="Poll interval, scaled down from the bot's 10s to keep the bench short")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rows = [(mode, asyncio.run(run_mode(mode, args.events, args.poll_s, args.seed))) for mode in roastmaster_wakeup.WAKEUP_MODES]
+    scale = roastmaster_wakeup.POLL_FALLBACK_S / args.poll_s
+    print(f"{'mode':<8} {'pickups':>7} {'wakeups':>8} {'p50_ms':>9} {'p99_ms':>9} {'p50_ms@10s':>11} {'p99_ms@10s':>11}")
+    for mode, stats in rows:
+        # Poll latency grows with the interval, event pickup does not
+        k = scale if mode == roastmaster_wakeup.POLL else 1.0
+        print(
+            f"{mode:<8} {stats['count']:>7} {stats['wakeups']:>8} {stats['p50_ms']:>9} {stats['p99_ms']:>9} "
+            f"{stats['p50_ms'] * k:>11.1f} {stats['p99_ms'] * k:>11.1f}"
+        )
+    event, poll = dict(rows)[roastmaster_wakeup.EVENT], dict(rows)[roastmaster_wakeup.POLL]
+    # Arrivals that land in one poll sleep are picked up together, so poll mode has fewer pickups than events
+    return 0 if event["count"] == args.events and poll["count"] and event["p99_ms"] < poll["p50_ms"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+import dataclasses
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from roastmaster import roastmaster_tracing
+
+
+logger = logging.getLogger("roastmaster_admission")
+
+SPEND_DIR = Path(os.environ.get("ROASTMASTER_SPEND_DIR", Path.home() / ".cache" / "roastmaster" / "spend"))
+
+DAILY_BUDGET_DEFAULT = 100_000
+MAX_INPROGRESS_DEFAULT = 2
+# Batches only plan into this share of the daily budget, the rest stays free for single roasts
+BATCH_BUDGET_SHARE = 0.8
+# A queued roast that has not started by then is dropped, the user has long moved on
+QUEUE_MAX_WAIT_S = 1800.0
+QUEUE_MAX_DEPTH = 8
+# A roast that neither saved nor called a tool for this long has ended without saving
+LEASE_IDLE_S = 600.0
+BATCH_KEEP_S = 2 * 86400
+BATCH_CONTINUES = "Batch continues"
+QUEUED = "Queued"
+SLOT_FREE = "Slot free"
+
+
+class RoastDeferred(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class Lease:
+    tokens: int
+    last_active: float
+
+
+@dataclasses.dataclass
+class PendingBatch:
+    batch_id: str
+    groups: list[list[dict[str, str]]]
+    estimates: list[int]
+    total: int
+    created_ts: float
+    # What the roasts of every later chunk need: message, plan, project name, fresh
+    request: dict[str, Any]
+
+
+@dataclasses.dataclass(order=True)
+class Ticket:
+    # Cheapest request first, FIFO among equals
+    tokens: int
+    seq: int
+    slots: int = dataclasses.field(compare=False)
+    batch: bool = dataclasses.field(compare=False)
+    payload: Any = dataclasses.field(compare=False, default=None)
+    queued_ts: float = dataclasses.field(compare=False, default_factory=time.monotonic)
+    # Batch id the calling thread resumes with once the ticket is admitted
+    key: str = dataclasses.field(compare=False, default="")
+
+
+def continues_line(queued: int, batch_id: str) -> str:
+    return f"{BATCH_CONTINUES}: {queued} more queued, continue={batch_id}"
+
+
+def slot_free_line(batch_id: str) -> str:
+    return f"{SLOT_FREE}: the queued roast can start now, call roastmaster_roast with continue={batch_id}"
+
+
+def _utc_day() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def spend_path(persona_id: str) -> Path:
+    return SPEND_DIR / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', persona_id)}.json"
+
+
+class AdmissionControl:
+    def __init__(
+        self, persona_id: str, daily_budget: int = DAILY_BUDGET_DEFAULT, max_inprogress: int = MAX_INPROGRESS_DEFAULT, path: Path | None = None,
+    ) -> None:
+        self.persona_id = persona_id
+        self.daily_budget = daily_budget
+        self.max_inprogress = max(1, max_inprogress)
+        # Today's spend survives restarts in this file, without a path it is kept in memory only
+        self.path = Path(path) if path else None
+        self.day = _utc_day()
+        self.spent = self._load_spent()
+        self.leases: dict[str, Lease] = {}
+        self.granted = 0
+        self.batches: dict[str, PendingBatch] = {}
+        self.admitted = 0
+        self.deferred = 0
+        self._queue: list[Ticket] = []
+        self._ready: list[Ticket] = []
+        # Admitted tickets whose slots are held until their thread calls back with the batch id
+        self.reserved: dict[str, tuple[Ticket, float]] = {}
+        # Queued tickets that will not start, with the message their thread gets instead
+        self.dropped: list[tuple[Ticket, str]] = []
+        self._seq = itertools.count()
+
+    def _load_spent(self) -> int:
+        if self.path is None:
+            return 0
+        try:
+            saved = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(saved, dict) or saved.get("day") != self.day:
+            return 0
+        # Roasts in flight when the process stopped are charged at their estimate
+        return int(saved.get("spent") or 0) + int(saved.get("leased") or 0)
+
+    def _save_spent(self) -> None:
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"day": self.day, "spent": self.spent, "leased": sum(lease.tokens for lease in self.leases.values())}, f)
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            logger.warning("%s cannot save today's spend to %s: %s", self.persona_id, self.path, exc)
+
+    def _roll_day(self) -> None:
+        if _utc_day() != self.day:
+            self.day, self.spent = _utc_day(), 0
+
+    @property
+    def projected(self) -> int:
+        self._roll_day()
+        return self.spent + sum(lease.tokens for lease in self.leases.values())
+
+    def headroom(self, batch: bool) -> int:
+        return int(self.daily_budget * (BATCH_BUDGET_SHARE if batch else 1.0)) - self.projected
+
+    def free_slots(self) -> int:
+        return self.max_inprogress - len(self.leases) - self.granted
+
+    def next_chunk(
+        self, batch_id: str, groups: list[list[dict[str, str]]], estimates: list[int], request: dict[str, Any],
+    ) -> tuple[PendingBatch, int]:
+        # Returns the batch and how many of its groups to start now. Only a call that passes back the batch id
+        # from a "Batch continues" line resumes a batch, a new request for the same URLs starts from scratch
+        now = time.time()
+        for k in [k for k, b in self.batches.items() if now - b.created_ts > BATCH_KEEP_S]:
+            del self.batches[k]
+        pending = self.batches.get(batch_id) if batch_id else None
+        if pending is None:
+            pending = PendingBatch(uuid.uuid4().hex[:8], groups, estimates, len(groups), now, request)
+        batch = pending.total > 1
+        headroom = self.headroom(batch)
+        count, tokens = 0, 0
+        for est in pending.estimates[:self.max_inprogress if batch else None]:
+            if tokens + est > headroom:
+                break
+            count, tokens = count + 1, tokens + est
+        if not count:
+            if batch:
+                self.batches[pending.batch_id] = pending
+            self._defer("over_budget")
+            raise RoastDeferred(self._budget_message(pending.estimates[0], pending.batch_id if batch else "", len(pending.groups)))
+        return pending, count
+
+    def commit_chunk(self, pending: PendingBatch, started: int) -> None:
+        pending.groups, pending.estimates = pending.groups[started:], pending.estimates[started:]
+        if pending.groups:
+            self.batches[pending.batch_id] = pending
+        else:
+            self.batches.pop(pending.batch_id, None)
+
+    def submit(self, slots: int, tokens: int, batch: bool, payload: Any = None, key: str = "") -> bool:
+        # Never waits: True when the slots are granted now, False when the ticket is queued for ready().
+        # Granted slots stay reserved until lease() binds them to roasts
+        self._expire()
+        if len(self._queue) >= QUEUE_MAX_DEPTH:
+            self._defer("queue_full")
+            raise RoastDeferred(
+                f"Busy: {len(self.leases)} roasts are running and {len(self._queue)} more are queued. "
+                f"Tell the user RoastMaster is busy and to ask again in a few minutes."
+            )
+        ticket = Ticket(tokens, next(self._seq), slots, batch, payload, key=key)
+        heapq.heappush(self._queue, ticket)
+        self._dispatch()
+        if ticket not in self._ready:
+            return False
+        self._ready.remove(ticket)
+        if not self._admit(ticket):
+            raise RoastDeferred(self._budget_message(tokens, "", slots))
+        return True
+
+    def ready(self) -> list[Ticket]:
+        # Called from the persona loop: queued tickets whose slots came free, in admission order. Their slots stay
+        # reserved under the ticket key until claim(), queued tickets that will not start go to dropped
+        self._expire()
+        now = time.monotonic()
+        for ticket in [t for t in self._queue if now - t.queued_ts > QUEUE_MAX_WAIT_S]:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._defer("queue_timeout")
+            self.dropped.append((ticket, (
+                f"The queued roast waited {QUEUE_MAX_WAIT_S / 60:.0f} minutes without a free slot and did not start. "
+                f"If the user still wants it, call roastmaster_roast with continue={ticket.key}."
+            )))
+        self._dispatch()
+        ready, self._ready = self._ready, []
+        admitted = []
+        for ticket in ready:
+            if self._admit(ticket):
+                self.reserved[ticket.key] = (ticket, now)
+                admitted.append(ticket)
+            else:
+                self.dropped.append((ticket, self._budget_message(ticket.tokens, ticket.key, ticket.slots)))
+        return admitted
+
+    def take_dropped(self) -> list[tuple[Ticket, str]]:
+        dropped, self.dropped = self.dropped, []
+        return dropped
+
+    def claim(self, key: str) -> Ticket | None:
+        ticket, _ = self.reserved.pop(key, (None, 0.0))
+        return ticket
+
+    def queue_position(self, key: str) -> int:
+        return next((i for i, t in enumerate(sorted(self._queue)) if t.key == key), -1)
+
+    def _admit(self, ticket: Ticket) -> bool:
+        if ticket.tokens > self.headroom(ticket.batch):
+            # Other roasts finished over their estimate while this one waited
+            self.granted -= ticket.slots
+            self._dispatch()
+            self._defer("over_budget")
+            return False
+        self.admitted += 1
+        tracer = roastmaster_tracing.TRACER
+        tracer.record_duration("admission_wait", "", time.monotonic() - ticket.queued_ts, persona_id=self.persona_id, slots=ticket.slots, tokens_est=ticket.tokens)
+        tracer.count("admitted", "admission")
+        return True
+
+    def lease(self, roast_id: str, tokens: int) -> None:
+        self.granted = max(0, self.granted - 1)
+        self.leases[roast_id] = Lease(tokens, time.time())
+        self._save_spent()
+        self._export()
+
+    def touch(self, roast_id: str) -> None:
+        if roast_id in self.leases:
+            self.leases[roast_id].last_active = time.time()
+
+    def release(self, roast_id: str, tokens: int | None = None) -> None:
+        lease = self.leases.pop(roast_id, None)
+        if lease is None:
+            return
+        self._roll_day()
+        self.spent += lease.tokens if tokens is None else tokens
+        self._save_spent()
+        self._dispatch()
+
+    def _expire(self) -> None:
+        now = time.time()
+        for roast_id, lease in list(self.leases.items()):
+            if now - lease.last_active > LEASE_IDLE_S:
+                logger.info("%s roast %s idle for %.0fs, slot released", self.persona_id, roast_id, now - lease.last_active)
+                self.release(roast_id)
+        for key, (ticket, reserved_ts) in list(self.reserved.items()):
+            if time.monotonic() - reserved_ts > LEASE_IDLE_S:
+                logger.info("%s batch %s never called back for its slot, released", self.persona_id, key)
+                del self.reserved[key]
+                self.granted -= ticket.slots
+                self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._queue and self.free_slots() >= min(self._queue[0].slots, self.max_inprogress):
+            ticket = heapq.heappop(self._queue)
+            self.granted += ticket.slots
+            self._ready.append(ticket)
+        self._export()
+
+    def _defer(self, reason: str) -> None:
+        self.deferred += 1
+        roastmaster_tracing.TRACER.count(reason, "admission")
+        logger.info("%s deferred a roast: %s, projected %d of %d tokens", self.persona_id, reason, self.projected, self.daily_budget)
+
+    def _budget_message(self, tokens: int, batch_id: str, groups: int) -> str:
+        msg = f"Over budget: today's roasts come to about {self.projected} of {self.daily_budget} tokens and the next roast needs about {tokens}. "
+        if batch_id:
+            return msg + (
+                f"The remaining {groups} part(s) of this batch stay queued. Tell the user, and once the budget resets at 00:00 UTC "
+                f"call roastmaster_roast again with continue={batch_id} to resume the batch."
+            )
+        return msg + "Tell the user the daily roast budget is used up and resets at 00:00 UTC."
+
+    def _export(self) -> None:
+        tracer = roastmaster_tracing.TRACER
+        tracer.set_gauge("admission_queue_depth", self.persona_id, len(self._queue))
+        tracer.set_gauge("admission_inprogress", self.persona_id, len(self.leases) + self.granted)
+        tracer.set_gauge("admission_projected_tokens", self.persona_id, self.projected)
+        tracer.set_gauge("admission_queued_batch_groups", self.persona_id, sum(len(b.groups) for b in self.batches.values()))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "admitted": self.admitted,
+            "deferred": self.deferred,
+            "inprogress": len(self.leases),
+            "queued": len(self._queue),
+            "projected_tokens": self.projected,
+            "daily_budget": self.daily_budget,
+        }
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import logging
+from typing import Any
+
+from flexus_client_kit import ckit_cloudtool
+
+from roastmaster import roastmaster_capture
+from roastmaster import roastmaster_urls
+
+
+logger = logging.getLogger("roastmaster_batch")
+
+BATCH_MAX_URLS = 10
+BATCH_GRACE_S = 1.0
+
+CAPTURE_BATCH_TOOL = ckit_cloudtool.CloudTool(
+    strict=True,
+    name="roastmaster_capture_batch",
+    description=(
+        "Start capturing all URLs of a multi-URL plan in parallel and return as soon as the first ones are ready. "
+        "URLs still rendering are listed as pending, fetch each of them later with roastmaster_capture, it picks up the running capture."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "roast_id": {"type": "string", "description": "Roast id from the roast request, empty string if there was none"},
+            "urls": {"type": "array", "items": {"type": "string"}, "description": "URLs exactly as in the plan's capture array"},
+            "layout": {"type": "string", "enum": list(roastmaster_capture.CAPTURE_LAYOUTS), "description": "Capture layout set in your instructions"},
+            "fresh": {"type": "boolean", "description": "Bypass the cache and render the pages again"},
+        },
+        "required": ["roast_id", "urls", "layout", "fresh"],
+        "additionalProperties": False,
+    },
+)
+
+_background: set[asyncio.Task] = set()
+
+
+async def handle_capture_batch(model_produced_args: dict[str, Any], setup: dict[str, Any], history: Any) -> str:
+    layout = model_produced_args.get("layout") or roastmaster_capture.STITCHED
+    fresh = bool(model_produced_args.get("fresh"))
+    roast_id = model_produced_args.get("roast_id") or ""
+    urls = [u["url"] for u in await roastmaster_urls.dedupe_urls(model_produced_args.get("urls") or [], resolve=False)]
+    if not urls:
+        return "Error: urls is empty, pass the plan's capture URLs"
+    if len(urls) > BATCH_MAX_URLS:
+        return f"Error: at most {BATCH_MAX_URLS} URLs per batch, split the plan into several batches"
+
+    tasks = {
+        asyncio.create_task(roastmaster_capture.handle_capture({"roast_id": roast_id, "url": url, "layout": layout, "fresh": fresh}, setup, history)): url
+        for url in urls
+    }
+    for task in tasks:
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    if pending:
+        # Let pages that are about to finish join the first response instead of costing another tool call
+        more, pending = await asyncio.wait(pending, timeout=BATCH_GRACE_S)
+        done |= more
+
+    ready = [url for url in urls if any(tasks[t] == url for t in done)]
+    waiting = [url for url in urls if url not in ready]
+    parts = [{"m_type": "text", "m_content": json.dumps({"ready": ready, "pending": waiting})}]
+    for task in sorted(done, key=lambda t: urls.index(tasks[t])):
+        parts.extend(roastmaster_capture.tool_result_parts(task.result()))
+    if waiting:
+        parts.append({"m_type": "text", "m_content": "Pending URLs are still rendering in the background, call roastmaster_capture for each of them with the same roast_id and layout and fresh=false."})
+    logger.info("batch of %d: %d ready, %d pending", len(urls), len(ready), len(waiting))
+    return json.dumps(parts)
@@ -1,30 +1,184 @@
 import asyncio
+import functools
 import json
 import logging
 import os
+from typing import Any
 
-from flexus_client_kit import ckit_bot_exec, ckit_client, ckit_integrations_db, ckit_shutdown
+from flexus_client_kit import ckit_bot_exec, ckit_client, ckit_cloudtool, ckit_integrations_db, ckit_shutdown
 
+from analytics import score_columns
+from roastmaster import roastmaster_admission
+from roastmaster import roastmaster_batch
+from roastmaster import roastmaster_capture
+from roastmaster import roastmaster_cascade
+from roastmaster import roastmaster_creatives
+from roastmaster import roastmaster_history
 from roastmaster import roastmaster_install
+from roastmaster import roastmaster_pdoc
+from roastmaster import roastmaster_tracing
+from roastmaster import roastmaster_urls
+from roastmaster import roastmaster_wakeup
 
 
 logger = logging.getLogger("bot_roastmaster")
 
 BOT_NAME = "roastmaster"
 BOT_VERSION = "0.0.119"
-ROASTMASTER_INTEGRATIONS = roastmaster_install.ROASTMASTER_INTEGRATIONS
-TOOLS = [tool for record in ROASTMASTER_INTEGRATIONS for tool in record.integr_tools]
+
+
+@functools.cache
+def roastmaster_tools() -> list[ckit_cloudtool.CloudTool]:
+    return [
+        roastmaster_urls.PLAN_CAPTURE_TOOL,
+        roastmaster_cascade.ROAST_TOOL,
+        roastmaster_capture.CAPTURE_TOOL,
+        roastmaster_batch.CAPTURE_BATCH_TOOL,
+        roastmaster_creatives.CREATIVE_SHEET_TOOL,
+        roastmaster_history.FIND_PRIOR_ROAST_TOOL,
+        roastmaster_history.SAVE_ROAST_TOOL,
+        roastmaster_history.SCORE_STATS_TOOL,
+        *[tool for record in roastmaster_install.integrations() for tool in record.integr_tools],
+    ]
+
+
+def __getattr__(name: str) -> Any:
+    if name == "TOOLS":
+        return roastmaster_tools()
+    if name == "ROASTMASTER_INTEGRATIONS":
+        return roastmaster_install.integrations()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 async def roastmaster_main_loop(fclient: ckit_client.FlexusClient, rcx: ckit_bot_exec.RobotContext) -> None:
-    setup = ckit_bot_exec.official_setup_mixing_procedure(roastmaster_install.ROASTMASTER_SETUP_SCHEMA, rcx.persona.persona_setup)
-    await ckit_integrations_db.main_loop_integrations_init(ROASTMASTER_INTEGRATIONS, rcx, setup)
+    setup = ckit_bot_exec.official_setup_mixing_procedure(roastmaster_install.setup_schema(), rcx.persona.persona_setup)
+    await ckit_integrations_db.main_loop_integrations_init(roastmaster_install.integrations(), rcx, setup)
+    scores = score_columns.ScoreColumns(score_columns.store_path(rcx.persona.persona_id))
+    history = roastmaster_history.RoastHistory(roastmaster_pdoc.RoastDocs(rcx), scores)
+    ledger = roastmaster_cascade.RoastLedger()
+    admission = roastmaster_admission.AdmissionControl(
+        rcx.persona.persona_id,
+        daily_budget=int(setup.get("roast_daily_token_budget", roastmaster_admission.DAILY_BUDGET_DEFAULT)),
+        max_inprogress=int(setup.get("roast_max_inprogress", roastmaster_admission.MAX_INPROGRESS_DEFAULT)),
+        path=roastmaster_admission.spend_path(rcx.persona.persona_id),
+    )
+
+    tracer = roastmaster_tracing.TRACER
+    await tracer.serve_metrics()
+    persona_id = rcx.persona.persona_id
+    cheap_prompt = roastmaster_cascade.PROMPT_TOKENS[roastmaster_cascade.MODEL_CHEAP]
+    expensive_prompt = roastmaster_cascade.PROMPT_TOKENS[roastmaster_cascade.MODEL_EXPENSIVE]
+
+    def roast_attrs(model_produced_args: dict[str, Any], urls: list[str]) -> dict[str, Any]:
+        # Roast subchats run in threads of their own, every call names its roast
+        roast = ledger.roasts.get(model_produced_args.get("roast_id") or "")
+        if roast is not None:
+            admission.touch(roast.roast_id)
+        return {"trace_id": roast.roast_id if roast else "", "mode": roast.mode if roast else "", "url_count": len(urls)}
+
+    def finish_roast(roast_id: str, ft_id: str) -> None:
+        report = ledger.finish_roast(roast_id, ft_id)
+        if report is None:
+            return
+        admission.release(roast_id, roastmaster_cascade.report_tokens(report))
+        tracer.record_duration(
+            "roast", roast_id, report["latency_s"] or 0.0,
+            persona_id=persona_id, mode=report["mode"], url_count=report["urls"],
+            images=report["expensive"]["images"], tokens_in_est=report["cheap"]["tokens_in_est"] + report["expensive"]["tokens_in_est"],
+        )
+
+    @rcx.on_tool_call(roastmaster_urls.PLAN_CAPTURE_TOOL.name)
+    async def toolcall_plan_capture(toolcall: ckit_cloudtool.FCloudtoolCall, model_produced_args: dict[str, Any]) -> str:
+        with tracer.tool_span("plan", toolcall.fcall_ft_id, prompt_tokens=cheap_prompt, persona_id=persona_id, tier="cheap") as span:
+            result = await roastmaster_urls.handle_plan_capture(model_produced_args)
+            plan = json.loads(result)
+            span.set(mode=plan.get("mode", ""), url_count=len(plan.get("urls", [])), **roastmaster_cascade.usage_attrs(result))
+        ledger.note_triage_call(toolcall.fcall_ft_id, result)
+        return result
+
+    @rcx.on_tool_call(roastmaster_cascade.ROAST_TOOL.name)
+    async def toolcall_roast(toolcall: ckit_cloudtool.FCloudtoolCall, model_produced_args: dict[str, Any]) -> str:
+        with tracer.tool_span(
+            "roast_handoff", toolcall.fcall_ft_id, prompt_tokens=cheap_prompt, ok_exceptions=(ckit_cloudtool.WaitForSubchats,),
+            persona_id=persona_id, tier="cheap",
+        ):
+            return await roastmaster_cascade.handle_roast(fclient, rcx, ledger, admission, toolcall, model_produced_args)
+
+    @rcx.on_tool_call(roastmaster_capture.CAPTURE_TOOL.name)
+    async def toolcall_capture(toolcall: ckit_cloudtool.FCloudtoolCall, model_produced_args: dict[str, Any]) -> str:
+        attrs = roast_attrs(model_produced_args, [model_produced_args.get("url") or ""])
+        with tracer.tool_span("capture", toolcall.fcall_ft_id, prompt_tokens=expensive_prompt, persona_id=persona_id, tier="expensive", **attrs) as span:
+            result = await roastmaster_capture.handle_capture(model_produced_args, setup, history)
+            span.set(**roastmaster_cascade.usage_attrs(result))
+        ledger.note_roast_call(toolcall.fcall_ft_id, result)
+        roast = ledger.roasts.get(attrs["trace_id"])
+        if roast is not None and roast.url_count == 1 and roastmaster_capture.UNCHANGED_MARKER in result:
+            # Answered from the stored roast, there will be no save to free the slot
+            finish_roast(roast.roast_id, toolcall.fcall_ft_id)
+        return result
+
+    @rcx.on_tool_call(roastmaster_batch.CAPTURE_BATCH_TOOL.name)
+    async def toolcall_capture_batch(toolcall: ckit_cloudtool.FCloudtoolCall, model_produced_args: dict[str, Any]) -> str:
+        attrs = roast_attrs(model_produced_args, [u for u in model_produced_args.get("urls") or [] if isinstance(u, str)])
+        with tracer.tool_span("capture_batch", toolcall.fcall_ft_id, prompt_tokens=expensive_prompt, persona_id=persona_id, tier="expensive", **attrs) as span:
+            result = await roastmaster_batch.handle_capture_batch(model_produced_args, setup, history)
+            span.set(**roastmaster_cascade.usage_attrs(result))
+        ledger.note_roast_call(toolcall.fcall_ft_id, result)
+        return result
+
+    @rcx.on_tool_call(roastmaster_creatives.CREATIVE_SHEET_TOOL.name)
+    async def toolcall_creative_sheet(toolcall: ckit_cloudtool.FCloudtoolCall, model_produced_args: dict[str, Any]) -> str:
+        attrs = roast_attrs(model_produced_args, [u for u in model_produced_args.get("urls") or [] if isinstance(u, str)])
+        with tracer.tool_span("creative_sheet", toolcall.fcall_ft_id, prompt_tokens=expensive_prompt, persona_id=persona_id, tier="expensive", **attrs) as span:
+            result = await roastmaster_creatives.handle_creative_sheet(model_produced_args, setup)
+            span.set(**roastmaster_cascade.usage_attrs(result))
+        ledger.note_roast_call(toolcall.fcall_ft_id, result)
+        return result
+
+    @rcx.on_tool_call(roastmaster_history.FIND_PRIOR_ROAST_TOOL.name)
+    async def toolcall_find_prior_roast(toolcall: ckit_cloudtool.FCloudtoolCall, model_produced_args: dict[str, Any]) -> str:
+        urls = [u for u in model_produced_args.get("urls") or [] if isinstance(u, str)]
+        with tracer.tool_span("find_prior_roast", toolcall.fcall_ft_id, prompt_tokens=cheap_prompt, persona_id=persona_id, url_count=len(urls)) as span:
+            result = await roastmaster_history.handle_find_prior_roast(history, model_produced_args)
+            span.set(**roastmaster_cascade.usage_attrs(result))
+        ledger.note_triage_call(toolcall.fcall_ft_id, result)
+        return result
+
+    @rcx.on_tool_call(roastmaster_history.SCORE_STATS_TOOL.name)
+    async def toolcall_score_stats(toolcall: ckit_cloudtool.FCloudtoolCall, model_produced_args: dict[str, Any]) -> str:
+        question = model_produced_args.get("question") or ""
+        with tracer.tool_span("score_stats", toolcall.fcall_ft_id, prompt_tokens=cheap_prompt, persona_id=persona_id, question=question) as span:
+            result = await roastmaster_history.handle_score_stats(history, model_produced_args)
+            span.set(**roastmaster_cascade.usage_attrs(result))
+        ledger.note_triage_call(toolcall.fcall_ft_id, result)
+        return result
+
+    @rcx.on_tool_call(roastmaster_history.SAVE_ROAST_TOOL.name)
+    async def toolcall_save_roast(toolcall: ckit_cloudtool.FCloudtoolCall, model_produced_args: dict[str, Any]) -> str:
+        roast_id = model_produced_args.get("roast_id") or ""
+        urls = [u for u in model_produced_args.get("urls") or [] if isinstance(u, str)]
+        with tracer.tool_span(
+            "save", toolcall.fcall_ft_id, trace_id=roast_id, prompt_tokens=expensive_prompt,
+            persona_id=persona_id, tier="expensive", mode=model_produced_args.get("mode") or "", url_count=len(urls),
+        ) as span:
+            result = await roastmaster_history.handle_save_roast(history, toolcall.fcall_ft_id, model_produced_args)
+            span.set(tokens_in_est=len(model_produced_args.get("roast") or "") // 4)
+        finish_roast(roast_id, toolcall.fcall_ft_id)
+        return result
 
+    wakeup = roastmaster_wakeup.PersonaWakeup(rcx)
+    history.start_score_sync()
     try:
         while not ckit_shutdown.shutdown_event.is_set():
-            await rcx.unpark_collected_events(sleep_if_no_work=10.0)
+            await wakeup.run_once()
+            await roastmaster_cascade.start_queued(fclient, rcx, ledger, admission)
     finally:
-        logger.info("%s exit", rcx.persona.persona_id)
+        logger.info(
+            "%s exit, wakeup %s, capture cache %s, cascade %s, admission %s, score columns %s",
+            rcx.persona.persona_id, wakeup.stats(), roastmaster_capture.CAPTURE_CACHE.stats(), ledger.summary(), admission.stats(), scores.stats(),
+        )
+        history.stop_score_sync()
+        scores.close()
 
 
 def main() -> None:
@@ -35,7 +189,7 @@ def main() -> None:
         marketable_name=BOT_NAME,
         marketable_version_str=BOT_VERSION,
         bot_main_loop=roastmaster_main_loop,
-        inprocess_tools=TOOLS,
+        inprocess_tools=roastmaster_tools(),
         scenario_fn=scenario_fn,
         install_func=roastmaster_install.install,
     ))
@@ -0,0 +1,445 @@
+import asyncio
+import base64
+import collections
+import dataclasses
+import io
+import json
+import logging
+import math
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+from flexus_client_kit import ckit_cloudtool
+
+from roastmaster import roastmaster_changes
+from roastmaster import roastmaster_digest
+from roastmaster import roastmaster_imagehash
+from roastmaster import roastmaster_urls
+
+
+logger = logging.getLogger("roastmaster_capture")
+
+CAPTURE_TIMEOUT_MS = 30_000
+CAPTURE_DEADLINE_S = 45.0
+MAX_CONCURRENT_CAPTURES = 4
+MAX_CAPTURES_PER_HOST = 2
+SETTLE_AFTER_SCROLL_S = 0.3
+WEBP_QUALITY = 80
+CACHE_TTL_DEFAULT_S = 3600
+CACHE_MAX_BYTES_DEFAULT = 256 * 1024 * 1024
+IMAGE_MAX_SIDE = 1280
+STITCHED_MAX_FOLDS = 6
+STITCHED = "stitched"
+VIEWPORTS = "viewports"
+CAPTURE_LAYOUTS = (STITCHED, VIEWPORTS)
+UNCHANGED_MARKER = "NO CHANGES DETECTED"
+LOCAL_SCHEMES = ("data", "blob", "about")
+
+CAPTURE_TOOL = ckit_cloudtool.CloudTool(
+    strict=True,
+    name="roastmaster_capture",
+    description=(
+        "Capture one URL from the roastmaster_plan_capture plan: page text plus either one stitched full-page image "
+        "with labelled folds (layout=stitched) or three viewport screenshots at scroll 0.0/0.5/1.0 (layout=viewports). "
+        "Recently captured pages are served from a local cache, set fresh=true only when the user asks to re-roast fresh."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "roast_id": {"type": "string", "description": "Roast id from the roast request, empty string if there was none"},
+            "url": {"type": "string", "description": "URL exactly as it appears in the plan's capture array"},
+            "layout": {"type": "string", "enum": list(CAPTURE_LAYOUTS), "description": "Capture layout set in your instructions"},
+            "fresh": {"type": "boolean", "description": "Bypass the cache and render the page again"},
+        },
+        "required": ["roast_id", "url", "layout", "fresh"],
+        "additionalProperties": False,
+    },
+)
+
+CacheKey = tuple[str, str, str]
+
+
+@dataclasses.dataclass
+class RenderedPage:
+    text: str
+    html: str
+    above_fold: str
+    images: list[bytes]
+    tiles: list[dict[str, Any]] = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass
+class CacheEntry:
+    # One entry per capture: the deduplicated WEBP renders of a page (or the downloaded file of a creative),
+    # text, digest and tile decisions once
+    images: list[bytes]
+    text: str
+    stored_ts: float
+    digest: str = ""
+    tiles: str = ""
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(img) for img in self.images) + len(self.text.encode("utf-8")) + len(self.digest) + len(self.tiles)
+
+
+class CaptureCache:
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES_DEFAULT) -> None:
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._configured = False
+        self._entries: collections.OrderedDict[CacheKey, CacheEntry] = collections.OrderedDict()
+
+    @staticmethod
+    def key(url: str, dimensions: str, variant: str) -> CacheKey:
+        return (roastmaster_urls.canonicalize_url(url), dimensions, variant)
+
+    def configure(self, max_bytes: int) -> None:
+        # One cache serves every persona in the process, the smallest configured cap wins
+        self.max_bytes = min(self.max_bytes, max_bytes) if self._configured else max_bytes
+        self._configured = True
+        self._evict()
+
+    def get(self, key: CacheKey, ttl: float) -> CacheEntry | None:
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry.stored_ts > ttl:
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: CacheKey, entry: CacheEntry) -> None:
+        if key in self._entries:
+            self._drop(key)
+        if entry.nbytes > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.total_bytes += entry.nbytes
+        self._evict()
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total_bytes = self.hits = self.misses = self.evictions = 0
+        self._configured = False
+        self.max_bytes = CACHE_MAX_BYTES_DEFAULT
+
+    def _drop(self, key: CacheKey) -> None:
+        self.total_bytes -= self._entries.pop(key).nbytes
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+async def _fetch_route(route: Any) -> None:
+    # Redirects are handed back to the browser, which requests the next hop through the guard again
+    await route.fulfill(response=await route.fetch(max_redirects=0))
+
+
+async def _guard_request(route: Any) -> None:
+    # Chromium follows redirects and loads subresources on its own, so every request is checked, not just the
+    # submitted URL, and resolving again per request also catches a host that rebinds after the first check
+    url = route.request.url
+    if urlsplit(url).scheme in LOCAL_SCHEMES:
+        await route.fallback()
+        return
+    try:
+        await asyncio.to_thread(roastmaster_urls.check_public_url, url)
+    except roastmaster_urls.UnsafeUrl as exc:
+        logger.warning("blocked request %s: %s", url, exc)
+        await route.abort("blockedbyclient")
+        return
+    try:
+        await _fetch_route(route)
+    except Exception as exc:
+        logger.info("request %s failed: %s", url, exc)
+        await route.abort("failed")
+
+
+class PageCapturer:
+    def __init__(self) -> None:
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._browser = None
+
+    async def _get_browser(self):
+        async with self._lock:
+            if self._browser is None or not self._browser.is_connected():
+                from playwright.async_api import async_playwright
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch()
+            return self._browser
+
+    async def _new_page(self, w: int, h: int):
+        browser = await self._get_browser()
+        context = await browser.new_context(viewport={"width": w, "height": h})
+        await context.route("**/*", _guard_request)
+        return await context.new_page()
+
+    async def capture(self, url: str, dimensions: str, scrolls: tuple[float, ...]) -> RenderedPage:
+        w, h = (int(x) for x in dimensions.split("x"))
+        page = await self._new_page(w, h)
+        try:
+            await page.goto(url, wait_until="networkidle", timeout=CAPTURE_TIMEOUT_MS)
+            text = await page.inner_text("body")
+            html = await page.content()
+            above_fold = await page.evaluate(roastmaster_digest.ABOVE_FOLD_JS)
+            scroll_max = await page.evaluate("Math.max(0, document.documentElement.scrollHeight - window.innerHeight)")
+            shots = []
+            for scroll in scrolls:
+                await page.evaluate(f"window.scrollTo(0, {int(scroll_max * scroll)})")
+                await asyncio.sleep(SETTLE_AFTER_SCROLL_S)
+                shots.append(await page.screenshot(type="png"))
+        finally:
+            await page.context.close()
+        return RenderedPage(text, html, above_fold, await asyncio.to_thread(lambda: [png_to_webp(png) for png in shots]))
+
+    async def capture_stitched(self, url: str, dimensions: str, max_folds: int = STITCHED_MAX_FOLDS) -> RenderedPage:
+        w, h = (int(x) for x in dimensions.split("x"))
+        page = await self._new_page(w, h)
+        try:
+            await page.goto(url, wait_until="networkidle", timeout=CAPTURE_TIMEOUT_MS)
+            text = await page.inner_text("body")
+            html = await page.content()
+            above_fold = await page.evaluate(roastmaster_digest.ABOVE_FOLD_JS)
+            page_h = int(await page.evaluate("document.documentElement.scrollHeight"))
+            # One viewport screenshot per fold, a clip below the viewport is not allowed without full_page
+            folds = []
+            for top in fold_tops(page_h, h, max_folds):
+                await page.evaluate(f"window.scrollTo(0, {top})")
+                await asyncio.sleep(SETTLE_AFTER_SCROLL_S)
+                actual = int(await page.evaluate("window.scrollY"))
+                folds.append((actual, await page.screenshot(type="png")))
+        finally:
+            await page.context.close()
+        sheet, tiles = await asyncio.to_thread(stitch_page, folds, h, page_h)
+        return RenderedPage(text, html, above_fold, [sheet], tiles)
+
+    async def close(self) -> None:
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._browser = self._playwright = None
+
+
+def png_to_webp(png: bytes) -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.open(io.BytesIO(png)).convert("RGB").save(buf, format="WEBP", quality=WEBP_QUALITY)
+    return buf.getvalue()
+
+
+def fold_tops(page_h: int, fold_h: int, max_folds: int) -> list[int]:
+    # Folds from the top, and on pages longer than max_folds the last one is the page bottom, like scroll 1.0
+    bottom = max(0, page_h - fold_h)
+    tops = list(range(0, bottom, fold_h)) + [bottom]
+    if len(tops) > max_folds:
+        tops = tops[:max_folds - 1] + [bottom]
+    return tops
+
+
+def stitch_page(folds: list[tuple[int, bytes]], fold_h: int, page_h: int) -> tuple[bytes, list[dict[str, Any]]]:
+    # Folds that repeat the previous one are dropped and overlaps cropped, like the bottom fold of a short page
+    kept, decisions = roastmaster_imagehash.dedupe_tiles([png for _, png in folds], WEBP_QUALITY)
+    tops = [
+        folds[d.index][0] + (int(fold_h * d.overlap_fraction) if d.action == "cropped" else 0)
+        for d in decisions if d.action != "dropped"
+    ]
+    labels = [f"fold {i + 1}" for i in range(len(folds))]
+    return stitch_folds(list(zip(tops, kept)), fold_h, page_h), roastmaster_imagehash.decisions_summary(decisions, labels)
+
+
+def stitch_folds(folds: list[tuple[int, bytes]], fold_h: int, page_h: int) -> bytes:
+    from PIL import Image, ImageDraw
+    images = [Image.open(io.BytesIO(png)).convert("RGB") for _, png in folds]
+    w = images[0].width
+    cols = min(len(images), max(1, math.ceil(math.sqrt(len(images) * fold_h / w))))
+    rows = math.ceil(len(images) / cols)
+    scale = min(1.0, IMAGE_MAX_SIDE / (cols * w), IMAGE_MAX_SIDE / (rows * fold_h))
+    tile_w, tile_h = int(w * scale), int(fold_h * scale)
+    sheet = Image.new("RGB", (cols * tile_w, rows * tile_h), "white")
+    draw = ImageDraw.Draw(sheet)
+    prev_end = 0
+    for i, ((top, _), fold) in enumerate(zip(folds, images)):
+        x, y = (i % cols) * tile_w, (i // cols) * tile_h
+        sheet.paste(fold.resize((int(fold.width * scale), int(fold.height * scale))), (x, y))
+        draw.rectangle((x, y, x + tile_w - 1, y + tile_h - 1), outline="red", width=2)
+        end = min(top + fold.height, page_h)
+        label = f"Fold {i + 1}: {top}-{end}px"
+        if i == 0:
+            label += " (above the fold)"
+        elif top > prev_end:
+            label += f" ({top - prev_end}px skipped above)"
+        prev_end = end
+        draw.rectangle((x + 2, y + 2, x + 8 + 7 * len(label), y + 18), fill="black")
+        draw.text((x + 5, y + 4), label, fill="yellow")
+    buf = io.BytesIO()
+    sheet.save(buf, format="WEBP", quality=WEBP_QUALITY)
+    return buf.getvalue()
+
+
+def tool_result_with_images(text: str, images: list[bytes]) -> str:
+    parts = [{"m_type": "text", "m_content": text}]
+    parts.extend({"m_type": "image/webp", "m_content": base64.b64encode(img).decode("ascii")} for img in images)
+    return json.dumps(parts)
+
+
+def tool_result_parts(result: str) -> list[dict[str, Any]]:
+    if result.startswith("[{"):
+        try:
+            return json.loads(result)
+        except json.JSONDecodeError:
+            pass
+    return [{"m_type": "text", "m_content": result}]
+
+
+def tool_result_usage(result: str) -> tuple[int, int]:
+    # (images, text chars) the model will see, base64 image payloads are not text
+    parts = tool_result_parts(result)
+    images = sum(1 for p in parts if p["m_type"].startswith("image/"))
+    return images, sum(len(p["m_content"]) for p in parts if p["m_type"] == "text")
+
+
+class CaptureSlots:
+    def __init__(self, total: int = MAX_CONCURRENT_CAPTURES, per_host: int = MAX_CAPTURES_PER_HOST) -> None:
+        self.total = asyncio.Semaphore(total)
+        self.per_host_limit = per_host
+        self.per_host: dict[str, asyncio.Semaphore] = {}
+        self.inflight: dict[CacheKey, asyncio.Task] = {}
+
+    def host(self, host: str) -> asyncio.Semaphore:
+        if host not in self.per_host:
+            self.per_host[host] = asyncio.Semaphore(self.per_host_limit)
+        return self.per_host[host]
+
+
+CAPTURE_CACHE = CaptureCache()
+PAGE_CAPTURER = PageCapturer()
+CAPTURE_SLOTS = CaptureSlots()
+
+
+def capture_variant(layout: str, scrolls: tuple[float, ...]) -> str:
+    return STITCHED if layout == STITCHED else "scroll:" + ",".join(str(float(x)) for x in scrolls)
+
+
+async def capture_url(
+    url: str,
+    fresh: bool = False,
+    layout: str = STITCHED,
+    ttl: float = CACHE_TTL_DEFAULT_S,
+    dimensions: str = roastmaster_urls.SCREENSHOT_DIMENSIONS,
+    scrolls: tuple[float, ...] = roastmaster_urls.SCREENSHOT_SCROLLS,
+    cache: CaptureCache = CAPTURE_CACHE,
+    capturer: PageCapturer = PAGE_CAPTURER,
+) -> tuple[CacheEntry, bool]:
+    key = cache.key(url, dimensions, capture_variant(layout, scrolls))
+    if not fresh:
+        entry = cache.get(key, ttl)
+        if entry is not None:
+            return entry, True
+    # Single flight: a second request for a page that is being rendered joins the running capture
+    task = CAPTURE_SLOTS.inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_capture_and_store(url, layout, dimensions, scrolls, key, cache, capturer))
+        CAPTURE_SLOTS.inflight[key] = task
+        task.add_done_callback(lambda _: CAPTURE_SLOTS.inflight.pop(key, None))
+    return await asyncio.shield(task), False
+
+
+async def _capture_and_store(
+    url: str,
+    layout: str,
+    dimensions: str,
+    scrolls: tuple[float, ...],
+    key: CacheKey,
+    cache: CaptureCache,
+    capturer: PageCapturer,
+) -> CacheEntry:
+    host = key[0].split("://", 1)[-1].split("/", 1)[0]
+    await asyncio.to_thread(roastmaster_urls.check_public_url, url)
+    async with CAPTURE_SLOTS.total, CAPTURE_SLOTS.host(host):
+        if layout == STITCHED:
+            page = await asyncio.wait_for(capturer.capture_stitched(url, dimensions), CAPTURE_DEADLINE_S)
+        else:
+            page = await asyncio.wait_for(capturer.capture(url, dimensions, scrolls), CAPTURE_DEADLINE_S)
+    digest = json.dumps(await asyncio.to_thread(roastmaster_digest.extract_digest, page.text, page.html, page.above_fold), ensure_ascii=False)
+    images, tiles = page.images, page.tiles
+    if layout != STITCHED:
+        # Deduplicated once here and cached, cache hits reuse the result
+        images, decisions = await roastmaster_imagehash.dedupe_tiles_async(page.images, WEBP_QUALITY)
+        tiles = roastmaster_imagehash.decisions_summary(decisions, [f"scroll {s}" for s in scrolls])
+    entry = CacheEntry(images=images, text=page.text, stored_ts=time.time(), digest=digest, tiles=json.dumps(tiles))
+    cache.put(key, entry)
+    return entry
+
+
+async def handle_capture(model_produced_args: dict[str, Any], setup: dict[str, Any], history: Any) -> str:
+    url = model_produced_args.get("url", "")
+    if not url:
+        return "Error: url is required, pass one item from the plan's capture array"
+    layout = model_produced_args.get("layout") or STITCHED
+    if layout not in CAPTURE_LAYOUTS:
+        return f"Error: layout must be one of {', '.join(CAPTURE_LAYOUTS)}"
+    CAPTURE_CACHE.configure(int(setup.get("capture_cache_max_mb", 256)) * 1024 * 1024)
+    ttl = int(setup.get("capture_cache_ttl_minutes", 60)) * 60
+    try:
+        entry, from_cache = await capture_url(url, fresh=bool(model_produced_args.get("fresh")), layout=layout, ttl=ttl)
+    except asyncio.TimeoutError:
+        logger.warning("capture timed out for %s", url)
+        return f"Error: capture of {url} timed out after {CAPTURE_DEADLINE_S:.0f}s.\nFall back to the web tool using the plan's fallback_web calls for this URL."
+    except Exception as exc:
+        logger.warning("capture failed for %s: %s", url, exc)
+        return f"Error: capture failed for {url}: {type(exc).__name__}: {exc}\nFall back to the web tool using the plan's fallback_web calls for this URL."
+    text, digest, images = entry.text, entry.digest, entry.images
+    canonical = roastmaster_urls.canonicalize_url(url)
+    fingerprint = await roastmaster_changes.page_fingerprint(text, images, layout)
+    history.note_fingerprint(model_produced_args.get("roast_id") or "", canonical, fingerprint)
+    prior = await history.latest_for_url(url)
+    prior_fp = (prior[1].get("fingerprints") or {}).get(canonical) if prior else None
+    verdict = roastmaster_changes.compare(prior_fp, fingerprint)
+    if verdict == "unchanged":
+        record, doc = prior
+        since = record.brief()["timestamp"]
+        return (
+            f"URL: {url}\n{UNCHANGED_MARKER} since {since}: page text and screenshots match the roast saved at {record.path}.\n"
+            f"Do not analyze the page again and do not save a new roast. Reply with the stored roast below, "
+            f"starting with the line \"No changes detected since {since}.\"\n\n{doc.get('roast', '')}"
+        )
+    if layout == STITCHED:
+        header = f"URL: {url}\nlayout: one stitched full-page image, folds labelled top to bottom\n"
+        header += f"folds (cropped folds show only content not visible in the previous fold): {entry.tiles}\n"
+    else:
+        header = f"URL: {url}\nscroll positions: {', '.join(str(s) for s in roastmaster_urls.SCREENSHOT_SCROLLS)}\n"
+        header += f"tiles (cropped tiles show only content not visible in the previous image): {entry.tiles}\n"
+    header += "served from cache\n" if from_cache else ""
+    kind, body = roastmaster_digest.choose_body(text, digest)
+    if kind == "digest":
+        body = f"page content as a CRO digest grouped by the 4 pillars (full text omitted):\n{body}\n"
+    if verdict == "changed":
+        record = prior[0]
+        diff = roastmaster_changes.structural_diff(prior_fp.get("outline") or [], fingerprint["outline"])
+        header += f"page changed since the roast saved at {record.path} ({record.brief()['timestamp']}, score {record.score}), "
+        header += f"structural diff of the page text against that roast:\n{json.dumps(diff, ensure_ascii=False)}\n"
+    return tool_result_with_images(header + "\n" + body, images)
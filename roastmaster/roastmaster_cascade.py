@@ -0,0 +1,334 @@
+import dataclasses
+import json
+import logging
+import math
+import time
+import uuid
+from typing import Any
+
+from flexus_client_kit import ckit_ask_model, ckit_bot_exec, ckit_client, ckit_cloudtool
+
+from roastmaster import roastmaster_admission
+from roastmaster import roastmaster_capture
+from roastmaster import roastmaster_creatives
+from roastmaster import roastmaster_tracing
+from roastmaster import roastmaster_urls
+
+
+logger = logging.getLogger("roastmaster_cascade")
+
+MODEL_EXPENSIVE = "grok-4-1-fast-reasoning"
+MODEL_CHEAP = "gpt-5.4-nano"
+ROAST_EXPERT = "roastmaster_roast"
+
+# Assumed figures, not measured: the kit does not report model usage to the bot, so every ledger number is a
+# heuristic from turn, image and character counts. USD per 1M input / output tokens
+MODEL_PRICES = {
+    MODEL_EXPENSIVE: (0.20, 0.50),
+    MODEL_CHEAP: (0.05, 0.40),
+}
+IMAGE_TOKENS = 1100
+PROMPT_TOKENS = {MODEL_EXPENSIVE: 3500, MODEL_CHEAP: 1200}
+OUTPUT_TOKENS_PER_TURN = {MODEL_EXPENSIVE: 700, MODEL_CHEAP: 80}
+LEDGER_MAX_ROASTS = 256
+ESTIMATE_BASIS = "heuristic: assumed prompt and output tokens per turn, 1100 tokens per image, chars/4, assumed prices"
+# Admission estimates: page digest plus capture header, and vision turns for plan, capture and save
+PAGE_TEXT_TOKENS = 700
+ROAST_TURNS = 3
+
+ROAST_TOOL = ckit_cloudtool.CloudTool(
+    strict=True,
+    name="roastmaster_roast",
+    description=(
+        "Hand a validated roast request to the vision roast expert and wait for the finished roast(s). "
+        "Call only when the message has the URLs the chosen mode needs."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "text": {"type": "string", "description": "The user's message, verbatim"},
+            "mode": {"type": "string", "enum": ["auto", "single", "separate", "compare"], "description": "Analysis mode, auto unless the user was explicit"},
+            "project_name": {"type": "string", "description": "Project name if the user gave one, otherwise empty string"},
+            "fresh": {"type": "boolean", "description": "True only when the user asks for a fresh re-roast"},
+            "continue": {"type": "string", "description": "Batch id from a 'Batch continues' or 'Over budget' line to resume that batch, otherwise empty string"},
+        },
+        "required": ["text", "mode", "project_name", "fresh", "continue"],
+        "additionalProperties": False,
+    },
+)
+
+
+def estimate_cost(model: str, tokens_in: int, tokens_out: int) -> float:
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (tokens_in * price_in + tokens_out * price_out) / 1_000_000
+
+
+@dataclasses.dataclass
+class TierUsage:
+    model: str
+    turns: int = 0
+    images: int = 0
+    text_chars: int = 0
+    started_ts: float = 0.0
+    finished_ts: float = 0.0
+
+    @property
+    def tokens_in(self) -> int:
+        return self.turns * PROMPT_TOKENS.get(self.model, 0) + self.images * IMAGE_TOKENS + self.text_chars // 4
+
+    @property
+    def tokens_out(self) -> int:
+        return self.turns * OUTPUT_TOKENS_PER_TURN.get(self.model, 0)
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "model": self.model,
+            "turns": self.turns,
+            "images": self.images,
+            "tokens_in_est": self.tokens_in,
+            "tokens_out_est": self.tokens_out,
+            "cost_usd_est": round(estimate_cost(self.model, self.tokens_in, self.tokens_out), 6),
+            "latency_s": round(self.finished_ts - self.started_ts, 2) if self.finished_ts else None,
+        }
+
+
+@dataclasses.dataclass
+class RoastUsage:
+    roast_id: str
+    mode: str
+    url_count: int
+    cheap: TierUsage
+    expensive: TierUsage
+
+
+class RoastLedger:
+    def __init__(self) -> None:
+        self.roasts: dict[str, RoastUsage] = {}
+        self._triage: dict[str, TierUsage] = {}
+        self._roast_threads: dict[str, TierUsage] = {}
+
+    def note_triage_call(self, ft_id: str, result: str) -> None:
+        usage = self._triage.setdefault(ft_id, TierUsage(model=MODEL_CHEAP, started_ts=time.time()))
+        usage.turns += 1
+        usage.text_chars += roastmaster_capture.tool_result_usage(result)[1]
+
+    def note_roast_call(self, ft_id: str, result: str) -> None:
+        usage = self._roast_threads.setdefault(ft_id, TierUsage(model=MODEL_EXPENSIVE, started_ts=time.time()))
+        images, text_chars = roastmaster_capture.tool_result_usage(result)
+        usage.turns += 1
+        usage.images += images
+        usage.text_chars += text_chars
+
+    def start_roast(self, ft_id: str, mode: str, urls: list[str]) -> str:
+        roast_id = uuid.uuid4().hex[:12]
+        cheap = self._triage.pop(ft_id, None) or TierUsage(model=MODEL_CHEAP, started_ts=time.time())
+        cheap.turns += 1
+        cheap.finished_ts = time.time()
+        self.roasts[roast_id] = RoastUsage(roast_id, mode, len(urls), cheap, TierUsage(model=MODEL_EXPENSIVE, started_ts=time.time()))
+        while len(self.roasts) > LEDGER_MAX_ROASTS:
+            self.roasts.pop(next(iter(self.roasts)))
+        return roast_id
+
+    def finish_roast(self, roast_id: str, ft_id: str) -> dict[str, Any] | None:
+        roast = self.roasts.get(roast_id)
+        thread = self._roast_threads.pop(ft_id, None)
+        if roast is None:
+            return None
+        if thread is not None:
+            roast.expensive.turns += thread.turns
+            roast.expensive.images += thread.images
+            roast.expensive.text_chars += thread.text_chars
+        roast.expensive.turns += 1
+        roast.expensive.finished_ts = time.time()
+        report = self.report(roast)
+        logger.info("roast %s estimated usage %s", roast_id, json.dumps(report))
+        return report
+
+    @staticmethod
+    def report(roast: RoastUsage) -> dict[str, Any]:
+        cheap, expensive = roast.cheap.report(), roast.expensive.report()
+        return {
+            "roast_id": roast.roast_id,
+            "mode": roast.mode,
+            "urls": roast.url_count,
+            "cheap": cheap,
+            "expensive": expensive,
+            "cost_usd_est": round(cheap["cost_usd_est"] + expensive["cost_usd_est"], 6),
+            "estimate": ESTIMATE_BASIS,
+            "latency_s": round(roast.expensive.finished_ts - roast.cheap.started_ts, 2) if roast.expensive.finished_ts else None,
+        }
+
+    def summary(self) -> dict[str, Any]:
+        done = [r for r in self.roasts.values() if r.expensive.finished_ts]
+        return {
+            "roasts": len(done),
+            "estimate": ESTIMATE_BASIS,
+            "cheap_cost_usd_est": round(sum(self.report(r)["cheap"]["cost_usd_est"] for r in done), 6),
+            "expensive_cost_usd_est": round(sum(self.report(r)["expensive"]["cost_usd_est"] for r in done), 6),
+        }
+
+
+def estimate_roast_tokens(urls: list[dict[str, str]]) -> int:
+    # What one roast subchat over these URLs should cost on the expensive tier, known before anything runs
+    creatives = sum(1 for u in urls if roastmaster_urls.is_creative_url(u["url"]))
+    pages = len(urls) - creatives
+    usage = TierUsage(
+        model=MODEL_EXPENSIVE,
+        turns=ROAST_TURNS + (1 if pages > 1 else 0),
+        images=pages + math.ceil(creatives / roastmaster_creatives.SHEET_MAX_TILES),
+        text_chars=pages * PAGE_TEXT_TOKENS * 4,
+    )
+    return usage.tokens_in + usage.tokens_out
+
+
+def report_tokens(report: dict[str, Any]) -> int:
+    return sum(report[tier]["tokens_in_est"] + report[tier]["tokens_out_est"] for tier in ("cheap", "expensive"))
+
+
+def usage_attrs(result: str) -> dict[str, int]:
+    images, text_chars = roastmaster_capture.tool_result_usage(result)
+    return {"images": images, "tokens_in_est": text_chars // 4 + images * IMAGE_TOKENS}
+
+
+@dataclasses.dataclass
+class RoastStart:
+    # One chunk of roast subchats. A chunk that had to queue keeps this as its ticket payload and starts from the
+    # thread's next roastmaster_roast call with its batch id, so the results land under a tool call that still waits
+    ft_id: str
+    fcall_id: str
+    batch: roastmaster_admission.PendingBatch
+    groups: list[list[dict[str, str]]]
+    estimates: list[int]
+    queued: int
+
+
+def roast_question(
+    roast_id: str, text: str, plan: dict[str, Any], urls: list[dict[str, str]], project_name: str, fresh: bool, queued: int = 0, batch_id: str = "",
+) -> str:
+    lines = [
+        f"Roast request {roast_id}.",
+        f"User message: {text}",
+        f"Project name: {project_name or '(none)'}",
+        f"fresh: {str(fresh).lower()}",
+        "Capture plan (already made, do not call roastmaster_plan_capture again):",
+        json.dumps({**plan, **roastmaster_urls.capture_plan(plan["mode"], urls)}, ensure_ascii=False),
+        f"Pass roast_id=\"{roast_id}\" to every capture, creative sheet and save call.",
+    ]
+    if queued:
+        lines.append(f"This roast is one part of a larger batch. End your reply with the line \"{roastmaster_admission.continues_line(queued, batch_id)}\"")
+    return "\n".join(lines)
+
+
+async def start_roasts(
+    fclient: ckit_client.FlexusClient,
+    rcx: ckit_bot_exec.RobotContext,
+    ledger: RoastLedger,
+    admission: roastmaster_admission.AdmissionControl,
+    start: RoastStart,
+) -> list[str]:
+    request = start.batch.request
+    questions, titles = [], []
+    for i, (urls, estimate) in enumerate(zip(start.groups, start.estimates)):
+        roast_id = ledger.start_roast(start.ft_id, request["plan"]["mode"], [u["url"] for u in urls])
+        admission.lease(roast_id, estimate)
+        last = i == len(start.groups) - 1
+        questions.append(roast_question(
+            roast_id, request["text"], request["plan"], urls, request["project_name"], request["fresh"],
+            start.queued if last else 0, start.batch.batch_id,
+        ))
+        titles.append("Roast " + ", ".join(u["url"] for u in urls))
+    return await ckit_ask_model.bot_subchat_create_multiple(
+        client=fclient,
+        who_is_asking="roastmaster_roast",
+        persona_id=rcx.persona.persona_id,
+        first_question=questions,
+        first_calls=["null"] * len(questions),
+        title=titles,
+        fcall_id=start.fcall_id,
+        fexp_name=ROAST_EXPERT,
+    )
+
+
+async def post_to_thread(fclient: ckit_client.FlexusClient, ft_id: str, text: str) -> None:
+    # Assumed kit call: adds a message to the thread and wakes its expert, the way a user message would
+    http = await fclient.use_http()
+    await ckit_ask_model.thread_add_user_message(http, ft_id, text, "roastmaster_roast", ftm_alt=100)
+
+
+async def start_queued(
+    fclient: ckit_client.FlexusClient,
+    rcx: ckit_bot_exec.RobotContext,
+    ledger: RoastLedger,
+    admission: roastmaster_admission.AdmissionControl,
+) -> int:
+    # Persona loop side of admission: a roast answered with "Queued" has no tool call left to return into. Once its
+    # slots free up they are held for it and its thread is told to call roastmaster_roast again with the batch id
+    notified = 0
+    notes = [(t, roastmaster_admission.slot_free_line(t.key)) for t in admission.ready()] + admission.take_dropped()
+    for ticket, text in notes:
+        try:
+            await post_to_thread(fclient, ticket.payload.ft_id, text)
+            notified += 1
+        except Exception as exc:
+            logger.warning("cannot tell thread %s about queued batch %s: %s", ticket.payload.ft_id, ticket.key, exc)
+    return notified
+
+
+def queued_message(admission: roastmaster_admission.AdmissionControl, batch_id: str) -> str:
+    return (
+        f"{roastmaster_admission.QUEUED}: {len(admission.leases)} roasts are running and {admission.queue_position(batch_id)} are queued "
+        f"ahead of this one, continue={batch_id}. A \"{roastmaster_admission.SLOT_FREE}\" message arrives in this chat when it can start. "
+        f"Tell the user it is queued."
+    )
+
+
+async def handle_roast(
+    fclient: ckit_client.FlexusClient,
+    rcx: ckit_bot_exec.RobotContext,
+    ledger: RoastLedger,
+    admission: roastmaster_admission.AdmissionControl,
+    toolcall: ckit_cloudtool.FCloudtoolCall,
+    model_produced_args: dict[str, Any],
+) -> str:
+    batch_id = model_produced_args.get("continue") or ""
+    if batch_id:
+        if batch_id not in admission.batches:
+            return f"Error: batch {batch_id} is finished or expired, call roastmaster_roast with an empty continue to roast the message again"
+        ticket = admission.claim(batch_id)
+        if ticket is not None:
+            # The slots were held for this batch since the "Slot free" message
+            start = dataclasses.replace(ticket.payload, ft_id=toolcall.fcall_ft_id, fcall_id=toolcall.fcall_id)
+            admission.commit_chunk(start.batch, len(start.groups))
+            raise ckit_cloudtool.WaitForSubchats(await start_roasts(fclient, rcx, ledger, admission, start))
+        if admission.queue_position(batch_id) >= 0:
+            return queued_message(admission, batch_id)
+        groups, estimates, request = [], [], {}
+    else:
+        text = model_produced_args.get("text") or ""
+        with roastmaster_tracing.TRACER.span("plan", toolcall.fcall_ft_id, persona_id=rcx.persona.persona_id) as span:
+            plan = await roastmaster_urls.plan_capture(text, model_produced_args.get("mode") or "auto")
+            span.set(mode=plan["mode"], url_count=len(plan["urls"]))
+        if "error" in plan:
+            return f"Error: {plan['error']}"
+        # Separate mode roasts every page in its own vision subchat, in parallel, creatives are ranked together on one sheet
+        groups = [plan["urls"]]
+        if plan["mode"] == "separate":
+            creatives = [u for u in plan["urls"] if roastmaster_urls.is_creative_url(u["url"])]
+            groups = [[u] for u in plan["urls"] if u not in creatives] + ([creatives] if creatives else [])
+        estimates = [estimate_roast_tokens(urls) for urls in groups]
+        request = {"text": text, "plan": plan, "project_name": model_produced_args.get("project_name") or "", "fresh": bool(model_produced_args.get("fresh"))}
+    # Large batches run a chunk of max_inprogress subchats at a time, the triage expert resumes with the batch id
+    try:
+        pending, count = admission.next_chunk(batch_id, groups, estimates, request)
+        start = RoastStart(toolcall.fcall_ft_id, toolcall.fcall_id, pending, pending.groups[:count], pending.estimates[:count], len(pending.groups) - count)
+        with roastmaster_tracing.TRACER.span("admission", toolcall.fcall_ft_id, persona_id=rcx.persona.persona_id, slots=count, queued=start.queued) as span:
+            admitted = admission.submit(count, sum(start.estimates), batch=pending.total > 1, payload=start, key=pending.batch_id)
+            span.set(admitted=admitted)
+    except roastmaster_admission.RoastDeferred as exc:
+        return str(exc)
+    if not admitted:
+        # Nothing started, the batch keeps every group under its id until the thread calls back
+        admission.commit_chunk(pending, 0)
+        return queued_message(admission, pending.batch_id)
+    admission.commit_chunk(pending, count)
+    raise ckit_cloudtool.WaitForSubchats(await start_roasts(fclient, rcx, ledger, admission, start))
@@ -0,0 +1,216 @@
+import datetime
+import difflib
+import json
+import re
+from typing import Any, Iterator
+
+from analytics import url_keys
+
+
+# A project's roast document is its newest roast in full (the keyframe, so every reader of the latest roast works
+# unchanged) plus "deltas", newest first: each one turns the version after it into the version before it
+DELTAS = "deltas"
+# Past this many versions the oldest ones move to an archive document, so rebuilding a version stays cheap
+CHAIN_MAX_VERSIONS = 60
+CHAIN_KEEP_VERSIONS = 30
+SAME_ITEM_RATIO = 0.6
+VERSION_FIELDS = ("project_name", "mode", "urls")
+ITEM_RE = re.compile(r"^\s*(?:[-*]|\d+[.)])\s+(.+?)\s*$", re.MULTILINE)
+
+
+def _section_items(roast: str, heading_word: str) -> list[str]:
+    m = re.search(rf"^#+[^\n]*{heading_word}[^\n]*$", roast or "", re.IGNORECASE | re.MULTILINE)
+    if not m:
+        return []
+    section = roast[m.end():]
+    end = re.search(r"^#", section, re.MULTILINE)
+    items = []
+    for item in ITEM_RE.findall(section[:end.start()] if end else section):
+        bold = re.match(r"\*\*(.+?):?\*\*", item)
+        items.append((bold.group(1) if bold else item.replace("**", "")).strip().rstrip(":"))
+    return [i for i in items if i]
+
+
+def deal_breakers(roast: str) -> list[str]:
+    return _section_items(roast, "deal[ -]?breakers?")
+
+
+def actions(roast: str) -> list[str]:
+    return _section_items(roast, "action plan")
+
+
+def _same_item(a: str, b: str) -> bool:
+    # Word order is compared too, a rewrite often turns "Hidden pricing" into "Pricing hidden"
+    words_a, words_b = " ".join(sorted(a.split())), " ".join(sorted(b.split()))
+    return max(difflib.SequenceMatcher(None, a, b).ratio(), difflib.SequenceMatcher(None, words_a, words_b).ratio()) >= SAME_ITEM_RATIO
+
+
+def _missing(items: list[str], other: list[str]) -> list[str]:
+    # Roasts are rewritten every time, so an item counts as kept if the other side has a close paraphrase
+    lowered = [o.lower() for o in other]
+    return [i for i in items if not any(_same_item(i.lower(), o) for o in lowered)]
+
+
+def _score(doc: dict[str, Any]) -> float | None:
+    score = doc.get("score")
+    return float(score) if isinstance(score, (int, float)) else None
+
+
+def changes(older: dict[str, Any], newer: dict[str, Any]) -> dict[str, Any]:
+    old_roast, new_roast = str(older.get("roast") or ""), str(newer.get("roast") or "")
+    old_score, new_score = _score(older), _score(newer)
+    old_breakers, new_breakers = deal_breakers(old_roast), deal_breakers(new_roast)
+    result = {
+        "score_change": round(new_score - old_score, 2) if old_score is not None and new_score is not None else None,
+        "deal_breakers_added": _missing(new_breakers, old_breakers),
+        "deal_breakers_removed": _missing(old_breakers, new_breakers),
+        # Advice the newer roast no longer gives, it was probably done but the roast text cannot tell
+        "actions_dropped": _missing(actions(old_roast), actions(new_roast)),
+    }
+    # Most re-roasts change only the score, empty fields would outweigh the delta itself
+    return {k: v for k, v in result.items() if v not in (None, [])}
+
+
+def _char_ops(newer: str, older: str) -> list[list[Any]]:
+    matcher = difflib.SequenceMatcher(None, newer, older, autojunk=False)
+    return [[i1, i2, older[j1:j2]] for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+
+
+def _apply_char_ops(text: str, ops: list[list[Any]]) -> str:
+    out, pos = [], 0
+    for start, end, replacement in ops:
+        out += [text[pos:start], replacement]
+        pos = end
+    return "".join(out) + text[pos:]
+
+
+def _older_line(newer: str, older: str) -> str | list[list[Any]]:
+    # A reworded line is stored as character edits of its newer form when that is shorter than the line itself
+    ops = _char_ops(newer, older)
+    return ops if len(json.dumps(ops, ensure_ascii=False)) < len(json.dumps(older, ensure_ascii=False)) else older
+
+
+def line_ops(newer: str, older: str) -> list[list[Any]]:
+    # [start, end, lines]: replace newer lines [start:end] with these lines to get the older text. For a one-to-one
+    # replacement a line may be a list of [start, end, text] character edits of the newer line at the same position
+    new_lines, old_lines = newer.split("\n"), older.split("\n")
+    matcher = difflib.SequenceMatcher(None, new_lines, old_lines, autojunk=False)
+    ops = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "replace" and i2 - i1 == j2 - j1:
+            ops.append([i1, i2, [_older_line(n, o) for n, o in zip(new_lines[i1:i2], old_lines[j1:j2])]])
+        elif tag != "equal":
+            ops.append([i1, i2, old_lines[j1:j2]])
+    return ops
+
+
+def apply_ops(text: str, ops: list[list[Any]]) -> str:
+    lines, out, pos = text.split("\n"), [], 0
+    for start, end, replacement in ops:
+        out += lines[pos:start]
+        out += [r if isinstance(r, str) else _apply_char_ops(lines[start + k], r) for k, r in enumerate(replacement)]
+        pos = end
+    return "\n".join(out + lines[pos:])
+
+
+def _url_set(doc: dict[str, Any]) -> set[str]:
+    return {url_keys.canonicalize_url(u) for u in doc.get("urls") or [] if isinstance(u, str) and u}
+
+
+def make_delta(older: dict[str, Any], newer: dict[str, Any]) -> dict[str, Any]:
+    delta = {
+        "timestamp": older.get("timestamp", ""),
+        "score": older.get("score"),
+        "ops": line_ops(str(newer.get("roast") or ""), str(older.get("roast") or "")),
+    }
+    # A score or deal-breaker change means nothing between roasts of different pages
+    if _url_set(older) == _url_set(newer):
+        delta["changes"] = changes(older, newer)
+    for field in VERSION_FIELDS:
+        if older.get(field) != newer.get(field):
+            delta[field] = older.get(field)
+    return delta
+
+
+def parse(text: str) -> dict[str, Any] | None:
+    try:
+        doc = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    return doc if isinstance(doc, dict) else None
+
+
+def latest(doc: dict[str, Any]) -> dict[str, Any]:
+    return {k: v for k, v in doc.items() if k != DELTAS}
+
+
+def versions(doc: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    # Newest first, each older version is rebuilt from the one before it, stop early to rebuild only recent ones
+    version = latest(doc)
+    yield version
+    for delta in doc.get(DELTAS) or []:
+        version = {
+            **{k: v for k, v in version.items() if k != "fingerprints"},
+            **{k: delta[k] for k in VERSION_FIELDS if k in delta},
+            "timestamp": delta.get("timestamp", ""),
+            "score": delta.get("score"),
+            "roast": apply_ops(str(version.get("roast") or ""), delta.get("ops") or []),
+        }
+        yield version
+
+
+def version_at(doc: dict[str, Any], timestamp: str) -> dict[str, Any] | None:
+    return next((v for v in versions(doc) if v.get("timestamp") == timestamp), None)
+
+
+def append_version(prev: dict[str, Any] | None, new: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any] | None]:
+    # Returns the new project document and, when the chain got too long, an archive document with the oldest versions
+    if prev is None or not prev.get("roast"):
+        return {**new, DELTAS: []}, None
+    deltas = [make_delta(latest(prev), new)] + list(prev.get(DELTAS) or [])
+    if len(deltas) + 1 <= CHAIN_MAX_VERSIONS:
+        return {**new, DELTAS: deltas}, None
+    keep = CHAIN_KEEP_VERSIONS - 1
+    chain = {**new, DELTAS: deltas[:keep]}
+    archive_keyframe = None
+    for i, version in enumerate(versions(chain | {DELTAS: deltas})):
+        if i == keep + 1:
+            archive_keyframe = version
+            break
+    return chain, {**archive_keyframe, DELTAS: deltas[keep + 1:]}
+
+
+def archive_path(path: str, archive: dict[str, Any]) -> str:
+    ts = str(archive.get("timestamp") or "")
+    try:
+        stamp = datetime.datetime.fromisoformat(ts.replace("Z", "+00:00")).strftime("%Y%m%d-%H%M%S")
+    except ValueError:
+        stamp = re.sub(r"[^0-9]+", "", ts) or "old"
+    return f"{path}-until-{stamp}"
+
+
+def history(doc: dict[str, Any]) -> list[dict[str, Any]]:
+    # Oldest first, what changed at each version without any roast text
+    out = [{"timestamp": doc.get("timestamp", ""), "score": doc.get("score")}]
+    for delta in doc.get(DELTAS) or []:
+        out[-1]["changes"] = delta.get("changes") or {}
+        out.append({"timestamp": delta.get("timestamp", ""), "score": delta.get("score")})
+    return out[::-1]
+
+
+def reader_view(text: str) -> str:
+    # What the model reads back: the newest roast in full plus the change log of earlier ones
+    doc = parse(text)
+    if doc is None or not doc.get(DELTAS):
+        return text
+    return json.dumps({**latest(doc), "history": history(doc)}, indent=2, ensure_ascii=False)
+
+
+def dumps(doc: dict[str, Any]) -> str:
+    # Deltas are compact, only the keyframe is indented for people reading the policy document
+    deltas = doc.get(DELTAS) or []
+    head = json.dumps({**latest(doc), DELTAS: []}, indent=2, ensure_ascii=False)
+    if not deltas:
+        return head
+    body = ",\n    ".join(json.dumps(d, ensure_ascii=False, separators=(",", ":")) for d in deltas)
+    return head[:head.rindex("[]")] + "[\n    " + body + "\n  ]\n}"
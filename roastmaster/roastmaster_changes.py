@@ -0,0 +1,81 @@
+import asyncio
+import difflib
+import hashlib
+import re
+from typing import Any
+
+from roastmaster import roastmaster_imagehash
+
+
+OUTLINE_MAX_LINES = 150
+OUTLINE_MAX_CHARS = 80
+DIFF_MAX_LINES = 40
+
+
+def normalize_text(text: str) -> list[str]:
+    lines = (re.sub(r"\s+", " ", line).strip().lower() for line in (text or "").splitlines())
+    return [line for line in lines if line]
+
+
+def text_sha(text: str) -> str:
+    return hashlib.sha256("\n".join(normalize_text(text)).encode("utf-8")).hexdigest()[:32]
+
+
+def outline(text: str) -> list[str]:
+    seen: set[str] = set()
+    result: list[str] = []
+    for line in normalize_text(text):
+        line = line[:OUTLINE_MAX_CHARS]
+        if line not in seen:
+            seen.add(line)
+            result.append(line)
+        if len(result) >= OUTLINE_MAX_LINES:
+            break
+    return result
+
+
+def _image_hashes(images: list[bytes]) -> list[dict[str, str]]:
+    result = []
+    for webp in images:
+        img = roastmaster_imagehash._open_gray(webp)
+        result.append({"dhash": f"{roastmaster_imagehash.dhash(img):016x}", "phash": f"{roastmaster_imagehash.phash(img):016x}"})
+    return result
+
+
+async def page_fingerprint(text: str, images: list[bytes], layout: str) -> dict[str, Any]:
+    return {
+        "text_sha": text_sha(text),
+        "layout": layout,
+        "images": await asyncio.to_thread(_image_hashes, images),
+        "outline": outline(text),
+    }
+
+
+def images_unchanged(old: dict[str, Any], new: dict[str, Any], max_bits: int = roastmaster_imagehash.SIMILAR_MAX_BITS) -> bool:
+    if old.get("layout") != new.get("layout") or len(old.get("images") or []) != len(new["images"]):
+        return False
+    for a, b in zip(old["images"], new["images"]):
+        for kind in ("dhash", "phash"):
+            if roastmaster_imagehash.hamming(int(a[kind], 16), int(b[kind], 16)) > max_bits:
+                return False
+    return True
+
+
+def structural_diff(old_outline: list[str], new_outline: list[str]) -> dict[str, list[str]]:
+    added, removed = [], []
+    for line in difflib.unified_diff(old_outline, new_outline, lineterm="", n=0):
+        if line.startswith(("+++", "---", "@@")):
+            continue
+        if line.startswith("+"):
+            added.append(line[1:])
+        elif line.startswith("-"):
+            removed.append(line[1:])
+    return {"added": added[:DIFF_MAX_LINES], "removed": removed[:DIFF_MAX_LINES], "truncated": len(added) > DIFF_MAX_LINES or len(removed) > DIFF_MAX_LINES}
+
+
+def compare(old: dict[str, Any] | None, new: dict[str, Any]) -> str:
+    if not old or "text_sha" not in old:
+        return "unknown"
+    if old["text_sha"] == new["text_sha"] and images_unchanged(old, new):
+        return "unchanged"
+    return "changed"
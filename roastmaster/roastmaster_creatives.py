@@ -0,0 +1,224 @@
+import asyncio
+import atexit
+import concurrent.futures
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+from urllib.parse import urljoin
+
+from flexus_client_kit import ckit_cloudtool
+
+from roastmaster import roastmaster_capture
+from roastmaster import roastmaster_urls
+
+
+logger = logging.getLogger("roastmaster_creatives")
+
+CREATIVES_MAX = 24
+SHEET_MAX_TILES = 9
+SHEET_LABEL_H = 22
+SHEET_PAD = 4
+FETCH_TIMEOUT = 15.0
+FETCH_MAX_BYTES = 20 * 1024 * 1024
+MAX_CONCURRENT_FETCHES = 6
+# Below this many creatives a worker thread composes faster than a process round trip
+POOL_MIN_CREATIVES = 6
+POOL_MAX_WORKERS = min(4, os.cpu_count() or 1)
+CREATIVE = "creative"
+
+CREATIVE_SHEET_TOOL = ckit_cloudtool.CloudTool(
+    strict=True,
+    name="roastmaster_creative_sheet",
+    description=(
+        "Fetch the ad creatives from the plan's creatives array and return them tiled into a few labelled contact sheets "
+        "(#1, #2, ... in reading order), so every variant can be scored and ranked in one look. "
+        "Pass detail=N to get creative #N alone at full resolution, only when its tile is too small to judge."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "roast_id": {"type": "string", "description": "Roast id from the roast request, empty string if there was none"},
+            "urls": {"type": "array", "items": {"type": "string"}, "description": "Image URLs exactly as in the plan's creatives array"},
+            "detail": {"type": "integer", "description": "0 for the contact sheets, or the label number of one creative to see it at full resolution"},
+            "fresh": {"type": "boolean", "description": "Download the creatives again instead of reusing recent downloads"},
+        },
+        "required": ["roast_id", "urls", "detail", "fresh"],
+        "additionalProperties": False,
+    },
+)
+
+_fetch_slots = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+_pool: concurrent.futures.ProcessPoolExecutor | None = None
+
+
+def _open_rgb(data: bytes):
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    img.seek(0)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        flat = Image.new("RGB", img.size, "white")
+        flat.paste(img, mask=img.getchannel("A"))
+        return flat
+    return img.convert("RGB")
+
+
+def _describe(label: int, data: bytes, img) -> dict[str, Any]:
+    w, h = img.size
+    g = math.gcd(w, h) or 1
+    return {"label": f"#{label}", "width": w, "height": h, "aspect": f"{w // g}:{h // g}", "kb": round(len(data) / 1024)}
+
+
+def compose_sheet(creatives: list[tuple[int, bytes]]) -> tuple[bytes, list[dict[str, Any]]]:
+    # Runs in a worker process for large batches, takes and returns only picklable values
+    from PIL import Image, ImageDraw
+    cols = math.ceil(math.sqrt(len(creatives)))
+    rows = math.ceil(len(creatives) / cols)
+    cell = roastmaster_capture.IMAGE_MAX_SIDE // max(cols, rows)
+    sheet = Image.new("RGB", (cols * cell, rows * cell), "white")
+    draw = ImageDraw.Draw(sheet)
+    infos = []
+    for i, (label, data) in enumerate(creatives):
+        x, y = (i % cols) * cell, (i // cols) * cell
+        try:
+            img = _open_rgb(data)
+        except Exception as exc:
+            infos.append({"label": f"#{label}", "error": f"unreadable image: {type(exc).__name__}"})
+            draw.rectangle((x, y, x + cell - 1, y + cell - 1), fill="lightgray")
+            caption = f"#{label} unreadable"
+        else:
+            infos.append(_describe(label, data, img))
+            img.thumbnail((cell - 2 * SHEET_PAD, cell - SHEET_LABEL_H - 2 * SHEET_PAD))
+            sheet.paste(img, (x + (cell - img.width) // 2, y + SHEET_LABEL_H + (cell - SHEET_LABEL_H - img.height) // 2))
+            caption = f"#{label}  {infos[-1]['width']}x{infos[-1]['height']}"
+        draw.rectangle((x, y, x + cell - 1, y + cell - 1), outline="red", width=2)
+        draw.rectangle((x + 2, y + 2, x + 8 + 7 * len(caption), y + SHEET_LABEL_H - 4), fill="black")
+        draw.text((x + 5, y + 4), caption, fill="yellow")
+    buf = io.BytesIO()
+    sheet.save(buf, format="WEBP", quality=roastmaster_capture.WEBP_QUALITY)
+    return buf.getvalue(), infos
+
+
+def full_creative(label: int, data: bytes) -> tuple[bytes, dict[str, Any]]:
+    img = _open_rgb(data)
+    info = _describe(label, data, img)
+    img.thumbnail((roastmaster_capture.IMAGE_MAX_SIDE, roastmaster_capture.IMAGE_MAX_SIDE))
+    buf = io.BytesIO()
+    img.save(buf, format="WEBP", quality=roastmaster_capture.WEBP_QUALITY)
+    return buf.getvalue(), info
+
+
+def sheet_chunks(creatives: list[tuple[int, bytes]]) -> list[list[tuple[int, bytes]]]:
+    # As few sheets as the tile cap allows, filled evenly so no sheet ends up with one tiny leftover
+    sheets = math.ceil(len(creatives) / SHEET_MAX_TILES)
+    per_sheet = math.ceil(len(creatives) / sheets)
+    return [creatives[i:i + per_sheet] for i in range(0, len(creatives), per_sheet)]
+
+
+def _process_pool() -> concurrent.futures.ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, the bot process runs an event loop and logging threads that must not be forked
+        _pool = concurrent.futures.ProcessPoolExecutor(max_workers=POOL_MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(_pool.shutdown, cancel_futures=True)
+    return _pool
+
+
+async def compose_sheets(creatives: list[tuple[int, bytes]]) -> list[tuple[bytes, list[dict[str, Any]]]]:
+    global _pool
+    loop = asyncio.get_running_loop()
+    chunks = sheet_chunks(creatives)
+    if len(creatives) >= POOL_MIN_CREATIVES:
+        try:
+            return await asyncio.gather(*[loop.run_in_executor(_process_pool(), compose_sheet, chunk) for chunk in chunks])
+        except BrokenProcessPool:
+            logger.warning("compositing pool broke, composing %d sheets in threads", len(chunks))
+            _pool = None
+    return await asyncio.gather(*[asyncio.to_thread(compose_sheet, chunk) for chunk in chunks])
+
+
+def _fetch_blocking(url: str) -> bytes:
+    import requests
+    current = url
+    # Redirects are followed by hand, each hop must pass the address check like in redirect resolution
+    for _ in range(roastmaster_urls.REDIRECT_MAX_HOPS + 1):
+        roastmaster_urls.check_public_url(current)
+        with requests.get(current, timeout=FETCH_TIMEOUT, stream=True, allow_redirects=False) as r:
+            location = r.headers.get("Location") if r.is_redirect else None
+            if location:
+                current = urljoin(current, location)
+                continue
+            r.raise_for_status()
+            content_type = r.headers.get("Content-Type", "")
+            if content_type and not content_type.startswith("image/"):
+                raise ValueError(f"not an image ({content_type.split(';')[0]}), roast it as a page with roastmaster_capture")
+            data = bytearray()
+            for chunk in r.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > FETCH_MAX_BYTES:
+                    raise ValueError(f"larger than {FETCH_MAX_BYTES // (1024 * 1024)} MB")
+            return bytes(data)
+    raise ValueError(f"more than {roastmaster_urls.REDIRECT_MAX_HOPS} redirects")
+
+
+async def fetch_creative(
+    url: str,
+    fresh: bool = False,
+    ttl: float = roastmaster_capture.CACHE_TTL_DEFAULT_S,
+    cache: roastmaster_capture.CaptureCache = roastmaster_capture.CAPTURE_CACHE,
+) -> bytes:
+    key = cache.key(url, CREATIVE, CREATIVE)
+    entry = None if fresh else cache.get(key, ttl)
+    if entry is not None:
+        return entry.images[0]
+    async with _fetch_slots:
+        data = await asyncio.to_thread(_fetch_blocking, url)
+    cache.put(key, roastmaster_capture.CacheEntry(images=[data], text="", stored_ts=time.time()))
+    return data
+
+
+async def handle_creative_sheet(model_produced_args: dict[str, Any], setup: dict[str, Any]) -> str:
+    urls = [u["url"] for u in await roastmaster_urls.dedupe_urls(model_produced_args.get("urls") or [], resolve=False)]
+    if not urls:
+        return "Error: urls is empty, pass the plan's creatives array"
+    if len(urls) > CREATIVES_MAX:
+        return f"Error: at most {CREATIVES_MAX} creatives per call, split them and rank each group"
+    detail = int(model_produced_args.get("detail") or 0)
+    if not 0 <= detail <= len(urls):
+        return f"Error: detail must be 0 or a label between 1 and {len(urls)}"
+    fresh = bool(model_produced_args.get("fresh"))
+    roastmaster_capture.CAPTURE_CACHE.configure(int(setup.get("capture_cache_max_mb", 256)) * 1024 * 1024)
+    ttl = int(setup.get("capture_cache_ttl_minutes", 60)) * 60
+
+    if detail:
+        url = urls[detail - 1]
+        try:
+            webp, info = await asyncio.to_thread(full_creative, detail, await fetch_creative(url, fresh, ttl))
+        except Exception as exc:
+            logger.warning("creative %s failed: %s", url, exc)
+            return f"Error: creative #{detail} {url}: {type(exc).__name__}: {exc}"
+        return roastmaster_capture.tool_result_with_images(f"creative {json.dumps({**info, 'url': url})}", [webp])
+
+    fetched = await asyncio.gather(*[fetch_creative(url, fresh, ttl) for url in urls], return_exceptions=True)
+    ok = [(i + 1, data) for i, data in enumerate(fetched) if isinstance(data, bytes)]
+    failed = [
+        {"label": f"#{i + 1}", "url": url, "error": f"{type(data).__name__}: {data}"}
+        for i, (url, data) in enumerate(zip(urls, fetched)) if not isinstance(data, bytes)
+    ]
+    if not ok:
+        return "Error: none of the creatives could be downloaded, ask the user to upload them instead:\n" + json.dumps(failed, indent=1)
+    t0 = time.perf_counter()
+    sheets = await compose_sheets(ok)
+    logger.info("%d creatives on %d sheets in %.0f ms", len(ok), len(sheets), (time.perf_counter() - t0) * 1000)
+    infos = [{**info, "url": urls[int(info["label"][1:]) - 1]} for _, sheet_infos in sheets for info in sheet_infos]
+    header = (
+        f"{len(ok)} creatives on {len(sheets)} contact sheet(s), labelled #1-#{len(urls)} left to right, top to bottom.\n"
+        f"Score and rank every creative from these sheets. Call again with detail=N only if creative #N is too small to judge.\n"
+    )
+    return roastmaster_capture.tool_result_with_images(header + json.dumps({"creatives": infos, "failed": failed}, ensure_ascii=False), [s for s, _ in sheets])
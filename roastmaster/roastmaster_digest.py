@@ -0,0 +1,210 @@
+import html.parser
+import re
+from typing import Any
+
+
+ABOVE_FOLD_JS = """() => {
+    const h = window.innerHeight, out = [];
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+    while (walker.nextNode()) {
+        const t = walker.currentNode.textContent.trim();
+        const el = walker.currentNode.parentElement;
+        if (!t || !el) continue;
+        const r = el.getBoundingClientRect();
+        if (r.top < h && r.bottom > 0 && r.width > 0 && r.height > 0) out.push(t);
+    }
+    return out.join("\\n");
+}"""
+
+MAX_CTAS = 12
+MAX_OUTLINE = 15
+MAX_TEXT = 160
+
+CTA_VERBS_RE = re.compile(
+    r"^(get|start|try|buy|book|sign|join|request|schedule|download|subscribe|contact|talk|see|order|claim|create|register|shop|add to)\b",
+    re.IGNORECASE,
+)
+CTA_CLASS_RE = re.compile(r"\b(btn|button|cta)\b", re.IGNORECASE)
+GENERIC_RE = re.compile(
+    r"\b(welcome to|solutions?|innovative|cutting[- ]edge|best[- ]in[- ]class|world[- ]class|next[- ]generation|seamless|empower|leverage|synergy|revolutionary)\b",
+    re.IGNORECASE,
+)
+TESTIMONIAL_RE = re.compile(r"(testimonial|what (our )?(customers|clients|users) say|case stud(y|ies)|[“”\"][^\"“”]{40,}[“”\"])", re.IGNORECASE)
+LOGO_RE = re.compile(r"\b(trusted by|used by|loved by|as seen (in|on)|our (customers|clients|partners))\b", re.IGNORECASE)
+REVIEW_RE = re.compile(r"(★|\b\d(\.\d)?\s*/\s*5\b|\b\d(\.\d)? stars?\b|\breviews?\b|\bratings?\b|\btrustpilot\b|\bg2\b|\bcapterra\b)", re.IGNORECASE)
+PRICING_RE = re.compile(r"([$€£]\s?\d|\b\d+\s?(usd|eur|gbp)\b|/\s?(mo|month|year|yr)\b|\bper (month|year|user|seat)\b|\bpricing\b|\bfree plan\b)", re.IGNORECASE)
+RISK_REVERSAL_RE = re.compile(r"\b(money[- ]back|free trial|no credit card|cancel any ?time|guarantee)\b", re.IGNORECASE)
+BOILERPLATE_RE = re.compile(r"\b(privacy policy|terms of (service|use)|cookie|all rights reserved|©|copyright|gdpr|sitemap|imprint|legal)\b", re.IGNORECASE)
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def _words(text: str) -> int:
+    return len(re.findall(r"\w+", text or ""))
+
+
+class _PageParser(html.parser.HTMLParser):
+    SKIP = {"script", "style", "noscript", "svg", "template"}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.meta_description = ""
+        self.headings: list[tuple[str, str]] = []
+        self.ctas: list[str] = []
+        self.forms: list[dict[str, int]] = []
+        self.img_alts: list[str] = []
+        self.nav_links = 0
+        self._stack: list[tuple[str, dict[str, str]]] = []
+        self._buf: dict[int, list[str]] = {}
+        self._skip = 0
+        self._in_nav = 0
+        self._form: dict[str, int] | None = None
+
+    def handle_starttag(self, tag: str, attrs_list: list[tuple[str, str | None]]) -> None:
+        attrs = {k: v or "" for k, v in attrs_list}
+        if tag in self.SKIP:
+            self._skip += 1
+            return
+        if tag == "meta" and attrs.get("name", "").lower() == "description":
+            self.meta_description = _clean(attrs.get("content", ""))[:MAX_TEXT]
+        elif tag == "img" and attrs.get("alt"):
+            self.img_alts.append(attrs["alt"])
+        elif tag == "form":
+            self._form = {"fields": 0, "required": 0}
+        elif tag in ("input", "select", "textarea") and attrs.get("type", "").lower() not in ("hidden", "submit", "button", "image"):
+            form = self._form if self._form is not None else {"fields": 0, "required": 0}
+            form["fields"] += 1
+            form["required"] += "required" in attrs
+            if self._form is None:
+                self.forms.append(form)
+        elif tag == "input" and attrs.get("type", "").lower() in ("submit", "button") and attrs.get("value"):
+            self.ctas.append(_clean(attrs["value"]))
+        if tag == "nav":
+            self._in_nav += 1
+        if tag in ("title", "h1", "h2", "h3", "button", "a"):
+            self._stack.append((tag, attrs))
+            self._buf[len(self._stack)] = []
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.SKIP:
+            self._skip = max(0, self._skip - 1)
+            return
+        if tag == "form" and self._form is not None:
+            self.forms.append(self._form)
+            self._form = None
+        if tag == "nav":
+            self._in_nav = max(0, self._in_nav - 1)
+        if not self._stack or self._stack[-1][0] != tag:
+            return
+        depth = len(self._stack)
+        _, attrs = self._stack.pop()
+        text = _clean(" ".join(self._buf.pop(depth, [])))[:MAX_TEXT]
+        if self._stack:
+            self._buf[len(self._stack)].append(text)
+        if not text:
+            return
+        if tag == "title":
+            self.title = text
+        elif tag in ("h1", "h2", "h3"):
+            self.headings.append((tag, text))
+        elif tag == "button":
+            self.ctas.append(text)
+        elif tag == "a":
+            if self._in_nav:
+                self.nav_links += 1
+            elif CTA_CLASS_RE.search(attrs.get("class", "")) or attrs.get("role") == "button" or CTA_VERBS_RE.search(text):
+                self.ctas.append(text)
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip and self._stack:
+            self._buf[len(self._stack)].append(data)
+
+
+def _content_lines(text: str) -> tuple[list[str], int]:
+    lines = [_clean(line) for line in (text or "").splitlines()]
+    lines = [line for line in lines if line]
+    kept = [line for line in lines if not (BOILERPLATE_RE.search(line) and _words(line) < 40)]
+    return kept, len(lines) - len(kept)
+
+
+def _dedupe(items: list[str], limit: int) -> list[str]:
+    seen: set[str] = set()
+    result = []
+    for item in items:
+        key = item.lower()
+        if item and key not in seen:
+            seen.add(key)
+            result.append(item)
+    return result[:limit]
+
+
+def _compact(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _compact(v) for k, v in value.items() if v not in (None, "", [], {})}
+    return value
+
+
+def choose_body(text: str, digest: str) -> tuple[str, str]:
+    # Tiny pages are cheaper to send verbatim than as a digest
+    if digest and len(digest) < len(text):
+        return "digest", digest
+    return "text", text
+
+
+def extract_digest(text: str, page_html: str = "", above_fold_text: str = "") -> dict[str, Any]:
+    lines, boilerplate_lines = _content_lines(text)
+    body = "\n".join(lines)
+    parser = _PageParser()
+    if page_html:
+        parser.feed(page_html)
+        parser.close()
+    h1s = [t for tag, t in parser.headings if tag == "h1"]
+    if h1s:
+        headline = h1s[0]
+        after = [t for tag, t in parser.headings[parser.headings.index(("h1", headline)) + 1:] if tag != "h1"]
+        subhead = after[0] if after else ""
+    else:
+        headline = lines[0] if lines else ""
+        subhead = lines[1] if len(lines) > 1 else ""
+    ctas = _dedupe(parser.ctas or [line for line in lines if _words(line) <= 5 and CTA_VERBS_RE.search(line)], MAX_CTAS)
+    fold_lines, _ = _content_lines(above_fold_text)
+    fold_text = "\n".join(fold_lines)
+    fold_ctas = [c for c in ctas if c.lower() in fold_text.lower()] if fold_text else []
+    alts = " ".join(parser.img_alts)
+    return _compact({
+        "three_second_test": {
+            "title": parser.title,
+            "meta_description": parser.meta_description,
+            "hero_headline": headline[:MAX_TEXT],
+            "hero_subhead": subhead[:MAX_TEXT],
+            "above_fold_word_count": _words(fold_text) if fold_text else None,
+        },
+        "value_proposition": {
+            "headline_word_count": _words(headline),
+            "headline_has_number": bool(re.search(r"\d", headline)),
+            "generic_phrases": _dedupe([m.group(0).lower() for m in GENERIC_RE.finditer(headline + " " + subhead)], 6),
+        },
+        "visual_hierarchy_ux": {
+            "cta_count": len(ctas),
+            "cta_texts": ctas,
+            "above_fold_ctas": fold_ctas if fold_text else None,
+            "h1_count": len(h1s),
+            "outline": [f"{tag}: {t}" for tag, t in parser.headings[:MAX_OUTLINE]],
+            "nav_link_count": parser.nav_links,
+            "forms": parser.forms,
+        },
+        "trust_social_proof": {
+            "testimonial_markers": len(TESTIMONIAL_RE.findall(body)),
+            "logo_markers": len(LOGO_RE.findall(body)) + len(re.findall(r"\blogo\b", alts, re.IGNORECASE)),
+            "review_markers": len(REVIEW_RE.findall(body)),
+            "pricing_present": bool(PRICING_RE.search(body)),
+            "risk_reversal": _dedupe([m.group(0).lower() for m in RISK_REVERSAL_RE.finditer(body)], 4),
+        },
+        "page": {
+            "word_count": _words(body),
+            "boilerplate_lines_dropped": boilerplate_lines,
+        },
+    })
@@ -0,0 +1,262 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import time
+from typing import Any
+
+from flexus_client_kit import ckit_cloudtool
+
+from analytics import roast_index
+from analytics import score_columns
+from roastmaster import roastmaster_chain
+from roastmaster import roastmaster_pdoc
+from roastmaster import roastmaster_urls
+
+
+logger = logging.getLogger("roastmaster_history")
+
+MAX_OTHER_MATCHES = 5
+FINGERPRINTS_MAX_ROASTS = 256
+SCORE_SYNC_INTERVAL_S = 300
+
+FIND_PRIOR_ROAST_TOOL = ckit_cloudtool.CloudTool(
+    strict=True,
+    name="roastmaster_find_prior_roast",
+    description=(
+        "Find the most relevant earlier roast for the given URLs and/or project name in one call, "
+        "returns its full saved document plus a short list of other matches. Use it for 'has this improved?' questions."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "urls": {"type": "array", "items": {"type": "string"}, "description": "URLs being roasted now, empty if none"},
+            "project_name": {"type": "string", "description": "Project name if the user gave one, otherwise empty string"},
+        },
+        "required": ["urls", "project_name"],
+        "additionalProperties": False,
+    },
+)
+
+SAVE_ROAST_TOOL = ckit_cloudtool.CloudTool(
+    strict=True,
+    name="roastmaster_save_roast",
+    description=(
+        "Save a delivered roast to /roastmaster/roasts/<project-name-or-timestamp>-<urls-key>. "
+        "Timestamp and page fingerprints for change detection are added automatically."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "roast_id": {"type": "string", "description": "Roast id from the roast request, empty string if there was none"},
+            "project_name": {"type": "string", "description": "Project name if the user gave one, otherwise empty string"},
+            "mode": {"type": "string", "enum": ["single", "separate", "compare", "creatives"]},
+            "urls": {"type": "array", "items": {"type": "string"}, "description": "URLs this roast covers"},
+            "score": {"type": "number", "description": "Roast score out of 10"},
+            "roast": {"type": "string", "description": "Full roast text exactly as delivered"},
+        },
+        "required": ["roast_id", "project_name", "mode", "urls", "score", "roast"],
+        "additionalProperties": False,
+    },
+)
+
+SCORE_STATS_TOOL = ckit_cloudtool.CloudTool(
+    strict=True,
+    name="roastmaster_score_stats",
+    description=(
+        "Aggregate statistics over every saved roast in one call: score trend per project, score percentiles, "
+        "or the most common deal breakers by CRO pillar. Use it for 'how are we trending?', 'what is a typical score?' "
+        "and 'what keeps going wrong?' questions instead of reading roasts one by one."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "question": {"type": "string", "enum": ["trend", "percentiles", "deal_breakers"]},
+            "project_name": {"type": "string", "description": "Limit to this project, empty string for all projects"},
+            "url": {"type": "string", "description": "Limit to roasts of this URL, empty string for all"},
+            "days": {"type": "integer", "description": "Only roasts from the last N days, 0 for all time"},
+            "bucket": {"type": "string", "enum": ["day", "week", "month"], "description": "Trend granularity, ignored by other questions"},
+        },
+        "required": ["question", "project_name", "url", "days", "bucket"],
+        "additionalProperties": False,
+    },
+)
+
+
+def roast_path(project_name: str, canonical_urls: list[str], ts: datetime.datetime) -> str:
+    # One chain per project and URL set, a roast of other pages of the project starts its own
+    slug = roast_index.normalize_project(project_name)
+    urls_key = hashlib.sha1("\n".join(sorted(set(canonical_urls))).encode()).hexdigest()[:8]
+    return f"{roastmaster_pdoc.ROASTS_FOLDER}/{slug or ts.strftime('%Y%m%d-%H%M%S')}-{urls_key}"
+
+
+class RoastHistory:
+    def __init__(self, docs: roastmaster_pdoc.RoastDocs, scores: score_columns.ScoreColumns | None = None) -> None:
+        self.docs = docs
+        self.index = roast_index.RoastIndex()
+        # roast_id -> canonical URL -> fingerprint, so concurrent roasts of one URL each save their own capture
+        self.fingerprints: dict[str, dict[str, dict[str, Any]]] = {}
+        self.scores = scores
+        # path -> listing stamp the score columns were last filled from
+        self._scored: dict[str, str] = {}
+        self.scores_synced = asyncio.Event()
+        self._score_sync: asyncio.Task | None = None
+        self._save_locks: dict[str, asyncio.Lock] = {}
+
+    async def sync(self) -> dict[str, int]:
+        return await self.index.sync(self.docs.list, self.docs.read)
+
+    async def sync_scores(self) -> int:
+        # Backfills roasts saved before the column file existed or by another process, save() appends the rest
+        await self.sync()
+        added = 0
+        for rec in list(self.index.records.values()):
+            if self.scores is None or rec.stamp and self._scored.get(rec.path) == rec.stamp:
+                continue
+            try:
+                doc = roastmaster_chain.parse(await self.docs.read(rec.path))
+            except Exception as exc:
+                logger.info("cannot add %s to score columns: %s", rec.path, exc)
+                continue
+            if doc is not None:
+                added += self.scores.add_versions(roastmaster_chain.versions(doc))
+            self._scored[rec.path] = rec.stamp
+        return added
+
+    async def _score_sync_loop(self) -> None:
+        while True:
+            try:
+                added = await self.sync_scores()
+                if added:
+                    logger.info("score columns backfilled %d rows", added)
+            except Exception as exc:
+                logger.warning("score columns sync failed: %s", exc)
+            self.scores_synced.set()
+            await asyncio.sleep(SCORE_SYNC_INTERVAL_S)
+
+    def start_score_sync(self) -> None:
+        if self.scores is not None and self._score_sync is None:
+            self._score_sync = asyncio.create_task(self._score_sync_loop())
+
+    def stop_score_sync(self) -> None:
+        if self._score_sync is not None:
+            self._score_sync.cancel()
+            self._score_sync = None
+
+    async def find_prior(self, urls: list[str], project_name: str) -> dict[str, Any]:
+        sync_stats = await self.sync()
+        matches = self.index.lookup(urls=urls, project_name=project_name)
+        if not matches:
+            return {"found": False, "indexed": sync_stats["indexed"], "message": "No earlier roast for these URLs or project."}
+        best = matches[0]
+        return {
+            "found": True,
+            "best": {**best.brief(), "document": roastmaster_chain.reader_view(await self.docs.read(best.path))},
+            "other_matches": [m.brief() for m in matches[1:1 + MAX_OTHER_MATCHES]],
+        }
+
+    def note_fingerprint(self, roast_id: str, canonical: str, fingerprint: dict[str, Any]) -> None:
+        self.fingerprints.setdefault(roast_id, {})[canonical] = fingerprint
+        # Roasts answered as unchanged never save, drop the oldest ones
+        while len(self.fingerprints) > FINGERPRINTS_MAX_ROASTS:
+            self.fingerprints.pop(next(iter(self.fingerprints)))
+
+    async def latest_for_url(self, url: str) -> tuple[roast_index.RoastRecord, dict[str, Any]] | None:
+        # Only a single-page roast of exactly this URL can stand in for a new single-page roast
+        await self.sync()
+        canonical = roastmaster_urls.canonicalize_url(url)
+        matches = [r for r in self.index.lookup(urls=[url]) if r.mode == "single" and r.canonical_urls == [canonical]]
+        if not matches:
+            return None
+        try:
+            doc = json.loads(await self.docs.read(matches[0].path))
+        except Exception as exc:
+            logger.info("cannot read %s: %s", matches[0].path, exc)
+            return None
+        return (matches[0], doc) if isinstance(doc, dict) else None
+
+    async def save(self, fcall_ft_id: str, roast_id: str, project_name: str, mode: str, urls: list[str], score: float, roast: str) -> dict[str, Any]:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        canonical = [roastmaster_urls.canonicalize_url(u) for u in urls]
+        captured = self.fingerprints.pop(roast_id, {})
+        doc = {
+            "timestamp": now.isoformat(timespec="seconds"),
+            "project_name": project_name,
+            "mode": mode,
+            "urls": urls,
+            "score": score,
+            "roast": roast,
+            "fingerprints": {c: captured[c] for c in canonical if c in captured},
+        }
+        path = roast_path(project_name, canonical, now)
+        # Read, append and write of one chain must not interleave, or one of two concurrent saves is lost
+        async with self._save_locks.setdefault(path, asyncio.Lock()):
+            chain, archive = roastmaster_chain.append_version(await self._read_chain(path) if roast_index.normalize_project(project_name) else None, doc)
+            if archive is not None:
+                archived = roastmaster_chain.archive_path(path, archive)
+                await self.docs.write(archived, roastmaster_chain.dumps(archive), fcall_ft_id)
+                self.index.upsert(roast_index.record_from_dict(archived, "", archive))
+            text = roastmaster_chain.dumps(chain)
+            op = await self.docs.write(path, text, fcall_ft_id)
+            self.index.upsert(roast_index.record_from_dict(path, "", chain))
+        if self.scores is not None:
+            self.scores.add_versions(roastmaster_chain.versions(chain))
+        return {"path": path, "op": op, "versions": len(chain[roastmaster_chain.DELTAS]) + 1, "fingerprinted_urls": sorted(doc["fingerprints"])}
+
+    async def _read_chain(self, path: str) -> dict[str, Any] | None:
+        try:
+            return roastmaster_chain.parse(await self.docs.read(path))
+        except Exception as exc:
+            logger.info("no earlier roast at %s: %s", path, exc)
+            return None
+
+
+async def handle_save_roast(history: RoastHistory, fcall_ft_id: str, model_produced_args: dict[str, Any]) -> str:
+    roast = model_produced_args.get("roast") or ""
+    if not roast:
+        return "Error: roast is required"
+    try:
+        result = await history.save(
+            fcall_ft_id,
+            roast_id=model_produced_args.get("roast_id") or "",
+            project_name=model_produced_args.get("project_name") or "",
+            mode=model_produced_args.get("mode") or "single",
+            urls=[u for u in model_produced_args.get("urls") or [] if isinstance(u, str)],
+            score=model_produced_args.get("score") or 0,
+            roast=roast,
+        )
+    except Exception as exc:
+        logger.warning("cannot save roast: %s", exc)
+        return f"Error: cannot save the roast: {type(exc).__name__}: {exc}"
+    return json.dumps(result)
+
+
+async def handle_find_prior_roast(history: RoastHistory, model_produced_args: dict[str, Any]) -> str:
+    urls = [u for u in model_produced_args.get("urls") or [] if isinstance(u, str)]
+    project_name = model_produced_args.get("project_name") or ""
+    if not urls and not project_name:
+        return "Error: pass at least one URL or a project name"
+    return json.dumps(await history.find_prior(urls, project_name), indent=2, ensure_ascii=False)
+
+
+async def handle_score_stats(history: RoastHistory, model_produced_args: dict[str, Any]) -> str:
+    if history.scores is None:
+        return "Error: score analytics are not available for this bot"
+    question = model_produced_args.get("question") or "trend"
+    if question not in ("trend", "percentiles", "deal_breakers"):
+        return "Error: question must be trend, percentiles or deal_breakers"
+    t0 = time.perf_counter()
+    # Only questions asked before the first background backfill finished wait for it
+    history.start_score_sync()
+    await history.scores_synced.wait()
+    result = score_columns.query(
+        history.scores,
+        question,
+        project_name=model_produced_args.get("project_name") or "",
+        url=model_produced_args.get("url") or "",
+        days=int(model_produced_args.get("days") or 0),
+        bucket=model_produced_args.get("bucket") or "week",
+    )
+    result["took_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return json.dumps(result, indent=1, ensure_ascii=False)
@@ -0,0 +1,150 @@
+import asyncio
+import dataclasses
+import io
+import math
+from typing import Any
+
+
+HASH_SIZE = 8
+PHASH_SIZE = 32
+SIMILAR_MAX_BITS = 6
+OVERLAP_SIG_WIDTH = 16
+OVERLAP_SIG_HEIGHT = 90
+OVERLAP_MAX_MEAN_DIFF = 3.0
+OVERLAP_MIN_ROWS = 9
+OVERLAP_MIN_STDDEV = 4.0
+NEW_CONTENT_MIN_FRACTION = 0.1
+
+
+@dataclasses.dataclass
+class TileDecision:
+    index: int
+    action: str  # "kept", "cropped" or "dropped"
+    dhash: str
+    phash: str
+    distance_to_prev: int | None = None
+    overlap_fraction: float = 0.0
+    reason: str = ""
+
+
+def _open_gray(webp: bytes):
+    from PIL import Image
+    return Image.open(io.BytesIO(webp)).convert("L")
+
+
+def dhash(img) -> int:
+    from PIL import Image
+    small = img.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    px = list(small.tobytes())
+    bits = 0
+    for y in range(HASH_SIZE):
+        row = px[y * (HASH_SIZE + 1):(y + 1) * (HASH_SIZE + 1)]
+        for x in range(HASH_SIZE):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits
+
+
+def _dct_1d(v: list[float], cos_table: list[list[float]]) -> list[float]:
+    return [sum(v[n] * c[n] for n in range(len(v))) for c in cos_table]
+
+
+def phash(img) -> int:
+    from PIL import Image
+    n = PHASH_SIZE
+    px = list(img.resize((n, n), Image.LANCZOS).tobytes())
+    cos_table = [[math.cos(math.pi * k * (2 * i + 1) / (2 * n)) for i in range(n)] for k in range(HASH_SIZE)]
+    rows = [_dct_1d(px[y * n:(y + 1) * n], cos_table) for y in range(n)]
+    coeffs = [_dct_1d([rows[y][k] for y in range(n)], cos_table) for k in range(HASH_SIZE)]
+    flat = [coeffs[u][v] for u in range(HASH_SIZE) for v in range(HASH_SIZE)]
+    median = sorted(flat[1:])[len(flat[1:]) // 2]
+    bits = 0
+    for c in flat:
+        bits = (bits << 1) | (c > median)
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _row_signature(img, height: int) -> list[list[int]]:
+    from PIL import Image
+    small = img.resize((OVERLAP_SIG_WIDTH, height), Image.BILINEAR)
+    px = list(small.tobytes())
+    return [px[y * OVERLAP_SIG_WIDTH:(y + 1) * OVERLAP_SIG_WIDTH] for y in range(height)]
+
+
+def _stddev(rows: list[list[int]]) -> float:
+    flat = [p for row in rows for p in row]
+    mean = sum(flat) / len(flat)
+    return math.sqrt(sum((p - mean) ** 2 for p in flat) / len(flat))
+
+
+def _shift_diff(a: list[list[int]], b: list[list[int]], shift: int) -> float:
+    overlap = len(a) - shift
+    return sum(abs(p - q) for ra, rb in zip(a[shift:], b[:overlap]) for p, q in zip(ra, rb)) / (overlap * OVERLAP_SIG_WIDTH)
+
+
+def vertical_overlap(prev_img, img) -> float:
+    # Fraction of `img` (from its top) that repeats the bottom of `prev_img`, 0.0 when nothing lines up.
+    # Coarse search on downscaled rows, then refine to the exact pixel shift around the best coarse match.
+    if prev_img.size != img.size:
+        return 0.0
+    h = img.height
+    step = h / OVERLAP_SIG_HEIGHT
+    a, b = _row_signature(prev_img, OVERLAP_SIG_HEIGHT), _row_signature(img, OVERLAP_SIG_HEIGHT)
+    coarse = min(range(OVERLAP_SIG_HEIGHT - OVERLAP_MIN_ROWS + 1), key=lambda shift: _shift_diff(a, b, shift))
+    a, b = _row_signature(prev_img, h), _row_signature(img, h)
+    lo, hi = max(0, int((coarse - 1) * step)), min(h - int(OVERLAP_MIN_ROWS * step), int((coarse + 1) * step) + 1)
+    best = min(range(lo, hi + 1), key=lambda shift: _shift_diff(a, b, shift))
+    if _shift_diff(a, b, best) > OVERLAP_MAX_MEAN_DIFF or _stddev(b[:h - best]) < OVERLAP_MIN_STDDEV:
+        return 0.0
+    return (h - best) / h
+
+
+def _crop_top(webp: bytes, fraction: float, quality: int) -> bytes:
+    from PIL import Image
+    img = Image.open(io.BytesIO(webp))
+    top = int(img.height * fraction)
+    buf = io.BytesIO()
+    img.crop((0, top, img.width, img.height)).save(buf, format="WEBP", quality=quality)
+    return buf.getvalue()
+
+
+def dedupe_tiles(tiles: list[bytes], quality: int, max_bits: int = SIMILAR_MAX_BITS) -> tuple[list[bytes], list[TileDecision]]:
+    kept: list[bytes] = []
+    decisions: list[TileDecision] = []
+    prev_img = None
+    prev_hashes: tuple[int, int] | None = None
+    prev_index = -1
+    for i, webp in enumerate(tiles):
+        img = _open_gray(webp)
+        hashes = (dhash(img), phash(img))
+        d = TileDecision(index=i, action="kept", dhash=f"{hashes[0]:016x}", phash=f"{hashes[1]:016x}")
+        if prev_img is not None:
+            d.distance_to_prev = max(hamming(hashes[0], prev_hashes[0]), hamming(hashes[1], prev_hashes[1]))
+            d.overlap_fraction = round(vertical_overlap(prev_img, img), 3)
+            if d.distance_to_prev <= max_bits:
+                d.action, d.reason = "dropped", f"near-identical to tile {prev_index}"
+            elif 1.0 - d.overlap_fraction < NEW_CONTENT_MIN_FRACTION:
+                d.action, d.reason = "dropped", f"{d.overlap_fraction:.0%} repeats tile {prev_index}"
+            elif d.overlap_fraction > 0.0:
+                d.action, d.reason = "cropped", f"top {d.overlap_fraction:.0%} repeats tile {prev_index}"
+                webp = _crop_top(webp, d.overlap_fraction, quality)
+        if d.action != "dropped":
+            kept.append(webp)
+            # Compare the next tile against the last tile that made it through, not a dropped duplicate
+            prev_img, prev_hashes, prev_index = img, hashes, i
+        decisions.append(d)
+    return kept, decisions
+
+
+async def dedupe_tiles_async(tiles: list[bytes], quality: int, max_bits: int = SIMILAR_MAX_BITS) -> tuple[list[bytes], list[TileDecision]]:
+    return await asyncio.to_thread(dedupe_tiles, tiles, quality, max_bits)
+
+
+def decisions_summary(decisions: list[TileDecision], labels: list[str]) -> list[dict[str, Any]]:
+    return [
+        {"tile": labels[d.index], "action": d.action, "reason": d.reason} if d.reason else {"tile": labels[d.index], "action": d.action}
+        for d in decisions
+    ]
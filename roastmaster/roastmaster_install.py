@@ -1,16 +1,23 @@
 import argparse
 import asyncio
 import base64
+import dataclasses
+import functools
 import json
+import logging
 import os
 from pathlib import Path
+from typing import Any
 
 from flexus_client_kit import ckit_bot_install, ckit_client, ckit_cloudtool, ckit_integrations_db, ckit_skills
 
+from roastmaster import roastmaster_admission
+from roastmaster import roastmaster_install_state
 from roastmaster import roastmaster_prompts
-from roastmaster import roastmaster_marketplace
 
 
+logger = logging.getLogger("roastmaster_install")
+
 ROASTMASTER_ROOTDIR = Path(__file__).parent
 
 
@@ -25,34 +32,56 @@ def _static_skills_find_compat() -> list[str]:
         return ckit_skills.static_skills_find(ROASTMASTER_ROOTDIR, shared_skills_allowlist="")
 
 
-ROASTMASTER_SKILLS = _static_skills_find_compat()
-ROASTMASTER_SETUP_SCHEMA = json.loads((ROASTMASTER_ROOTDIR / "setup_schema.json").read_text())
-ROASTMASTER_INTEGRATIONS = ckit_integrations_db.static_integrations_load(
-    ROASTMASTER_ROOTDIR,
-    ["flexus_policy_document"],
-    builtin_skills=ROASTMASTER_SKILLS,
-)
+# Built on first use. The bot's start still loads integrations (and the skills they list), since the kit
+# needs every in-process tool, flexus_policy_document included, before the first persona connects;
+# expert prompts and the marketplace code path are only paid for by install()
 
-def _make_default_expert() -> ckit_bot_install.FMarketplaceExpertInput:
-    builtin_skills = ckit_skills.read_name_description(ROASTMASTER_ROOTDIR, ROASTMASTER_SKILLS)
+
+@functools.cache
+def roastmaster_skills() -> list[str]:
+    return _static_skills_find_compat()
+
+
+@functools.cache
+def setup_schema() -> list[dict[str, Any]]:
+    return json.loads((ROASTMASTER_ROOTDIR / "setup_schema.json").read_text())
+
+
+@functools.cache
+def integrations() -> list[ckit_integrations_db.IntegrationRecord]:
+    return ckit_integrations_db.static_integrations_load(
+        ROASTMASTER_ROOTDIR,
+        ["flexus_policy_document"],
+        builtin_skills=roastmaster_skills(),
+    )
+
+
+# Pins each expert to its cascade tier. Not confirmed against every kit release, a kit without it gets unpinned experts
+EXPERT_MODEL_FIELD = "fexp_model_class"
+ROAST_TOOLS = "web,flexus_policy_document,roastmaster_plan_capture,roastmaster_capture,roastmaster_capture_batch,roastmaster_creative_sheet,roastmaster_find_prior_roast,roastmaster_save_roast"
+TRIAGE_TOOLS = "flexus_kanban_safe,flexus_policy_document,roastmaster_plan_capture,roastmaster_find_prior_roast,roastmaster_score_stats,roastmaster_roast"
+
+
+def expert_model_field_supported() -> bool:
+    return any(f.name == EXPERT_MODEL_FIELD for f in dataclasses.fields(ckit_bot_install.FMarketplaceExpertInput))
+
+
+def _make_expert(system_prompt: str, allow_tools: str, description: str, model_class: str) -> ckit_bot_install.FMarketplaceExpertInput:
+    builtin_skills = ckit_skills.read_name_description(ROASTMASTER_ROOTDIR, roastmaster_skills())
+    base = {
+        "fexp_system_prompt": system_prompt,
+        "fexp_python_kernel": "",
+        "fexp_allow_tools": allow_tools,
+        "fexp_nature": "NATURE_INTERACTIVE",
+        "fexp_description": description,
+        "fexp_builtin_skills": builtin_skills,
+    }
+    # Without the field the experts are published unpinned, install() warns about it
+    if expert_model_field_supported():
+        base[EXPERT_MODEL_FIELD] = model_class
     attempts = [
-        {
-            "fexp_system_prompt": roastmaster_prompts.SYSTEM_PROMPT,
-            "fexp_python_kernel": "",
-            "fexp_allow_tools": "flexus_kanban_safe,web,flexus_policy_document",
-            "fexp_nature": "NATURE_INTERACTIVE",
-            "fexp_description": "CRO roast expert for landing pages, websites, and ad creatives.",
-            "fexp_builtin_skills": builtin_skills,
-            "fexp_block_tools": "",
-        },
-        {
-            "fexp_system_prompt": roastmaster_prompts.SYSTEM_PROMPT,
-            "fexp_python_kernel": "",
-            "fexp_allow_tools": "flexus_kanban_safe,web,flexus_policy_document",
-            "fexp_nature": "NATURE_INTERACTIVE",
-            "fexp_description": "CRO roast expert for landing pages, websites, and ad creatives.",
-            "fexp_builtin_skills": builtin_skills,
-        },
+        {**base, "fexp_block_tools": ""},
+        base,
     ]
     errors: list[str] = []
     for kwargs in attempts:
@@ -63,9 +92,47 @@ def _make_default_expert() -> ckit_bot_install.FMarketplaceExpertInput:
     raise TypeError("Could not construct FMarketplaceExpertInput: " + " | ".join(errors))
 
 
-EXPERTS = [
-    ("default", _make_default_expert()),
-]
+def _make_default_expert() -> ckit_bot_install.FMarketplaceExpertInput:
+    # Text-only front desk on the cheap model, hands validated requests to the roast expert
+    return _make_expert(
+        roastmaster_prompts.TRIAGE_PROMPT,
+        TRIAGE_TOOLS,
+        "Front desk: validates roast requests, answers history questions, starts vision roasts.",
+        "cheap",
+    )
+
+
+def _make_roast_expert(capture_layout: str = "stitched") -> ckit_bot_install.FMarketplaceExpertInput:
+    return _make_expert(
+        roastmaster_prompts.roast_system_prompt(capture_layout),
+        ROAST_TOOLS,
+        "CRO roast expert for landing pages, websites, and ad creatives.",
+        "expensive",
+    )
+
+
+@functools.cache
+def experts() -> list[tuple[str, ckit_bot_install.FMarketplaceExpertInput]]:
+    return [
+        ("default", _make_default_expert()),
+        ("roast", _make_roast_expert()),
+    ]
+
+
+_LAZY_CONSTANTS = {
+    "ROASTMASTER_SKILLS": roastmaster_skills,
+    "ROASTMASTER_SETUP_SCHEMA": setup_schema,
+    "ROASTMASTER_INTEGRATIONS": integrations,
+    "EXPERTS": experts,
+}
+
+
+def __getattr__(name: str) -> Any:
+    # The former module constants keep working, built on first access
+    if name in _LAZY_CONSTANTS:
+        return _LAZY_CONSTANTS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 BOT_DESCRIPTION = """# RoastMaster - Landing Page Conversion Roast
 
 Brutally honest CRO feedback for landing pages, websites, and ad creatives.
@@ -90,22 +157,23 @@ Brutally honest CRO feedback for landing pages, websites, and ad creatives.
 """
 
 
-def _load_pic_b64(path: Path) -> str:
-    return base64.b64encode(path.read_bytes()).decode("ascii") if path.exists() else ""
+PICTURE_BIG = ROASTMASTER_ROOTDIR / "roastmaster-1024x1536.webp"
+PICTURE_SMALL = ROASTMASTER_ROOTDIR / "roastmaster-256x256.webp"
+INSTALL_PARALLEL_DEFAULT = 4
 
 
-async def install(
-    client: ckit_client.FlexusClient,
-    bot_name: str,
-    bot_version: str,
-    tools: list[ckit_cloudtool.CloudTool],
-) -> None:
-    pic_big = _load_pic_b64(ROASTMASTER_ROOTDIR / "roastmaster-1024x1536.webp")
-    pic_small = _load_pic_b64(ROASTMASTER_ROOTDIR / "roastmaster-256x256.webp")
+@functools.cache
+def _load_pic(path: Path) -> bytes:
+    return path.read_bytes() if path.exists() else b""
 
-    await roastmaster_marketplace.marketplace_upsert_dev_bot_compat(
-        client,
-        ws_id=client.ws_id,
+
+@functools.cache
+def _load_pic_b64(path: Path) -> str:
+    return base64.b64encode(_load_pic(path)).decode("ascii")
+
+
+def _marketplace_listing(bot_name: str, bot_version: str, tools: list[ckit_cloudtool.CloudTool]) -> dict[str, Any]:
+    return dict(
         marketable_name=bot_name,
         marketable_version=bot_version,
         marketable_accent_color="#FF6B35",
@@ -117,46 +185,126 @@ async def install(
         marketable_typical_group="Marketing / CRO",
         marketable_github_repo="https://github.com/oxyplay/idea-bot",
         marketable_run_this="python -m roastmaster.roastmaster_bot",
-        marketable_setup_default=ROASTMASTER_SETUP_SCHEMA,
+        marketable_setup_default=setup_schema(),
         marketable_featured_actions=[
             {"feat_question": "Roast a landing page: paste one URL", "feat_expert": "default", "feat_depends_on_setup": []},
             {"feat_question": "Compare landing pages: paste two URLs", "feat_expert": "default", "feat_depends_on_setup": []},
-            {"feat_question": "Review ad creatives: upload images or paste links", "feat_expert": "default", "feat_depends_on_setup": []},
+            # Uploaded images need the vision model, the text-only front desk cannot see them
+            {"feat_question": "Review ad creatives: upload images or paste links", "feat_expert": "roast", "feat_depends_on_setup": []},
         ],
         marketable_intro_message="Hey! I'm RoastMaster, your brutally honest CRO expert. Drop a URL to your website, landing page, or ad creative, and I'll tell you exactly what's killing your conversions. No sugarcoating, just actionable feedback.",
         marketable_preferred_model_expensive="grok-4-1-fast-reasoning",
         marketable_preferred_model_cheap="gpt-5.4-nano",
-        marketable_daily_budget_default=100_000,
+        marketable_daily_budget_default=roastmaster_admission.DAILY_BUDGET_DEFAULT,
+        marketable_max_inprogress=roastmaster_admission.MAX_INPROGRESS_DEFAULT,
         marketable_default_inbox_default=10_000,
-        marketable_experts=[(name, expert.filter_tools(tools)) for name, expert in EXPERTS],
-        add_integrations_into_expert_system_prompt=ROASTMASTER_INTEGRATIONS,
+        marketable_experts=[(name, expert.filter_tools(tools)) for name, expert in experts()],
+        add_integrations_into_expert_system_prompt=integrations(),
         marketable_tags=["Marketing", "CRO", "Design Feedback", "Landing Pages"],
         marketable_schedule=[],
-        marketable_picture_big_b64=pic_big,
-        marketable_picture_small_b64=pic_small,
         marketable_forms={},
     )
 
 
+def install_manifest(listing: dict[str, Any]) -> dict[str, str]:
+    from roastmaster import roastmaster_marketplace
+
+    experts = roastmaster_marketplace.assemble_experts(
+        listing["marketable_name"], listing["marketable_experts"], listing["add_integrations_into_expert_system_prompt"],
+    )
+    nested = ("marketable_experts", "add_integrations_into_expert_system_prompt", "marketable_setup_default", "marketable_featured_actions")
+    return roastmaster_install_state.build_manifest({
+        "experts": experts,
+        "picture_big": _load_pic(PICTURE_BIG),
+        "picture_small": _load_pic(PICTURE_SMALL),
+        "setup_schema": listing["marketable_setup_default"],
+        "featured_actions": listing["marketable_featured_actions"],
+        "listing": {k: v for k, v in listing.items() if k not in nested},
+    })
+
+
+async def install(
+    client: ckit_client.FlexusClient,
+    bot_name: str,
+    bot_version: str,
+    tools: list[ckit_cloudtool.CloudTool],
+    force: bool = False,
+    state: roastmaster_install_state.InstallState | None = None,
+    ws_id: str = "",
+) -> str:
+    ws_id = ws_id or client.ws_id
+    if not expert_model_field_supported():
+        logger.warning(
+            "%s: flexus-client-kit has no FMarketplaceExpertInput.%s, publishing experts without a model pin, "
+            "the triage expert runs on the bot's default model",
+            ws_id, EXPERT_MODEL_FIELD,
+        )
+    # gql and the shared prompts load only when installing
+    from roastmaster import roastmaster_marketplace
+
+    listing = _marketplace_listing(bot_name, bot_version, tools)
+    manifest = install_manifest(listing)
+    state = state or roastmaster_install_state.InstallState()
+    key = state.key(ws_id, bot_name, bot_version)
+    changed = roastmaster_install_state.manifest_diff(state.get(key), manifest)
+    if not changed and not force:
+        logger.info("%s: %s %s unchanged since last install, skipping upsert", ws_id, bot_name, bot_version)
+        return "unchanged"
+    logger.info("%s: installing %s %s, changed: %s", ws_id, bot_name, bot_version, ", ".join(changed) or "forced")
+
+    await roastmaster_marketplace.marketplace_upsert_dev_bot_compat(
+        client,
+        ws_id=ws_id,
+        marketable_picture_big_b64=_load_pic_b64(PICTURE_BIG),
+        marketable_picture_small_b64=_load_pic_b64(PICTURE_SMALL),
+        **listing,
+    )
+    state.put(key, manifest)
+    return "installed"
+
+
+async def install_workspaces(workspace_ids: list[str], parallel: int, force: bool) -> dict[str, str]:
+    from roastmaster import roastmaster_bot
+
+    sem = asyncio.Semaphore(max(1, parallel))
+    state = roastmaster_install_state.InstallState()
+
+    async def install_one(ws_id: str) -> str:
+        async with sem:
+            # The workspace goes to install() explicitly, FlexusClient would only read it from the environment
+            client = ckit_client.FlexusClient("roastmaster_install")
+            return await install(
+                client, roastmaster_bot.BOT_NAME, roastmaster_bot.BOT_VERSION, roastmaster_bot.roastmaster_tools(), force=force, state=state, ws_id=ws_id,
+            )
+
+    results = await asyncio.gather(*[install_one(ws_id) for ws_id in workspace_ids], return_exceptions=True)
+    return {ws_id: r if isinstance(r, str) else f"failed: {type(r).__name__}: {r}" for ws_id, r in zip(workspace_ids, results)}
+
+
 def _parse_args() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description="Install RoastMaster into a Flexus workspace")
-    parser.add_argument("--ws", help="Workspace ID to install into (or set FLEXUS_WORKSPACE)")
+    parser = argparse.ArgumentParser(description="Install RoastMaster into one or more Flexus workspaces")
+    parser.add_argument("--ws", action="append", default=[], help="Workspace ID to install into, repeat or comma-separate for several (or set FLEXUS_WORKSPACE)")
+    parser.add_argument("--parallel", type=int, default=INSTALL_PARALLEL_DEFAULT, help="Workspaces installed at the same time")
+    parser.add_argument("--force", action="store_true", help="Upsert even if nothing changed since the last install")
     return parser.parse_args()
 
 
-def _resolve_workspace_id(args: argparse.Namespace) -> str | None:
-    return args.ws or os.environ.get("FLEXUS_WORKSPACE")
+def _resolve_workspace_ids(args: argparse.Namespace) -> list[str]:
+    ids = [ws.strip() for arg in args.ws for ws in arg.split(",") if ws.strip()]
+    if not ids and os.environ.get("FLEXUS_WORKSPACE"):
+        ids = [os.environ["FLEXUS_WORKSPACE"]]
+    return list(dict.fromkeys(ids))
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     args = _parse_args()
-    workspace_id = _resolve_workspace_id(args)
-    if workspace_id:
-        os.environ["FLEXUS_WORKSPACE"] = workspace_id
-    else:
+    workspace_ids = _resolve_workspace_ids(args)
+    if not workspace_ids:
         raise SystemExit("Set FLEXUS_WORKSPACE or pass --ws <workspace-id> before running the installer")
 
-    from roastmaster import roastmaster_bot
-
-    client = ckit_client.FlexusClient("roastmaster_install")
-    asyncio.run(install(client, bot_name=roastmaster_bot.BOT_NAME, bot_version=roastmaster_bot.BOT_VERSION, tools=roastmaster_bot.TOOLS))
+    results = asyncio.run(install_workspaces(workspace_ids, args.parallel, args.force))
+    for ws_id, result in results.items():
+        print(f"{ws_id}: {result}")
+    if any(r.startswith("failed") for r in results.values()):
+        raise SystemExit(1)
@@ -0,0 +1,58 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+
+INSTALL_STATE_PATH = Path(os.environ.get("ROASTMASTER_INSTALL_STATE", Path.home() / ".cache" / "roastmaster" / "install-state.json"))
+
+
+def content_hash(value: Any) -> str:
+    data = value if isinstance(value, bytes) else json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def build_manifest(parts: dict[str, Any]) -> dict[str, str]:
+    manifest = {name: content_hash(value) for name, value in sorted(parts.items())}
+    manifest["all"] = content_hash(manifest)
+    return manifest
+
+
+def manifest_diff(old: dict[str, str] | None, new: dict[str, str]) -> list[str]:
+    if not old:
+        return sorted(k for k in new if k != "all")
+    if old.get("all") == new["all"]:
+        return []
+    return sorted(k for k in new if k != "all" and old.get(k) != new[k])
+
+
+class InstallState:
+    # Manifests of what was last installed, keyed by workspace, bot name and version
+    def __init__(self, path: Path = INSTALL_STATE_PATH) -> None:
+        self.path = Path(path)
+
+    @staticmethod
+    def key(ws_id: str, bot_name: str, bot_version: str) -> str:
+        return f"{ws_id}/{bot_name}/{bot_version}"
+
+    def _load(self) -> dict[str, dict[str, str]]:
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def get(self, key: str) -> dict[str, str] | None:
+        return self._load().get(key)
+
+    def put(self, key: str, manifest: dict[str, str]) -> None:
+        # Re-read before writing so parallel installer processes do not drop each other's entries
+        data = self._load()
+        data[key] = manifest
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
@@ -5,7 +5,23 @@ from typing import Any, Dict, List, Optional, Tuple
 import gql
 
 from flexus_client_kit import ckit_bot_install, ckit_client, ckit_integrations_db, gql_utils
-from flexus_simple_bots import prompts_common
+
+from roastmaster import roastmaster_prompt_compiler
+
+
+def assemble_experts(
+    marketable_name: str,
+    marketable_experts: List[Tuple[str, ckit_bot_install.FMarketplaceExpertInput]],
+    add_integrations_into_expert_system_prompt: Optional[List[ckit_integrations_db.IntegrationRecord]] = None,
+) -> List[Dict[str, Any]]:
+    experts_input = []
+    for expert_name, expert in marketable_experts:
+        compiled = roastmaster_prompt_compiler.compile_expert(expert_name, expert, add_integrations_into_expert_system_prompt)
+        prepared = dataclasses.replace(expert, fexp_system_prompt=compiled.text)
+        expert_dict = dataclasses.asdict(prepared)
+        expert_dict["fexp_name"] = f"{marketable_name}_{expert_name}"
+        experts_input.append(expert_dict)
+    return experts_input
 
 
 async def marketplace_upsert_dev_bot_compat(
@@ -45,25 +61,7 @@ async def marketplace_upsert_dev_bot_compat(
     assert ws_id, "Set FLEXUS_WORKSPACE environment variable to your workspace ID"
     assert not ws_id.startswith("fx-"), "Use a workspace ID, not a group ID"
 
-    experts_input = []
-    for expert_name, expert in marketable_experts:
-        has_a2a = expert._tool_allowed("flexus_hand_over_task")
-        sections = [expert.fexp_system_prompt, "# Flexus Environment", prompts_common.PROMPT_KANBAN]
-        if has_a2a:
-            sections.append(prompts_common.PROMPT_A2A_COMMUNICATION)
-
-        if add_integrations_into_expert_system_prompt:
-            for record in add_integrations_into_expert_system_prompt:
-                if record.integr_prompt and any(expert._tool_allowed(tool.name) for tool in record.integr_tools):
-                    sections.append(record.integr_prompt)
-
-        sections.append(prompts_common.PROMPT_HERE_GOES_SETUP)
-        prompt = "\n\n\n".join(section.strip() for section in sections) + "\n"
-
-        prepared = dataclasses.replace(expert, fexp_system_prompt=prompt)
-        expert_dict = dataclasses.asdict(prepared)
-        expert_dict["fexp_name"] = f"{marketable_name}_{expert_name}"
-        experts_input.append(expert_dict)
+    experts_input = assemble_experts(marketable_name, marketable_experts, add_integrations_into_expert_system_prompt)
 
     http = await client.use_http()
     async with http as h:
@@ -0,0 +1,51 @@
+import json
+import logging
+from typing import Any
+
+from flexus_client_kit import ckit_bot_exec
+from flexus_client_kit.integrations import fi_pdoc
+
+
+logger = logging.getLogger("roastmaster_pdoc")
+
+ROASTS_FOLDER = "/roastmaster/roasts"
+ALREADY_EXISTS = "already exists"
+
+
+def _stamp(item: Any) -> str:
+    # Empty when the listing carries none of these, roast_index then re-reads the document on every sync
+    for field in ("pdoc_modified_ts", "modified_ts", "pdoc_modified", "mtime"):
+        value = getattr(item, field, None)
+        if value:
+            return str(value)
+    return ""
+
+
+class RoastDocs:
+    def __init__(self, rcx: ckit_bot_exec.RobotContext) -> None:
+        self.pdoc = fi_pdoc.IntegrationPdoc(rcx, rcx.persona.ws_root_group_id)
+
+    async def list(self, folder: str = ROASTS_FOLDER) -> list[tuple[str, str]]:
+        try:
+            items = await self.pdoc.pdoc_list(folder)
+        except Exception as exc:
+            logger.info("cannot list %s: %s", folder, exc)
+            return []
+        return [(item.path, _stamp(item)) for item in items if not getattr(item, "is_folder", False)]
+
+    async def read(self, path: str) -> str:
+        doc = await self.pdoc.pdoc_cat(path)
+        content = doc.pdoc_content
+        return content if isinstance(content, str) else json.dumps(content)
+
+    async def write(self, path: str, text: str, fcall_ft_id: str) -> str:
+        try:
+            await self.pdoc.pdoc_create(path, text, fcall_ft_id)
+            return "create"
+        except Exception as exc:
+            # Only an existing document is overwritten, any other failure is the caller's to report
+            if ALREADY_EXISTS not in str(exc).lower():
+                raise
+            logger.info("%s exists, overwriting", path)
+        await self.pdoc.pdoc_overwrite(path, text, fcall_ft_id)
+        return "overwrite"
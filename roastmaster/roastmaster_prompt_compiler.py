@@ -0,0 +1,156 @@
+import argparse
+import dataclasses
+import hashlib
+import re
+import sys
+from pathlib import Path
+
+from flexus_client_kit import ckit_bot_install, ckit_integrations_db
+from flexus_simple_bots import prompts_common
+
+from roastmaster import roastmaster_prompts
+
+
+PROMPTS_DIR = Path(__file__).parent / "prompts"
+PROMPT_BUDGET_TOKENS = 2400
+SECTION_SEPARATOR = "\n\n\n"
+HEADING_RE = re.compile(r"^## (.+)$", re.MULTILINE)
+KANBAN_TOOLS = ("flexus_kanban_safe", "flexus_kanban_public", "flexus_kanban_advanced")
+
+
+@dataclasses.dataclass
+class CompiledPrompt:
+    expert_name: str
+    sections: list[tuple[str, str]]
+
+    @property
+    def text(self) -> str:
+        return SECTION_SEPARATOR.join(text for _, text in self.sections) + "\n"
+
+    @property
+    def prefix_sha(self) -> str:
+        # Everything up to the per-persona setup section, identical for every persona of the expert
+        prefix = SECTION_SEPARATOR.join(text for name, text in self.sections if name != "setup")
+        return hashlib.sha256(prefix.encode()).hexdigest()[:16]
+
+
+def count_tokens(text: str) -> int:
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("o200k_base").encode(text))
+    except ImportError:
+        return max(1, len(text) // 4)
+
+
+def _normalize(text: str) -> str:
+    return "\n".join(line.rstrip() for line in text.strip().replace("\r\n", "\n").splitlines())
+
+
+def _slug(heading: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", heading.lower()).strip("_")
+
+
+def _heading_starts(prompt: str) -> list[int]:
+    # Output templates in ```text fences have their own ## lines, those are not prompt sections
+    starts, fenced, offset = [], False, 0
+    for line in prompt.splitlines(keepends=True):
+        if line.lstrip().startswith("```"):
+            fenced = not fenced
+        elif not fenced and HEADING_RE.match(line):
+            starts.append(offset)
+        offset += len(line)
+    return starts
+
+
+def split_sections(prompt: str) -> list[tuple[str, str]]:
+    starts = _heading_starts(prompt)
+    chunks = [prompt[a:b] for a, b in zip([0] + starts, starts + [len(prompt)])]
+    sections = []
+    for chunk in chunks:
+        m = HEADING_RE.match(chunk)
+        if _normalize(chunk):
+            sections.append((_slug(m.group(1)) if m else "intro", _normalize(chunk)))
+    return sections
+
+
+def _uses_kanban(expert: ckit_bot_install.FMarketplaceExpertInput) -> bool:
+    return any(expert._tool_allowed(tool) for tool in KANBAN_TOOLS)
+
+
+def compile_expert(
+    expert_name: str,
+    expert: ckit_bot_install.FMarketplaceExpertInput,
+    integrations: list[ckit_integrations_db.IntegrationRecord] | None = None,
+) -> CompiledPrompt:
+    # Fixed order, static text first and the setup placeholder last, so the provider's prompt cache sees the same prefix
+    sections = split_sections(expert.fexp_system_prompt)
+    environment = []
+    if _uses_kanban(expert):
+        environment.append(("kanban", _normalize(prompts_common.PROMPT_KANBAN)))
+    if expert._tool_allowed("flexus_hand_over_task"):
+        environment.append(("a2a", _normalize(prompts_common.PROMPT_A2A_COMMUNICATION)))
+    if environment:
+        sections.append(("flexus_environment", "# Flexus Environment"))
+        sections.extend(environment)
+    for record in sorted(integrations or [], key=lambda r: getattr(r, "integr_name", "")):
+        if record.integr_prompt and any(expert._tool_allowed(tool.name) for tool in record.integr_tools):
+            sections.append((f"integration_{getattr(record, 'integr_name', 'unnamed')}", _normalize(record.integr_prompt)))
+    sections.append(("setup", _normalize(prompts_common.PROMPT_HERE_GOES_SETUP)))
+    return CompiledPrompt(expert_name, sections)
+
+
+def token_report(compiled: CompiledPrompt) -> tuple[list[tuple[str, int]], int]:
+    rows = [(name, count_tokens(text)) for name, text in compiled.sections]
+    return rows, count_tokens(compiled.text)
+
+
+def expert_markdown(expert: ckit_bot_install.FMarketplaceExpertInput) -> str:
+    # prompts/*.md are generated for the manifest-driven runtime, personality.md carries the shared voice
+    body = expert.fexp_system_prompt
+    if body.startswith(roastmaster_prompts.PERSONALITY):
+        body = body[len(roastmaster_prompts.PERSONALITY):]
+    return f"---\nexpert_description: {expert.fexp_description}\nexpert_allow_tools: {expert.fexp_allow_tools}\n---\n\n{_normalize(body)}\n"
+
+
+def markdown_files(experts: list[tuple[str, ckit_bot_install.FMarketplaceExpertInput]]) -> dict[Path, str]:
+    files = {PROMPTS_DIR / "personality.md": _normalize(roastmaster_prompts.PERSONALITY) + "\n"}
+    for name, expert in experts:
+        files[PROMPTS_DIR / f"expert_{name}.md"] = expert_markdown(expert)
+    return files
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compile expert system prompts, report tokens per section, check the budget")
+    parser.add_argument("--budget-tokens", type=int, default=PROMPT_BUDGET_TOKENS, help="Fail if any compiled expert prompt is longer")
+    parser.add_argument("--write-md", action="store_true", help="Regenerate prompts/*.md from roastmaster_prompts")
+    parser.add_argument("--check-md", action="store_true", help="Fail if prompts/*.md differ from roastmaster_prompts")
+    args = parser.parse_args()
+
+    from roastmaster import roastmaster_bot
+    from roastmaster import roastmaster_install
+
+    tools = roastmaster_bot.roastmaster_tools()
+    experts = [(name, expert.filter_tools(tools)) for name, expert in roastmaster_install.experts()]
+    failed = False
+    for name, expert in experts:
+        compiled = compile_expert(name, expert, roastmaster_install.integrations())
+        rows, total = token_report(compiled)
+        print(f"\nexpert {name}: {total} tokens, cacheable prefix sha {compiled.prefix_sha}")
+        for section, tokens in rows:
+            print(f"  {section:36} {tokens:6d} {tokens / total:6.1%}")
+        if total > args.budget_tokens:
+            print(f"  OVER BUDGET: {total} > {args.budget_tokens}")
+            failed = True
+
+    for path, text in markdown_files(experts).items():
+        if args.write_md:
+            path.write_text(text)
+            print(f"wrote {path.relative_to(PROMPTS_DIR.parent)}")
+        elif args.check_md and (not path.exists() or path.read_text() != text):
+            print(f"STALE {path.relative_to(PROMPTS_DIR.parent)}, run with --write-md")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import asyncio
+import atexit
+import bisect
+import collections
+import contextlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import tempfile
+import time
+import uuid
+from typing import Any, Iterator
+
+
+logger = logging.getLogger("roastmaster_tracing")
+
+TRACE_FILE = os.environ.get("ROASTMASTER_TRACE_FILE", os.path.join(tempfile.gettempdir(), "roastmaster-spans.jsonl"))
+TRACE_FILE_MAX_BYTES = int(os.environ.get("ROASTMASTER_TRACE_MAX_MB", "20")) * 1024 * 1024
+TRACE_FILE_BACKUPS = 5
+METRICS_HOST = os.environ.get("ROASTMASTER_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("ROASTMASTER_METRICS_PORT", "9464"))
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# A gap longer than this between two tool calls of one thread is a human reply, not a model turn
+MODEL_TURN_MAX_S = 300.0
+MAX_THREADS = 4096
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "attrs", "start_ts", "duration_s", "error")
+
+    def __init__(self, name: str, trace_id: str, attrs: dict[str, Any]) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.attrs = attrs
+        self.start_ts = time.time()
+        self.duration_s = 0.0
+        self.error = ""
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "span": self.name,
+            "trace_id": self.trace_id,
+            "ts": round(self.start_ts, 3),
+            "duration_ms": round(self.duration_s * 1000, 2),
+            **({"error": self.error} if self.error else {}),
+            **self.attrs,
+        }, ensure_ascii=False)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS_S) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_S, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class Tracer:
+    def __init__(self, trace_file: str = TRACE_FILE) -> None:
+        self.trace_file = trace_file
+        # Metrics are labelled by span name only, persona ids stay in the span file so series do not grow with personas
+        self.histograms: dict[str, Histogram] = collections.defaultdict(Histogram)
+        self.counters: dict[tuple[str, str], float] = collections.defaultdict(float)
+        # gauge -> source -> value, every persona sets its own and the export is the sum
+        self.gauges: dict[str, dict[str, float]] = collections.defaultdict(dict)
+        # thread id -> [last tool result ts, images in context, estimated tokens in context]
+        self._threads: collections.OrderedDict[str, list[float]] = collections.OrderedDict()
+        self._spans_logger: logging.Logger | None = None
+        self._listener: logging.handlers.QueueListener | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._serve_attempted = False
+
+    def _jsonl(self) -> logging.Logger | None:
+        # File writes happen on the QueueListener thread, the event loop only enqueues
+        if self._spans_logger is None and self.trace_file:
+            try:
+                handler = logging.handlers.RotatingFileHandler(self.trace_file, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS)
+            except OSError as exc:
+                logger.warning("cannot open %s, span file disabled: %s", self.trace_file, exc)
+                self.trace_file = ""
+                return None
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            q: queue.SimpleQueue = queue.SimpleQueue()
+            self._listener = logging.handlers.QueueListener(q, handler)
+            self._listener.start()
+            atexit.register(self._listener.stop)
+            spans_logger = logging.getLogger("roastmaster_spans")
+            spans_logger.propagate = False
+            spans_logger.setLevel(logging.INFO)
+            spans_logger.addHandler(logging.handlers.QueueHandler(q))
+            self._spans_logger = spans_logger
+        return self._spans_logger
+
+    def record(self, span: Span) -> None:
+        self.histograms[span.name].observe(span.duration_s)
+        for counter in ("images", "tokens_in_est"):
+            if span.attrs.get(counter):
+                self.counters[(counter, span.name)] += span.attrs[counter]
+        if span.error:
+            self.counters[("errors", span.name)] += 1
+        spans_logger = self._jsonl()
+        if spans_logger is not None:
+            spans_logger.info(span.to_json())
+
+    def count(self, counter: str, name: str, value: float = 1) -> None:
+        self.counters[(counter, name)] += value
+
+    def set_gauge(self, name: str, source: str, value: float) -> None:
+        self.gauges[name][source] = value
+
+    def record_duration(self, name: str, trace_id: str, duration_s: float, **attrs: Any) -> None:
+        span = Span(name, trace_id or uuid.uuid4().hex[:12], attrs)
+        span.start_ts -= duration_s
+        span.duration_s = duration_s
+        self.record(span)
+
+    @contextlib.contextmanager
+    def span(self, name: str, trace_id: str = "", ok_exceptions: tuple[type[BaseException], ...] = (), **attrs: Any) -> Iterator[Span]:
+        span = Span(name, trace_id or uuid.uuid4().hex[:12], attrs)
+        t0 = time.perf_counter()
+        try:
+            yield span
+        except ok_exceptions:
+            raise
+        except BaseException as exc:
+            span.error = type(exc).__name__
+            raise
+        finally:
+            span.duration_s = time.perf_counter() - t0
+            self.record(span)
+
+    def tool_call_started(self, thread_id: str, trace_id: str, prompt_tokens: int, **attrs: Any) -> None:
+        # The bot never sees the model, the time from the previous tool result to the next call is the model turn
+        thread = self._threads.get(thread_id)
+        if thread is not None and time.time() - thread[0] < MODEL_TURN_MAX_S:
+            self.record_duration(
+                "model_turn", trace_id or thread_id, time.time() - thread[0],
+                thread=thread_id, images=int(thread[1]), tokens_in_est=int(prompt_tokens + thread[2]), **attrs,
+            )
+
+    def tool_call_finished(self, thread_id: str, images: int, tokens: int) -> None:
+        thread = self._threads.setdefault(thread_id, [0.0, 0, 0])
+        thread[0] = time.time()
+        thread[1] += images
+        thread[2] += tokens
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > MAX_THREADS:
+            self._threads.popitem(last=False)
+
+    @contextlib.contextmanager
+    def tool_span(
+        self,
+        name: str,
+        thread_id: str,
+        trace_id: str = "",
+        prompt_tokens: int = 0,
+        ok_exceptions: tuple[type[BaseException], ...] = (),
+        **attrs: Any,
+    ) -> Iterator[Span]:
+        # One span per tool call, preceded by a model_turn span for the thinking that led to it
+        self.tool_call_started(thread_id, trace_id, prompt_tokens, **attrs)
+        span = None
+        try:
+            with self.span(name, trace_id or thread_id, ok_exceptions, thread=thread_id, **attrs) as span:
+                yield span
+        finally:
+            self.tool_call_finished(thread_id, span.attrs.get("images", 0) if span else 0, span.attrs.get("tokens_in_est", 0) if span else 0)
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# HELP roastmaster_span_duration_seconds Duration of roast phases",
+            "# TYPE roastmaster_span_duration_seconds histogram",
+        ]
+        for name, h in sorted(self.histograms.items()):
+            labels = f'span="{name}"'
+            cumulative = 0
+            for le, n in zip(LATENCY_BUCKETS_S, h.counts):
+                cumulative += n
+                lines.append(f'roastmaster_span_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'roastmaster_span_duration_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f"roastmaster_span_duration_seconds_sum{{{labels}}} {h.total:.6f}")
+            lines.append(f"roastmaster_span_duration_seconds_count{{{labels}}} {h.count}")
+        for counter in sorted({"images", "tokens_in_est", "errors"} | {c for c, _ in self.counters}):
+            metric = f"roastmaster_span_{counter}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (c, name), value in sorted(self.counters.items()):
+                if c == counter:
+                    lines.append(f'{metric}{{span="{name}"}} {value:g}')
+        for gauge, values in sorted(self.gauges.items()):
+            lines.append(f"# TYPE roastmaster_{gauge} gauge")
+            lines.append(f"roastmaster_{gauge} {sum(values.values()):g}")
+        return "\n".join(lines) + "\n"
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5.0)
+            while (await asyncio.wait_for(reader.readline(), 5.0)).strip():
+                pass
+            path = request_line.split()[1].decode() if len(request_line.split()) > 1 else ""
+            if path.split("?")[0] == "/metrics":
+                status, body = "200 OK", self.prometheus_text().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_metrics(self, host: str = METRICS_HOST, port: int = METRICS_PORT) -> None:
+        # Every persona main loop calls this, the first one binds
+        if self._serve_attempted or not port:
+            return
+        self._serve_attempted = True
+        try:
+            self._server = await asyncio.start_server(self._handle_http, host, port)
+        except OSError as exc:
+            logger.warning("metrics endpoint %s:%d not started: %s", host, port, exc)
+            return
+        logger.info("metrics at http://%s:%d/metrics, spans in %s", host, port, self.trace_file or "(disabled)")
+
+
+TRACER = Tracer()
@@ -0,0 +1,197 @@
+import asyncio
+import collections
+import ipaddress
+import json
+import logging
+import re
+import socket
+import time
+from typing import Any
+from urllib.parse import urljoin, urlsplit
+
+from flexus_client_kit import ckit_cloudtool
+
+# Canonical URLs are index keys in analytics too, the helpers live there so analytics does not import the bot
+from analytics.url_keys import DEFAULT_PORTS, canonicalize_url, extract_urls
+
+
+logger = logging.getLogger("roastmaster_urls")
+
+SCREENSHOT_DIMENSIONS = "1280x720"
+SCREENSHOT_SCROLLS = (0.0, 0.5, 1.0)
+REDIRECT_TIMEOUT = 5.0
+REDIRECT_MAX_HOPS = 5
+REDIRECT_CACHE_MAX = 2048
+REDIRECT_CACHE_TTL_S = 3600
+
+CREATIVE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif")
+
+COMPARE_RE = re.compile(r"\b(compare|comparison|versus|vs\.?|before\s+(?:vs\.?|and)\s+after|a/b)\b", re.IGNORECASE)
+
+PLAN_CAPTURE_TOOL = ckit_cloudtool.CloudTool(
+    strict=True,
+    name="roastmaster_plan_capture",
+    description=(
+        "Extract URLs from the user's message, canonicalize and deduplicate them, resolve redirects, "
+        "and return the exact capture plan. Call this once before any web tool call and execute the plan as-is."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "text": {"type": "string", "description": "The user's message, verbatim"},
+            "mode": {
+                "type": "string",
+                "enum": ["auto", "single", "separate", "compare"],
+                "description": "Analysis mode, use auto unless the user was explicit",
+            },
+        },
+        "required": ["text", "mode"],
+        "additionalProperties": False,
+    },
+)
+
+
+class UnsafeUrl(ValueError):
+    pass
+
+
+class RedirectCache:
+    def __init__(self, max_entries: int = REDIRECT_CACHE_MAX, ttl: float = REDIRECT_CACHE_TTL_S) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: collections.OrderedDict[str, tuple[str, float]] = collections.OrderedDict()
+
+    def get(self, url: str) -> str | None:
+        item = self._entries.get(url)
+        if item is None or time.time() - item[1] > self.ttl:
+            self._entries.pop(url, None)
+            return None
+        self._entries.move_to_end(url)
+        return item[0]
+
+    def put(self, url: str, final: str) -> None:
+        self._entries[url] = (final, time.time())
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_redirects_resolved = RedirectCache()
+
+
+def is_creative_url(url: str) -> bool:
+    # Direct links to images are ad creatives, they go on a contact sheet instead of through the browser
+    return urlsplit(url).path.lower().endswith(CREATIVE_EXTENSIONS)
+
+
+def check_public_url(url: str) -> None:
+    # The bot process fetches user-supplied URLs itself, refuse anything that resolves to an internal address
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise UnsafeUrl(f"{url} is not an http(s) URL")
+    try:
+        infos = socket.getaddrinfo(parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme], proto=socket.IPPROTO_TCP)
+    except socket.gaierror as exc:
+        raise UnsafeUrl(f"{parts.hostname} does not resolve: {exc}") from exc
+    for info in infos:
+        addr = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if not addr.is_global or addr.is_multicast:
+            raise UnsafeUrl(f"{parts.hostname} resolves to non-public address {addr}")
+
+
+def _resolve_redirects_blocking(url: str) -> str:
+    import requests  # ~100ms to import, only needed once a redirect is actually resolved
+    current = url
+    try:
+        # Hop by hop, so a public URL cannot redirect the bot to an internal one
+        for _ in range(REDIRECT_MAX_HOPS):
+            check_public_url(current)
+            r = requests.head(current, allow_redirects=False, timeout=REDIRECT_TIMEOUT)
+            if r.status_code in (405, 501):
+                r = requests.get(current, allow_redirects=False, timeout=REDIRECT_TIMEOUT, stream=True)
+                r.close()
+            location = r.headers.get("Location") if r.is_redirect else None
+            if not location:
+                return current
+            current = urljoin(current, location)
+        return current
+    except UnsafeUrl as exc:
+        logger.info("redirect resolution stopped for %s: %s", url, exc)
+        return url
+    except requests.RequestException as exc:
+        logger.info("redirect resolution failed for %s: %s", url, exc)
+        return url
+
+
+async def resolve_redirects(url: str) -> str:
+    final = _redirects_resolved.get(url)
+    if final is None:
+        final = await asyncio.to_thread(_resolve_redirects_blocking, url)
+        _redirects_resolved.put(url, final)
+    return final
+
+
+def infer_mode(text: str, url_count: int) -> str:
+    if url_count <= 1:
+        return "single"
+    if COMPARE_RE.search(text or ""):
+        return "compare"
+    return "separate"
+
+
+async def dedupe_urls(urls: list[str], resolve: bool = True) -> list[dict[str, str]]:
+    seen: set[str] = set()
+    result: list[dict[str, str]] = []
+    for url in urls:
+        first_key = canonicalize_url(url)
+        if first_key in seen:
+            continue
+        seen.add(first_key)
+        final = await resolve_redirects(url) if resolve else url
+        key = canonicalize_url(final)
+        if key != first_key and key in seen:
+            continue
+        seen.add(key)
+        result.append({"url": final, "canonical": key, "submitted": url})
+    return result
+
+
+def capture_plan(mode: str, urls: list[dict[str, str]]) -> dict[str, Any]:
+    pages = [u for u in urls if not is_creative_url(u["url"])]
+    return {
+        "mode": mode,
+        "urls": urls,
+        "capture": [{"url": u["url"]} for u in pages],
+        "creatives": [u["url"] for u in urls if is_creative_url(u["url"])],
+        "fallback_web": {
+            "open": [{"url": u["url"]} for u in pages],
+            "screenshot": [
+                {"url": u["url"], "dimensions": SCREENSHOT_DIMENSIONS, "scroll_down": scroll}
+                for u in pages
+                for scroll in SCREENSHOT_SCROLLS
+            ],
+        },
+    }
+
+
+async def plan_capture(text: str, mode: str = "auto", resolve: bool = True) -> dict[str, Any]:
+    urls = await dedupe_urls(extract_urls(text), resolve=resolve)
+    page_count = sum(1 for u in urls if not is_creative_url(u["url"]))
+    if urls and not page_count:
+        mode = "creatives"
+    elif mode == "auto" or (mode == "single" and page_count > 1):
+        mode = infer_mode(text, page_count)
+    plan = capture_plan(mode, urls)
+    if not urls:
+        plan["error"] = "No http:// or https:// URL found, ask the user for the missing input and do not call the web tool."
+    elif mode == "compare" and page_count < 2:
+        plan["error"] = "Comparison needs two different URLs, ask the user for the second one."
+    return plan
+
+
+async def handle_plan_capture(model_produced_args: dict[str, Any]) -> str:
+    plan = await plan_capture(model_produced_args.get("text", ""), model_produced_args.get("mode") or "auto")
+    return json.dumps(plan, indent=2)
@@ -0,0 +1,118 @@
+import asyncio
+import collections
+import logging
+import time
+
+from flexus_client_kit import ckit_bot_exec, ckit_shutdown
+
+from roastmaster import roastmaster_tracing
+
+
+logger = logging.getLogger("roastmaster_wakeup")
+
+POLL_FALLBACK_S = 10.0
+EVENT_FALLBACK_S = 60.0
+LATENCY_SAMPLES = 1024
+STATS_LOG_EVERY = 100
+ARRIVAL_EVENT_ATTR = "_parked_anything_new"
+EVENT = "event"
+POLL = "poll"
+WAKEUP_MODES = (EVENT, POLL)
+
+
+class LatencyTracker:
+    def __init__(self, maxlen: int = LATENCY_SAMPLES) -> None:
+        self.samples: collections.deque[float] = collections.deque(maxlen=maxlen)
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self) -> dict[str, float]:
+        return {"count": self.count, "p50_ms": round(self.percentile(0.50) * 1000, 1), "p99_ms": round(self.percentile(0.99) * 1000, 1)}
+
+
+class ArrivalEvent(asyncio.Event):
+    # Takes the place of the kit's event, so stamping the first arrival needs no patching of an object we do not own
+    def __init__(self) -> None:
+        super().__init__()
+        self.first_set_ts: float | None = None
+
+    def set(self) -> None:
+        if self.first_set_ts is None:
+            self.first_set_ts = time.perf_counter()
+        super().set()
+
+
+def arrival_event(rcx: ckit_bot_exec.RobotContext) -> ArrivalEvent | None:
+    # The kit sets this event whenever it parks an incoming event for unpark_collected_events. It has no public
+    # hook for that, tests/test_wakeup.py fails when the attribute goes away
+    event = getattr(rcx, ARRIVAL_EVENT_ATTR, None)
+    if isinstance(event, ArrivalEvent) or not isinstance(event, asyncio.Event):
+        return event
+    own = ArrivalEvent()
+    if event.is_set():
+        own.set()
+    setattr(rcx, ARRIVAL_EVENT_ATTR, own)
+    return own
+
+
+class PersonaWakeup:
+    def __init__(self, rcx: ckit_bot_exec.RobotContext, mode: str = EVENT, poll_s: float = POLL_FALLBACK_S) -> None:
+        if mode not in WAKEUP_MODES:
+            raise ValueError(f"wakeup mode must be one of {', '.join(WAKEUP_MODES)}, got {mode!r}")
+        self.rcx = rcx
+        self.poll_s = poll_s
+        self.pickup_latency = LatencyTracker()
+        self.wakeups = 0
+        self._event = arrival_event(rcx)
+        if self._event is None:
+            logger.error(
+                "%s RobotContext.%s is missing or not an asyncio.Event, this kit cannot wake on arrival: "
+                "polling every %.0fs and pickup latency is not measured",
+                rcx.persona.persona_id, ARRIVAL_EVENT_ATTR, poll_s,
+            )
+            mode = POLL
+        self.mode = mode
+
+    @property
+    def event_driven(self) -> bool:
+        return self.mode == EVENT
+
+    async def run_once(self) -> None:
+        if self.mode == POLL:
+            # Anything that arrived during the previous sleep is picked up by this call
+            self._note_pickup()
+            await self.rcx.unpark_collected_events(sleep_if_no_work=self.poll_s)
+            self.wakeups += 1
+            return
+        waiters = [asyncio.ensure_future(self._event.wait()), asyncio.ensure_future(ckit_shutdown.shutdown_event.wait())]
+        _, pending = await asyncio.wait(waiters, timeout=EVENT_FALLBACK_S, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in pending:
+            waiter.cancel()
+        if ckit_shutdown.shutdown_event.is_set():
+            return
+        self.wakeups += 1
+        self._note_pickup()
+        self._event.clear()
+        await self.rcx.unpark_collected_events(sleep_if_no_work=0.0)
+
+    def _note_pickup(self) -> None:
+        # Stamped in both modes, so poll mode reports the latency it adds too
+        if self._event is None or self._event.first_set_ts is None:
+            return
+        arrival_ts, self._event.first_set_ts = self._event.first_set_ts, None
+        self.pickup_latency.add(time.perf_counter() - arrival_ts)
+        roastmaster_tracing.TRACER.record_duration("event_pickup", "", self.pickup_latency.samples[-1], persona_id=self.rcx.persona.persona_id)
+        if self.pickup_latency.count % STATS_LOG_EVERY == 0:
+            logger.info("%s %s pickup %s", self.rcx.persona.persona_id, self.mode, self.pickup_latency.stats())
+
+    def stats(self) -> dict[str, float]:
+        return {"mode": self.mode, "wakeups": self.wakeups, **self.pickup_latency.stats()}
@@ -9,6 +9,8 @@ setup(
         "requests",
         "openai",
         "anthropic",
+        "playwright",
+        "Pillow",
     ],
     package_data={"": ["*.webp", "*.png", "*.html", "*.lark", "*.json", "*.md", "prompts/*.md"]},
 )
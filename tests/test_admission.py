@@ -0,0 +1,96 @@
+import asyncio
+import re
+import types
+
+from flexus_client_kit import ckit_ask_model, ckit_cloudtool
+
+from roastmaster import roastmaster_admission
+from roastmaster import roastmaster_cascade
+from roastmaster import roastmaster_urls
+
+
+async def no_redirects(url: str) -> str:
+    return url
+
+
+def test_queued_roast_starts_from_its_own_thread_once_a_slot_frees(monkeypatch):
+    created, posted = [], []
+
+    async def bot_subchat_create_multiple(**kwargs):
+        created.append(kwargs)
+        return [f"subchat-{len(created)}"]
+
+    async def thread_add_user_message(http, ft_id, text, who_is_asking, ftm_alt=100):
+        posted.append((ft_id, text))
+
+    monkeypatch.setattr(ckit_ask_model, "bot_subchat_create_multiple", bot_subchat_create_multiple)
+    monkeypatch.setattr(ckit_ask_model, "thread_add_user_message", thread_add_user_message, raising=False)
+    monkeypatch.setattr(roastmaster_urls, "resolve_redirects", no_redirects)
+    rcx = types.SimpleNamespace(persona=types.SimpleNamespace(persona_id="p1"))
+    ledger = roastmaster_cascade.RoastLedger()
+    admission = roastmaster_admission.AdmissionControl("p1", max_inprogress=1)
+
+    async def use_http():
+        return None
+
+    fclient = types.SimpleNamespace(use_http=use_http)
+
+    async def roast(thread: str, call: str, url: str, batch_id: str = ""):
+        toolcall = types.SimpleNamespace(fcall_ft_id=thread, fcall_id=call)
+        args = {"text": f"roast {url}", "mode": "auto", "project_name": "", "fresh": False, "continue": batch_id}
+        try:
+            return await roastmaster_cascade.handle_roast(fclient, rcx, ledger, admission, toolcall, args)
+        except ckit_cloudtool.WaitForSubchats as wait:
+            return wait
+
+    async def run():
+        first, second = await asyncio.wait_for(asyncio.gather(
+            roast("t1", "call-1", "https://a.example.com"), roast("t2", "call-2", "https://b.example.com"),
+        ), 1.0)
+        assert isinstance(first, ckit_cloudtool.WaitForSubchats)
+        assert second.startswith(roastmaster_admission.QUEUED)
+        batch_id = re.search(r"continue=(\w+)", second).group(1)
+        # Queued groups stay in the batch until they really start
+        assert len(admission.batches[batch_id].groups) == 1
+        assert await roastmaster_cascade.start_queued(fclient, rcx, ledger, admission) == 0
+        assert (await roast("t2", "call-3", "", batch_id)).startswith(roastmaster_admission.QUEUED)
+
+        admission.release(next(iter(admission.leases)), 1000)
+        assert await roastmaster_cascade.start_queued(fclient, rcx, ledger, admission) == 1
+        assert posted == [("t2", roastmaster_admission.slot_free_line(batch_id))]
+        assert [c["fcall_id"] for c in created] == ["call-1"]
+
+        resumed = await roast("t2", "call-4", "", batch_id)
+        assert isinstance(resumed, ckit_cloudtool.WaitForSubchats)
+        assert [c["fcall_id"] for c in created] == ["call-1", "call-4"]
+        assert "https://b.example.com" in created[1]["first_question"][0]
+        assert batch_id not in admission.batches
+
+    asyncio.run(run())
+
+
+def test_batch_resumes_only_with_its_id():
+    admission = roastmaster_admission.AdmissionControl("p1", max_inprogress=1)
+    groups = [[{"url": f"https://{c}.example.com"}] for c in "abc"]
+    pending, count = admission.next_chunk("", groups, [1000] * 3, {})
+    admission.commit_chunk(pending, count)
+    assert count == 1 and list(admission.batches) == [pending.batch_id]
+
+    fresh, count = admission.next_chunk("", groups, [1000] * 3, {})
+    assert fresh.batch_id != pending.batch_id and fresh.groups == groups
+
+    resumed, count = admission.next_chunk(pending.batch_id, [], [], {})
+    assert resumed is pending and resumed.groups == groups[1:]
+
+
+def test_daily_spend_survives_a_restart(tmp_path, monkeypatch):
+    path = tmp_path / "p1.json"
+    admission = roastmaster_admission.AdmissionControl("p1", daily_budget=10_000, path=path)
+    admission.lease("r1", 3000)
+    admission.release("r1", 4000)
+    admission.lease("r2", 2000)
+    restarted = roastmaster_admission.AdmissionControl("p1", daily_budget=10_000, path=path)
+    assert restarted.projected == 6000
+
+    monkeypatch.setattr(roastmaster_admission, "_utc_day", lambda: "2099-01-01")
+    assert roastmaster_admission.AdmissionControl("p1", daily_budget=10_000, path=path).projected == 0
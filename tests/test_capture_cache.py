@@ -0,0 +1,97 @@
+import asyncio
+import io
+import random
+
+import pytest
+
+from roastmaster import roastmaster_capture
+from roastmaster import roastmaster_urls
+
+
+def noise_webp(seed: int) -> bytes:
+    from PIL import Image
+    rng = random.Random(seed)
+    buf = io.BytesIO()
+    Image.frombytes("L", (128, 72), bytes(rng.randrange(256) for _ in range(128 * 72))).save(buf, "WEBP")
+    return buf.getvalue()
+
+
+class FakeCapturer:
+    def __init__(self, same_tiles: bool = False) -> None:
+        self.renders = 0
+        self.same_tiles = same_tiles
+
+    async def capture(self, url, dimensions, scrolls):
+        self.renders += 1
+        tiles = [noise_webp(0 if self.same_tiles else i) for i in range(len(scrolls))]
+        return roastmaster_capture.RenderedPage("page text " * 100, "<html></html>", "", tiles)
+
+    async def capture_stitched(self, url, dimensions):
+        self.renders += 1
+        return roastmaster_capture.RenderedPage("page text " * 100, "<html></html>", "", [b"sheet" * 10])
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(roastmaster_urls, "check_public_url", lambda url: None)
+    monkeypatch.setattr(roastmaster_capture.roastmaster_digest, "extract_digest", lambda text, html, above_fold: {})
+    return roastmaster_capture.CaptureCache()
+
+
+def test_smallest_cap_wins(cache):
+    cache.configure(512 * 1024 * 1024)
+    cache.configure(64 * 1024 * 1024)
+    cache.configure(256 * 1024 * 1024)
+    assert cache.max_bytes == 64 * 1024 * 1024
+
+
+@pytest.mark.parametrize("layout, images", [(roastmaster_capture.VIEWPORTS, 3), (roastmaster_capture.STITCHED, 1)])
+def test_one_entry_and_one_stat_per_capture(cache, layout, images):
+    capturer = FakeCapturer()
+
+    async def run():
+        first = await roastmaster_capture.capture_url("https://example.com", layout=layout, cache=cache, capturer=capturer)
+        second = await roastmaster_capture.capture_url("https://www.example.com/", layout=layout, cache=cache, capturer=capturer)
+        return first, second
+
+    (first, first_cached), (second, second_cached) = asyncio.run(run())
+    assert (first_cached, second_cached) == (False, True)
+    assert len(second.images) == images
+    assert capturer.renders == 1
+    assert cache.stats()["entries"] == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    # Page text is stored once, not once per screenshot
+    assert cache.total_bytes == len(first.text.encode()) + sum(len(i) for i in first.images) + len(first.digest) + len(first.tiles)
+
+
+def test_layouts_do_not_share_entries(cache):
+    capturer = FakeCapturer()
+
+    async def run():
+        await roastmaster_capture.capture_url("https://example.com", layout=roastmaster_capture.STITCHED, cache=cache, capturer=capturer)
+        return await roastmaster_capture.capture_url("https://example.com", layout=roastmaster_capture.VIEWPORTS, cache=cache, capturer=capturer)
+
+    assert asyncio.run(run())[1] is False
+    assert capturer.renders == 2
+
+
+def test_viewport_dedup_is_cached(cache, monkeypatch):
+    capturer = FakeCapturer(same_tiles=True)
+    calls = []
+    dedupe_tiles_async = roastmaster_capture.roastmaster_imagehash.dedupe_tiles_async
+
+    async def counting(tiles, quality):
+        calls.append(quality)
+        return await dedupe_tiles_async(tiles, quality)
+
+    monkeypatch.setattr(roastmaster_capture.roastmaster_imagehash, "dedupe_tiles_async", counting)
+
+    async def run():
+        for _ in range(3):
+            entry, _ = await roastmaster_capture.capture_url("https://example.com", layout=roastmaster_capture.VIEWPORTS, cache=cache, capturer=capturer)
+        return entry
+
+    entry = asyncio.run(run())
+    assert calls == [roastmaster_capture.WEBP_QUALITY]
+    assert len(entry.images) == 1
+    assert '"dropped"' in entry.tiles
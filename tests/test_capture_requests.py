@@ -0,0 +1,51 @@
+import asyncio
+import types
+
+from roastmaster import roastmaster_capture
+
+
+class Route:
+    def __init__(self, url: str, web: dict[str, dict[str, str]]) -> None:
+        self.request = types.SimpleNamespace(url=url)
+        self.web = web
+        self.outcome = ""
+        self.response = None
+
+    async def fetch(self, max_redirects: int):
+        assert max_redirects == 0
+        return types.SimpleNamespace(headers=self.web[self.request.url])
+
+    async def fulfill(self, response) -> None:
+        self.outcome, self.response = "fulfilled", response
+
+    async def abort(self, error_code: str = "failed") -> None:
+        self.outcome = f"aborted:{error_code}"
+
+    async def fallback(self) -> None:
+        self.outcome = "fallback"
+
+
+def browse(url: str, web: dict[str, dict[str, str]]) -> list[Route]:
+    # Follows fulfilled redirects the way Chromium does, each hop is a new request through the guard
+    hops = []
+    while True:
+        route = Route(url, web)
+        asyncio.run(roastmaster_capture._guard_request(route))
+        hops.append(route)
+        location = route.response.headers.get("location") if route.response else None
+        if not location:
+            return hops
+        url = location
+
+
+def test_redirect_to_internal_address_is_blocked():
+    web = {"http://93.184.216.34/": {"location": "http://169.254.169.254/latest/meta-data/"}}
+    hops = browse("http://93.184.216.34/", web)
+    assert [h.outcome for h in hops] == ["fulfilled", "aborted:blockedbyclient"]
+
+
+def test_subresources_are_checked_and_inline_urls_pass():
+    assert browse("http://127.0.0.1:8080/admin.js", {})[0].outcome == "aborted:blockedbyclient"
+    assert browse("http://10.0.0.5/logo.png", {})[0].outcome == "aborted:blockedbyclient"
+    assert browse("data:text/html,<p>hi</p>", {})[0].outcome == "fallback"
+    assert browse("http://93.184.216.34/app.js", {"http://93.184.216.34/app.js": {}})[0].outcome == "fulfilled"
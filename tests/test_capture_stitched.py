@@ -0,0 +1,69 @@
+import asyncio
+import io
+
+import pytest
+
+from roastmaster import roastmaster_capture
+
+
+def test_fold_tops_keep_page_bottom():
+    assert roastmaster_capture.fold_tops(720, 720, 6) == [0]
+    assert roastmaster_capture.fold_tops(1880, 720, 6) == [0, 720, 1160]
+    tops = roastmaster_capture.fold_tops(20_000, 720, 6)
+    assert len(tops) == 6
+    assert tops[:5] == [0, 720, 1440, 2160, 2880]
+    assert tops[-1] == 20_000 - 720
+
+
+def test_stitch_folds_labels_skipped_gap():
+    from PIL import Image
+    folds = []
+    for top in roastmaster_capture.fold_tops(10_000, 720, 3):
+        buf = io.BytesIO()
+        Image.new("RGB", (1280, 720), "white").save(buf, "PNG")
+        folds.append((top, buf.getvalue()))
+    sheet = Image.open(io.BytesIO(roastmaster_capture.stitch_folds(folds, 720, 10_000)))
+    assert sheet.format == "WEBP"
+    assert max(sheet.size) <= roastmaster_capture.IMAGE_MAX_SIDE
+
+
+def test_capture_stitched_real_browser():
+    pytest.importorskip("playwright.async_api")
+    from PIL import Image
+    # 10 folds tall with a green band at the very bottom, which must survive the fold limit
+    html = (
+        "<html><body style='margin:0'><div style='height:6900px;background:white'>top</div>"
+        "<div style='height:300px;background:#00ff00'>bottom</div></body></html>"
+    )
+    capturer = roastmaster_capture.PageCapturer()
+
+    async def run():
+        try:
+            await capturer._get_browser()
+        except Exception as exc:
+            await capturer.close()
+            return exc
+        try:
+            return await capturer.capture_stitched("data:text/html," + html, "1280x720")
+        finally:
+            await capturer.close()
+
+    rendered = asyncio.run(run())
+    if isinstance(rendered, Exception):
+        pytest.skip(f"chromium is not available: {str(rendered).splitlines()[0]}")
+    assert len(rendered.images) == 1
+    sheet = Image.open(io.BytesIO(rendered.images[0])).convert("RGB")
+    greens = sum(1 for r, g, b in sheet.getdata() if g > 200 and r < 80 and b < 80)
+    assert greens > 0
+
+
+def test_stitch_page_drops_repeated_folds():
+    from PIL import Image
+    folds = []
+    for top in (0, 720, 1440):
+        buf = io.BytesIO()
+        Image.new("RGB", (1280, 720), "white").save(buf, "PNG")
+        folds.append((top, buf.getvalue()))
+    sheet, tiles = roastmaster_capture.stitch_page(folds, 720, 2160)
+    assert [t["action"] for t in tiles] == ["kept", "dropped", "dropped"]
+    assert Image.open(io.BytesIO(sheet)).size[0] <= roastmaster_capture.IMAGE_MAX_SIDE
@@ -0,0 +1,58 @@
+import types
+from urllib.parse import urlsplit
+
+import pytest
+
+from roastmaster import roastmaster_creatives
+from roastmaster import roastmaster_urls
+
+
+class Response:
+    def __init__(self, location: str = "", body: bytes = b"") -> None:
+        self.is_redirect = bool(location)
+        self.headers = {"Location": location} if location else {"Content-Type": "image/png"}
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def iter_content(self, size: int):
+        yield self.body
+
+
+@pytest.fixture
+def web(monkeypatch):
+    import requests
+    web = types.SimpleNamespace(routes={}, requested=[])
+
+    def get(url, **kwargs):
+        assert kwargs.get("allow_redirects") is False
+        web.requested.append(url)
+        return web.routes[url]
+
+    def check_public_url(url):
+        if urlsplit(url).hostname == "169.254.169.254":
+            raise roastmaster_urls.UnsafeUrl(url)
+
+    monkeypatch.setattr(requests, "get", get)
+    monkeypatch.setattr(roastmaster_urls, "check_public_url", check_public_url)
+    return web
+
+
+def test_creative_redirect_to_internal_address_is_refused(web):
+    web.routes["https://cdn.example.com/ad.png"] = Response(location="http://169.254.169.254/latest/ad.png")
+    with pytest.raises(roastmaster_urls.UnsafeUrl):
+        roastmaster_creatives._fetch_blocking("https://cdn.example.com/ad.png")
+    assert web.requested == ["https://cdn.example.com/ad.png"]
+
+
+def test_creative_redirects_are_followed_hop_by_hop(web):
+    web.routes["https://cdn.example.com/ad.png"] = Response(location="/v2/ad.png")
+    web.routes["https://cdn.example.com/v2/ad.png"] = Response(body=b"png")
+    assert roastmaster_creatives._fetch_blocking("https://cdn.example.com/ad.png") == b"png"
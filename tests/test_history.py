@@ -0,0 +1,174 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+from analytics import score_columns
+from roastmaster import roastmaster_chain
+from roastmaster import roastmaster_history
+from roastmaster import roastmaster_pdoc
+from roastmaster import roastmaster_urls
+
+
+class MemoryDocs:
+    def __init__(self) -> None:
+        self.docs: dict[str, str] = {}
+        self.version = 0
+
+    async def list(self, folder: str = roastmaster_pdoc.ROASTS_FOLDER) -> list[tuple[str, str]]:
+        return [(path, str(hash(text))) for path, text in self.docs.items()]
+
+    async def read(self, path: str) -> str:
+        return self.docs[path]
+
+    async def write(self, path: str, text: str, fcall_ft_id: str) -> str:
+        op = "overwrite" if path in self.docs else "create"
+        self.docs[path] = text
+        return op
+
+
+def save(history, roast_id, mode, urls, project_name=""):
+    return asyncio.run(history.save("ft1", roast_id, project_name, mode, urls, 6, "## Roast Score: 6/10"))
+
+
+def test_latest_for_url_only_matches_single_roasts_of_that_url():
+    history = roastmaster_history.RoastHistory(MemoryDocs())
+    save(history, "r1", "compare", ["https://a.example.com", "https://b.example.com"], "Acme")
+    assert asyncio.run(history.latest_for_url("https://a.example.com")) is None
+    save(history, "r2", "single", ["https://a.example.com"], "Other")
+    record, _ = asyncio.run(history.latest_for_url("https://www.a.example.com/"))
+    assert record.mode == "single"
+
+
+def test_fingerprints_are_kept_per_roast():
+    history = roastmaster_history.RoastHistory(MemoryDocs())
+    history.note_fingerprint("r1", "https://a.example.com", {"text": "one"})
+    history.note_fingerprint("r2", "https://a.example.com", {"text": "two"})
+    result = save(history, "r1", "single", ["https://a.example.com"])
+    doc = json.loads(history.docs.docs[result["path"]])
+    assert doc["fingerprints"] == {"https://a.example.com": {"text": "one"}}
+    assert list(history.fingerprints) == ["r2"]
+
+
+class Pdoc:
+    def __init__(self, create_error: Exception | None) -> None:
+        self.create_error = create_error
+        self.overwritten = []
+
+    async def pdoc_create(self, path, text, fcall_ft_id):
+        if self.create_error:
+            raise self.create_error
+
+    async def pdoc_overwrite(self, path, text, fcall_ft_id):
+        self.overwritten.append(path)
+
+
+def docs_with(pdoc: Pdoc) -> roastmaster_pdoc.RoastDocs:
+    docs = roastmaster_pdoc.RoastDocs.__new__(roastmaster_pdoc.RoastDocs)
+    docs.pdoc = pdoc
+    return docs
+
+
+def test_write_overwrites_only_existing_documents():
+    pdoc = Pdoc(RuntimeError("document /roastmaster/roasts/acme already exists"))
+    assert asyncio.run(docs_with(pdoc).write("/roastmaster/roasts/acme", "{}", "ft1")) == "overwrite"
+    assert pdoc.overwritten == ["/roastmaster/roasts/acme"]
+
+    pdoc = Pdoc(PermissionError("no write access to /roastmaster"))
+    with pytest.raises(PermissionError):
+        asyncio.run(docs_with(pdoc).write("/roastmaster/roasts/acme", "{}", "ft1"))
+    assert pdoc.overwritten == []
+
+
+def test_save_failure_is_reported_to_the_model():
+    history = roastmaster_history.RoastHistory(types.SimpleNamespace(
+        list=MemoryDocs().list, read=MemoryDocs().read, write=docs_with(Pdoc(PermissionError("denied"))).write,
+    ))
+    args = {"roast_id": "r1", "project_name": "", "mode": "single", "urls": ["https://a.example.com"], "score": 6, "roast": "text"}
+    result = asyncio.run(roastmaster_history.handle_save_roast(history, "ft1", args))
+    assert result.startswith("Error: cannot save the roast: PermissionError")
+
+
+def test_save_roast_accepts_every_plan_mode():
+    plan = asyncio.run(roastmaster_urls.plan_capture("https://cdn.example.com/ads/a.png https://cdn.example.com/ads/b.png", resolve=False))
+    assert plan["mode"] == "creatives"
+    assert plan["mode"] in roastmaster_history.SAVE_ROAST_TOOL.parameters["properties"]["mode"]["enum"]
+
+
+def test_same_second_roasts_each_get_a_score_row(tmp_path):
+    scores = score_columns.ScoreColumns(tmp_path / "p1.cols")
+    scores.add_roast("Acme", 1000.0, ["https://a.example.com"], "single", 6, "## Roast Score: 6/10")
+    scores.add_roast("Acme", 1000.0, ["https://b.example.com"], "single", 4, "## Roast Score: 4/10")
+    scores.add_roast("Acme", 1000.0, ["https://a.example.com"], "single", 6, "## Roast Score: 6/10")
+    assert scores.percentiles(scores.select("Acme"))["roasts"] == 2
+    scores.close()
+
+
+def test_score_stats_reads_documents_only_in_the_background_sync(tmp_path):
+    docs = MemoryDocs()
+    history = roastmaster_history.RoastHistory(docs, score_columns.ScoreColumns(tmp_path / "p1.cols"))
+    save(history, "r1", "single", ["https://a.example.com"], "Acme")
+    reads = []
+    read = docs.read
+
+    async def counting_read(path):
+        reads.append(path)
+        return await read(path)
+
+    docs.read = counting_read
+    args = {"question": "percentiles", "project_name": "", "url": "", "days": 0, "bucket": "week"}
+
+    async def ask_twice():
+        first = json.loads(await roastmaster_history.handle_score_stats(history, args))
+        n = len(reads)
+        second = json.loads(await roastmaster_history.handle_score_stats(history, args))
+        history.stop_score_sync()
+        return first, second, n
+
+    first, second, n = asyncio.run(ask_twice())
+    assert first["percentiles"]["roasts"] == second["percentiles"]["roasts"] == 1
+    assert len(reads) == n
+    assert "took_ms" in second and "query_ms" in second
+    history.scores.close()
+
+
+def test_chains_are_kept_per_project_and_url_set():
+    history = roastmaster_history.RoastHistory(MemoryDocs())
+    a = save(history, "r1", "single", ["https://a.example.com"], "Acme")
+    b = save(history, "r2", "single", ["https://www.a.example.com/pricing"], "Acme")
+    again = save(history, "r3", "single", ["https://www.a.example.com/"], "Acme")
+    assert a["path"] != b["path"]
+    assert again["path"] == a["path"] and again["versions"] == 2
+
+
+def test_concurrent_saves_to_one_chain_keep_every_version():
+    docs = MemoryDocs()
+    read = docs.read
+
+    async def slow_read(path):
+        await asyncio.sleep(0)
+        return await read(path)
+
+    docs.read = slow_read
+    history = roastmaster_history.RoastHistory(docs)
+
+    async def run():
+        return await asyncio.gather(*(
+            history.save("ft1", f"r{n}", "Acme", "single", ["https://a.example.com"], n, f"## Roast Score: {n}/10") for n in range(3)
+        ))
+
+    results = asyncio.run(run())
+    assert sorted(r["versions"] for r in results) == [1, 2, 3]
+
+
+def test_changes_only_between_roasts_of_the_same_urls():
+    older = {"urls": ["https://a.example.com"], "score": 4, "roast": "text"}
+    assert roastmaster_chain.make_delta(older, {**older, "urls": ["https://www.a.example.com/"], "score": 6})["changes"] == {"score_change": 2}
+    assert "changes" not in roastmaster_chain.make_delta(older, {**older, "urls": ["https://b.example.com"], "score": 6})
+
+
+def test_reworded_deal_breakers_are_not_reported_as_changes():
+    older = {"roast": "## Deal Breakers\n- **Hidden pricing:** no price\n- **Buried CTA:** too low"}
+    newer = {"roast": "## Deal Breakers\n- **Pricing hidden:** sales call only"}
+    assert roastmaster_chain.changes(older, newer) == {"deal_breakers_removed": ["Buried CTA"]}
@@ -0,0 +1,41 @@
+import asyncio
+import logging
+import os
+import types
+
+from roastmaster import roastmaster_install
+
+
+def test_install_publishes_unpinned_experts_without_expert_model_field(monkeypatch, caplog):
+    from roastmaster import roastmaster_marketplace
+    upserts = []
+
+    async def upsert(client, **kwargs):
+        upserts.append(kwargs)
+
+    monkeypatch.setattr(roastmaster_install, "expert_model_field_supported", lambda: False)
+    monkeypatch.setattr(roastmaster_install, "_marketplace_listing", lambda *a: {"marketable_name": "roastmaster"})
+    monkeypatch.setattr(roastmaster_install, "install_manifest", lambda listing: {"listing": "1"})
+    monkeypatch.setattr(roastmaster_install, "_load_pic_b64", lambda path: "")
+    monkeypatch.setattr(roastmaster_marketplace, "marketplace_upsert_dev_bot_compat", upsert)
+    state = types.SimpleNamespace(key=lambda *a: "k", get=lambda key: None, put=lambda key, manifest: None)
+    client = types.SimpleNamespace(ws_id="ws1")
+    with caplog.at_level(logging.WARNING, logger="roastmaster_install"):
+        result = asyncio.run(roastmaster_install.install(client, "roastmaster", "0.0.1", [], state=state))
+    assert result == "installed" and len(upserts) == 1
+    assert roastmaster_install.EXPERT_MODEL_FIELD in caplog.text
+
+
+def test_install_workspaces_passes_each_workspace_without_touching_the_environment(monkeypatch):
+    installed = []
+
+    async def install(client, bot_name, bot_version, tools, force=False, state=None, ws_id=""):
+        installed.append(ws_id)
+        return "installed"
+
+    monkeypatch.setenv("FLEXUS_WORKSPACE", "ws-default")
+    monkeypatch.setattr(roastmaster_install, "install", install)
+    results = asyncio.run(roastmaster_install.install_workspaces(["ws1", "ws2"], parallel=2, force=False))
+    assert results == {"ws1": "installed", "ws2": "installed"}
+    assert sorted(installed) == ["ws1", "ws2"]
+    assert os.environ["FLEXUS_WORKSPACE"] == "ws-default"
@@ -0,0 +1,22 @@
+from roastmaster import roastmaster_install
+from roastmaster import roastmaster_prompt_compiler
+from roastmaster import roastmaster_prompts
+
+
+def test_headings_inside_fences_stay_in_their_section():
+    prompt = "Intro\n\n## Output Format\n\n```text\n## The Roast\n[reaction]\n\n## Roast Score: [X]/10\n```\n\n## Tone Rules\n\n- Be harsh"
+    sections = roastmaster_prompt_compiler.split_sections(prompt)
+    assert [name for name, _ in sections] == ["intro", "output_format", "tone_rules"]
+    assert "## Roast Score: [X]/10" in dict(sections)["output_format"]
+
+
+def test_roast_prompt_output_template_is_one_section():
+    names = [name for name, _ in roastmaster_prompt_compiler.split_sections(roastmaster_prompts.SYSTEM_PROMPT)]
+    assert "output_format" in names
+    assert "roast_score_x_10" not in names
+
+
+def test_triage_prompt_keeps_the_kanban_rule():
+    # The front desk is the expert that still gets the kanban tools
+    assert "flexus_kanban_safe" in roastmaster_install.TRIAGE_TOOLS
+    assert "Never call any kanban tool for normal roast requests" in roastmaster_prompts.TRIAGE_PROMPT
@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+from analytics import roast_index
+
+
+class Docs:
+    def __init__(self, count: int, stamp: str) -> None:
+        self.docs = {
+            f"/roasts/r{i}.json": json.dumps({"urls": [f"https://example.com/p{i}"], "project_name": "Acme", "score": i % 10})
+            for i in range(count)
+        }
+        self.stamp = stamp
+        self.reads = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def list(self) -> list[tuple[str, str]]:
+        return [(path, self.stamp) for path in self.docs]
+
+    async def read(self, path: str) -> str:
+        self.reads += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.001)
+        self.active -= 1
+        return self.docs[path]
+
+
+def test_cold_start_reads_in_bounded_parallel():
+    docs = Docs(40, "v1")
+    index = roast_index.RoastIndex()
+    stats = asyncio.run(index.sync(docs.list, docs.read))
+    assert stats["indexed"] == 40
+    assert 1 < docs.max_active <= roast_index.SYNC_READ_CONCURRENCY
+    asyncio.run(index.sync(docs.list, docs.read))
+    assert docs.reads == 40
+
+
+def test_unstamped_documents_are_read_again():
+    docs = Docs(3, "")
+    index = roast_index.RoastIndex()
+    asyncio.run(index.sync(docs.list, docs.read))
+    docs.docs["/roasts/r0.json"] = json.dumps({"urls": ["https://example.com/new"], "project_name": "Acme"})
+    asyncio.run(index.sync(docs.list, docs.read))
+    assert docs.reads == 6
+    assert [r.path for r in index.lookup(["https://example.com/new"])] == ["/roasts/r0.json"]
@@ -0,0 +1,26 @@
+import json
+
+from roastmaster import roastmaster_tracing
+
+
+def test_metrics_are_not_labelled_by_persona():
+    tracer = roastmaster_tracing.Tracer(trace_file="")
+    for persona_id in ("p1", "p2"):
+        tracer.record_duration("capture", "r1", 0.2, persona_id=persona_id, images=2)
+        tracer.count("admitted", "admission")
+        tracer.set_gauge("admission_inprogress", persona_id, 3)
+    text = tracer.prometheus_text()
+    assert "persona_id" not in text
+    assert 'roastmaster_span_duration_seconds_count{span="capture"} 2' in text
+    assert 'roastmaster_span_images_total{span="capture"} 4' in text
+    assert "roastmaster_admission_inprogress 6" in text
+
+
+def test_record_duration_without_trace_id_gets_its_own():
+    tracer = roastmaster_tracing.Tracer(trace_file="")
+    spans = []
+    tracer.record = spans.append
+    tracer.record_duration("event_pickup", "", 0.01)
+    tracer.record_duration("event_pickup", "", 0.01)
+    ids = [json.loads(s.to_json())["trace_id"] for s in spans]
+    assert all(ids) and ids[0] != ids[1]
@@ -0,0 +1,94 @@
+import asyncio
+import types
+from urllib.parse import urlsplit
+
+import pytest
+
+from roastmaster import roastmaster_urls
+
+
+def planned_calls(plan: dict) -> dict[str, int]:
+    # Tool calls the roast prompt makes for a plan: one planner call, one capture call for a single page or one batch
+    # call for several, one creative sheet call for any creatives
+    pages = len(plan["capture"])
+    return {
+        "roastmaster_plan_capture": 1,
+        "roastmaster_capture": 1 if pages == 1 else 0,
+        "roastmaster_capture_batch": 1 if pages > 1 else 0,
+        "roastmaster_creative_sheet": 1 if plan["creatives"] else 0,
+    }
+
+
+def plan(text: str, mode: str = "auto") -> dict:
+    return asyncio.run(roastmaster_urls.plan_capture(text, mode, resolve=False))
+
+
+@pytest.mark.parametrize("text, mode, calls, web_calls", [
+    ("roast https://example.com", "single", {"roastmaster_capture": 1}, 4),
+    ("roast https://example.com and https://www.example.com/?utm_source=x and https://example.com/", "single", {"roastmaster_capture": 1}, 4),
+    ("roast https://a.example.com and https://b.example.com each", "separate", {"roastmaster_capture_batch": 1}, 8),
+    ("compare https://a.example.com vs https://b.example.com", "compare", {"roastmaster_capture_batch": 1}, 8),
+    ("rank https://cdn.example.com/a.png https://cdn.example.com/b.jpg", "creatives", {"roastmaster_creative_sheet": 1}, 0),
+])
+def test_tool_calls_per_mode(text, mode, calls, web_calls):
+    p = plan(text)
+    assert p["mode"] == mode
+    expected = {"roastmaster_plan_capture": 1, "roastmaster_capture": 0, "roastmaster_capture_batch": 0, "roastmaster_creative_sheet": 0, **calls}
+    assert planned_calls(p) == expected
+    # The fallback when capture fails: one web.open per page plus one screenshot per scroll position
+    fallback = p["fallback_web"]
+    assert len(fallback["open"]) + len(fallback["screenshot"]) == web_calls
+
+
+def test_compare_needs_two_pages():
+    p = plan("compare https://example.com vs https://www.example.com/", "compare")
+    assert len(p["capture"]) == 1
+    assert "error" in p
+
+
+def test_canonicalize_drops_tracking_and_www():
+    assert roastmaster_urls.canonicalize_url("HTTPS://www.Example.com:443//pricing/?b=2&utm_medium=x&a=1&gclid=z") == "https://example.com/pricing?a=1&b=2"
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/",
+    "http://localhost:8080/admin",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5/",
+    "http://[::1]/",
+    "file:///etc/passwd",
+])
+def test_check_public_url_rejects_internal(url):
+    with pytest.raises(roastmaster_urls.UnsafeUrl):
+        roastmaster_urls.check_public_url(url)
+
+
+def test_redirect_to_internal_address_is_not_followed(monkeypatch):
+    import requests
+    requested = []
+
+    def head(url, **kwargs):
+        requested.append(url)
+        return types.SimpleNamespace(status_code=302, is_redirect=True, headers={"Location": "http://169.254.169.254/latest/"})
+
+    def check_public_url(url):
+        if urlsplit(url).hostname == "169.254.169.254":
+            raise roastmaster_urls.UnsafeUrl(url)
+
+    monkeypatch.setattr(requests, "head", head)
+    monkeypatch.setattr(roastmaster_urls, "check_public_url", check_public_url)
+    assert roastmaster_urls._resolve_redirects_blocking("https://short.example/x") == "https://short.example/x"
+    assert requested == ["https://short.example/x"]
+
+
+def test_redirect_cache_is_bounded_and_expires(monkeypatch):
+    cache = roastmaster_urls.RedirectCache(max_entries=2, ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(roastmaster_urls.time, "time", lambda: now[0])
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    now[0] += 11
+    assert cache.get("a") is None
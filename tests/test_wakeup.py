@@ -0,0 +1,68 @@
+import asyncio
+import inspect
+import logging
+import types
+
+from flexus_client_kit import ckit_bot_exec
+
+from roastmaster import roastmaster_wakeup
+
+
+class Context:
+    def __init__(self, with_event: bool) -> None:
+        self.persona = types.SimpleNamespace(persona_id="p1")
+        if with_event:
+            self._parked_anything_new = asyncio.Event()
+        self.sleeps: list[float] = []
+
+    async def unpark_collected_events(self, sleep_if_no_work: float) -> None:
+        self.sleeps.append(sleep_if_no_work)
+
+
+def test_missing_arrival_event_is_logged_as_error(caplog):
+    with caplog.at_level(logging.ERROR, logger="roastmaster_wakeup"):
+        wakeup = roastmaster_wakeup.PersonaWakeup(Context(with_event=False), poll_s=0.01)
+    assert wakeup.mode == roastmaster_wakeup.POLL
+    assert roastmaster_wakeup.ARRIVAL_EVENT_ATTR in caplog.text
+
+
+def test_event_mode_picks_up_arrival():
+    rcx = Context(with_event=True)
+    wakeup = roastmaster_wakeup.PersonaWakeup(rcx)
+
+    async def run():
+        asyncio.get_running_loop().call_soon(rcx._parked_anything_new.set)
+        await wakeup.run_once()
+
+    asyncio.run(run())
+    assert rcx.sleeps == [0.0]
+    assert wakeup.pickup_latency.count == 1
+
+
+def test_poll_mode_measures_pickup_latency():
+    rcx = Context(with_event=True)
+    wakeup = roastmaster_wakeup.PersonaWakeup(rcx, mode=roastmaster_wakeup.POLL, poll_s=0.01)
+
+    async def run():
+        await wakeup.run_once()
+        rcx._parked_anything_new.set()
+        await wakeup.run_once()
+
+    asyncio.run(run())
+    assert rcx.sleeps == [0.01, 0.01]
+    assert wakeup.pickup_latency.count == 1
+
+
+def test_kit_still_sets_the_arrival_event():
+    # Without it the bot silently falls back to polling, fail on a kit upgrade that renames it
+    assert f"self.{roastmaster_wakeup.ARRIVAL_EVENT_ATTR}" in inspect.getsource(ckit_bot_exec.RobotContext)
+
+
+def test_kit_event_is_replaced_by_our_own():
+    rcx = Context(with_event=True)
+    rcx._parked_anything_new.set()
+    wakeup = roastmaster_wakeup.PersonaWakeup(rcx)
+    assert isinstance(rcx._parked_anything_new, roastmaster_wakeup.ArrivalEvent)
+    assert rcx._parked_anything_new.is_set()
+    assert "set" not in vars(rcx._parked_anything_new)
+    assert wakeup.event_driven